@@ -0,0 +1,24 @@
+"""Add channel message packing
+
+Revision ID: 8f3c1d2a9b47
+Revises: 2d30f08757d6
+Create Date: 2026-10-17 10:12:41.213877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3c1d2a9b47'
+down_revision = '2d30f08757d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('channel', sa.Column('pack_messages', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('channel', 'pack_messages')
@@ -0,0 +1,28 @@
+"""Add message count flushes
+
+Revision ID: c7e2a91f4d30
+Revises: 8f3c1d2a9b47
+Create Date: 2026-10-17 14:03:27.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2a91f4d30'
+down_revision = '8f3c1d2a9b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('message_count_flush',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('created', sa.TIMESTAMP(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('message_count_flush')
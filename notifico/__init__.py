@@ -17,6 +17,9 @@ from notifico.util import pretty
 
 sentry = Sentry()
 cache = Cache()
+#: Hooks cached for the webhook endpoint, which has its own backend since it
+#: must be shared by every process.
+hook_cache = Cache()
 mail = Mail()
 celery = Celery()
 babel = Babel()
@@ -72,6 +75,15 @@ def create_app():
     # Set up our redis connection (which is already thread safe)
     app.redis = Redis.from_url(app.config["REDIS"])
     cache.init_app(app)
+    hook_cache.init_app(
+        app,
+        config={
+            "CACHE_TYPE": app.config["HOOK_CACHE_TYPE"],
+            "CACHE_REDIS_URL": app.config["HOOK_CACHE_REDIS_URL"],
+            "CACHE_KEY_PREFIX": app.config["CACHE_KEY_PREFIX"],
+            "CACHE_DEFAULT_TIMEOUT": app.config["HOOK_CACHE_TIMEOUT"],
+        },
+    )
     mail.init_app(app)
     babel.init_app(app)
     csrf.init_app(app)
@@ -1,15 +1,27 @@
-import inspect
 import asyncio
 import dataclasses
+import ssl
 from collections import defaultdict
 from functools import wraps
-from typing import Optional, Dict, Set, Callable, Union, Iterable
+from typing import (
+    Optional,
+    Dict,
+    Set,
+    Callable,
+    Union,
+    Iterable,
+    Tuple,
+    FrozenSet,
+    List,
+    Mapping,
+)
 
-from notifico.botifico.errors import ReadExceededError
 from notifico.botifico.events import Event
+from notifico.botifico.framing import LineFramer
 from notifico.botifico.logger import logger
-from notifico.botifico.parsing import unpack_message
-from notifico.botifico.plugin import Plugin
+from notifico.botifico.parsing import Message
+from notifico.botifico.plugin import Plugin, handler_parameters
+from notifico.botifico.tls import SessionCachingContext
 
 
 @dataclasses.dataclass(frozen=True)
@@ -19,6 +31,57 @@ class Network:
     ssl: bool
 
 
+@dataclasses.dataclass(frozen=True)
+class Handler:
+    """
+    A registered event handler, along with everything needed to call it that
+    can be worked out ahead of time.
+    """
+
+    f: Callable
+    #: The plugin that registered this handler, if any.
+    plugin: Optional[Plugin]
+    #: The names of the keyword arguments the handler accepts.
+    parameters: FrozenSet[str]
+    #: If `True`, the handler is awaited inline while dispatching the event,
+    #: otherwise it's run in its own task.
+    block: bool = True
+
+    @classmethod
+    def from_callable(cls, f: Callable) -> "Handler":
+        return cls(
+            f=f,
+            # When event handlers are registered on a plugin, we store the
+            # registering plugin on the function as `plugin`.
+            plugin=getattr(f, "plugin", None),
+            parameters=handler_parameters(f),
+            # Handlers registered directly on a bot, rather than through a
+            # plugin, have always been called inline.
+            block=getattr(f, "plugin_should_block", True),
+        )
+
+
+@dataclasses.dataclass
+class Batch:
+    """
+    A group of messages sent by the server as a single unit, using the IRCv3
+    `batch` capability.
+    """
+
+    #: The server-chosen reference for this batch.
+    reference: str
+    #: The type of batch, such as "netsplit" or "chathistory".
+    type: str
+    params: List[str]
+    tags: Mapping[str, str]
+    #: Each message in the batch, or a nested :class:`Batch`.
+    messages: List[Union[Message, "Batch"]] = dataclasses.field(
+        default_factory=list
+    )
+    #: The batch this batch is nested in, if any.
+    parent: Optional[str] = None
+
+
 def exception_catcher(f: Callable):
     @wraps(f)
     async def _wrapped(self: "Bot", *args, **kwargs):
@@ -34,26 +97,98 @@ def exception_catcher(f: Callable):
 class Bot:
     network: Network
     event_receivers: Dict[str, Set[Callable]]
+    event_handlers: Dict[str, Tuple[Handler, ...]]
+    event_parameters: Dict[str, FrozenSet[str]]
     event_emitters: Dict[str, asyncio.Event]
     plugin_metadata: Dict[str, dict]
 
-    def __init__(self, network: Network, *, max_buffer_size=0x100000):
+    def __init__(
+        self,
+        network: Network,
+        *,
+        max_buffer_size=0x100000,
+        read_size=0x4000,
+        encoding="utf-8",
+        fallback_encoding="latin-1",
+        max_handler_tasks=100,
+        max_handler_backlog=10000,
+        max_queue_size=500,
+        collapsed_batches=frozenset({"netsplit", "netjoin"}),
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ):
         """
         A minimal IRC "bot".
 
         By default, this handles nothing except the socket IO. Event handlers
         must be registered to implement basic functionality.
+
+        :param max_buffer_size: The maximum size of a single incomplete line
+                                before the connection is dropped.
+        :param read_size: The maximum number of bytes to read off the socket
+                          at once.
+        :param encoding: The preferred encoding for incoming lines.
+        :param fallback_encoding: The encoding used for incoming lines that
+                                  are not valid in `encoding`.
+        :param max_handler_tasks: The maximum number of non-blocking event
+                                  handlers that may be running at once. Once
+                                  reached, further handlers wait for a
+                                  running one to finish.
+        :param max_handler_backlog: The maximum number of non-blocking event
+                                    handlers that may be waiting to run.
+                                    Once reached, further events are dropped
+                                    (with a warning) rather than holding up
+                                    reading from the socket.
+        :param max_queue_size: The maximum number of messages that may be
+                               waiting to be written before sending blocks.
+        :param collapsed_batches: The types of IRCv3 batches that are only
+                                  dispatched as a whole through
+                                  :attr:`Event.on_batch`. Messages in any
+                                  other batch are also dispatched one by one
+                                  once the batch is complete.
+        :param ssl_context: The context to use for networks with `ssl`
+                            enabled, instead of a new default context for
+                            every connection. A :class:`SessionCachingContext`
+                            also lets reconnects resume the last TLS session.
         """
         self.network = network
-        self.message_queue = asyncio.Queue()
+        self.message_queue = asyncio.Queue(maxsize=max_queue_size)
+        self.priority_queue = asyncio.Queue()
+        self.outbound_ready = asyncio.Event()
+        #: The total length of the messages waiting to be written.
+        self.pending_bytes = 0
         self.event_receivers = defaultdict(set)
+        self.event_handlers = {}
+        #: Every keyword argument wanted by any handler of an event.
+        self.event_parameters = {}
         self.event_emitters = defaultdict(lambda: asyncio.Event())
         self.plugin_metadata = defaultdict(dict)
         self.max_buffer_size = max_buffer_size
+        self.read_size = read_size
+        self.encoding = encoding
+        self.fallback_encoding = fallback_encoding
+        self.handler_tasks: Set[asyncio.Task] = set()
+        self.handler_slots = asyncio.Semaphore(max_handler_tasks)
+        self.max_handler_backlog = max_handler_backlog
+        #: The number of handler tasks waiting for a slot to run in.
+        self.handler_backlog = 0
+        #: The number of handlers dropped since the backlog was last full.
+        self.handlers_dropped = 0
+        self.collapsed_batches = collapsed_batches
+        #: IRCv3 batches that have been started but not yet ended.
+        self.batches: Dict[str, Batch] = {}
+        self.ssl_context = ssl_context
 
     def __repr__(self):
         return f"<{self.__class__.__name__}({self.network!r})>"
 
+    @property
+    def in_flight_handlers(self) -> int:
+        """
+        The number of non-blocking event handlers currently running, or
+        waiting to run.
+        """
+        return len(self.handler_tasks)
+
     @exception_catcher
     async def connect(self):
         """
@@ -65,67 +200,198 @@ class Bot:
         reader, writer = await asyncio.open_connection(
             host=self.network.host,
             port=self.network.port,
-            ssl=self.network.ssl,
+            ssl=(self.ssl_context or True) if self.network.ssl else False,
             limit=self.max_buffer_size,
         )
 
+        ssl_object = writer.get_extra_info("ssl_object")
+        if ssl_object is not None and ssl_object.session_reused:
+            logger.debug(f"[Core] Resumed TLS session with {self.network!r}")
+
+        self.batches = {}
         await self.emit_event(Event.on_connected)
-        message_so_far = ""
 
-        read_chunk = asyncio.create_task(reader.read(512))
-        get_queue = asyncio.create_task(self.message_queue.get())
-        while True:
-            # Wait until either there's network traffic to read, or there's a
-            # message waiting to be sent.
-            done, pending = await asyncio.wait(
-                [read_chunk, get_queue], return_when=asyncio.FIRST_COMPLETED
+        # Reading and writing happen in their own tasks, so that a slow write
+        # (such as one being held back by a rate limiter) never stops us from
+        # reading and responding to the server.
+        read_task = asyncio.create_task(self._read_loop(reader))
+        write_task = asyncio.create_task(self._write_loop(writer))
+        try:
+            done, _ = await asyncio.wait(
+                [read_task, write_task], return_when=asyncio.FIRST_COMPLETED
             )
+        finally:
+            read_task.cancel()
+            write_task.cancel()
+            if isinstance(self.ssl_context, SessionCachingContext):
+                self.ssl_context.save_session(ssl_object)
+            writer.close()
+
+        # Re-raise any error from whichever side ended the connection.
+        for task in done:
+            task.result()
+
+        # Anything left over was meant for a connection that no longer
+        # exists.
+        self.clear_outbound()
+        await self.emit_event(Event.on_disconnect)
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        """
+        Read and dispatch incoming lines until the server closes the
+        connection.
+        """
+        framer = LineFramer(
+            encoding=self.encoding,
+            fallback_encoding=self.fallback_encoding,
+            max_buffer_size=self.max_buffer_size,
+        )
 
-            if read_chunk in done:
-                chunk: Optional[bytes] = read_chunk.result()
-
-                # Remote server closed the connection.
-                if chunk == b"":
-                    self.message_queue.empty()
-                    await self.emit_event(Event.on_disconnect)
-
-                    for task in pending:
-                        if not task.cancelled():
-                            task.cancel()
-
-                    return
-
-                message_so_far += chunk.decode("utf-8")
-                if len(message_so_far) > self.max_buffer_size:
-                    # Realistically, the only time this is actually going to
-                    # happen is when connection to a malicious server, so lets
-                    # just die.
-                    raise ReadExceededError()
-
-                while "\r\n" in message_so_far:
-                    line, message_so_far = message_so_far.split("\r\n", 1)
-                    prefix, command, args = unpack_message(line)
-                    await self.emit_event(
-                        Event.on_message,
-                        command=command.upper(),
-                        args=args,
-                        prefix=prefix,
-                    )
-                    await self.emit_event(
-                        command.upper(), args=args, prefix=prefix
-                    )
+        while True:
+            chunk: bytes = await reader.read(self.read_size)
 
-                read_chunk = asyncio.create_task(reader.read(512))
+            # Remote server closed the connection.
+            if chunk == b"":
+                return
 
-            if get_queue in done:
-                to_be_sent = get_queue.result()
-                await self.emit_event(Event.on_write, message=to_be_sent)
-                writer.write(to_be_sent)
-                # We should probably write what we can and then continue our
-                # loop to ensure we're always reading, but for now we wait
-                # until we've written everything.
-                await writer.drain()
-                get_queue = asyncio.create_task(self.message_queue.get())
+            for line in framer.feed(chunk):
+                message = Message.parse(line)
+                if message is not None:
+                    await self._receive(message)
+
+    async def _receive(self, message: Message):
+        """
+        Handle a single incoming message, holding on to it if it's part of
+        an IRCv3 batch.
+        """
+        command, args, tags = message.command, message.args, message.tags
+        batch = self.batches.get(tags.get("batch")) if tags else None
+
+        if command == "BATCH" and args:
+            if args[0].startswith("+"):
+                self.batches[args[0][1:]] = Batch(
+                    reference=args[0][1:],
+                    type=args[1] if len(args) > 1 else "",
+                    params=args[2:],
+                    tags=tags,
+                    parent=batch.reference if batch else None,
+                )
+                return
+            elif args[0].startswith("-"):
+                finished = self.batches.pop(args[0][1:], None)
+                if finished is not None:
+                    parent = self.batches.get(finished.parent)
+                    if parent is not None:
+                        parent.messages.append(finished)
+                    else:
+                        await self._dispatch_batch(finished)
+                return
+
+        if batch is not None:
+            batch.messages.append(message)
+            return
+
+        await self._dispatch(message)
+
+    async def _dispatch(self, message: Message):
+        # Message.parse() has already normalized the command.
+        command = message.command
+
+        # Unpacking the prefix is only worth doing if a handler wants it,
+        # the rest can get it from `message` if they need it.
+        prefix = None
+        if "prefix" in self.event_parameters.get(
+            Event.on_message.value, ()
+        ) or "prefix" in self.event_parameters.get(command, ()):
+            prefix = message.prefix
+
+        await self.emit_event(
+            Event.on_message,
+            message=message,
+            command=command,
+            args=message.args,
+            prefix=prefix,
+            tags=message.tags,
+        )
+        await self.emit_event(
+            command,
+            message=message,
+            args=message.args,
+            prefix=prefix,
+            tags=message.tags,
+        )
+
+    async def _dispatch_batch(self, batch: Batch):
+        await self.emit_event(Event.on_batch, batch=batch)
+
+        if batch.type in self.collapsed_batches:
+            return
+
+        for message in batch.messages:
+            if isinstance(message, Batch):
+                await self._dispatch_batch(message)
+            else:
+                await self._dispatch(message)
+
+    async def _write_loop(self, writer: asyncio.StreamWriter):
+        """
+        Write queued messages to the server, forever.
+        """
+        while True:
+            to_be_sent = await self._next_outbound()
+            await self.emit_event(Event.on_write, message=to_be_sent)
+            writer.write(to_be_sent)
+            await writer.drain()
+
+    async def _next_outbound(self) -> bytes:
+        """
+        Wait for and return the next message to be written, preferring
+        anything on the priority queue.
+        """
+        while True:
+            for queue in (self.priority_queue, self.message_queue):
+                if not queue.empty():
+                    message = queue.get_nowait()
+                    self.pending_bytes -= len(message)
+                    return message
+
+            self.outbound_ready.clear()
+            await self.outbound_ready.wait()
+
+    @property
+    def pending_writes(self) -> int:
+        """
+        The number of messages waiting to be written.
+        """
+        return self.priority_queue.qsize() + self.message_queue.qsize()
+
+    async def drain(self):
+        """
+        Wait until every queued message has been handed to the server.
+
+        This never returns if we aren't connected, so callers should give up
+        eventually.
+        """
+        while self.pending_writes:
+            await self.wait_for(Event.on_write)
+
+    async def quit(self, reason: str = ""):
+        """
+        Ask the server to close our connection, ahead of anything else that's
+        still queued.
+        """
+        await self.send("QUIT", f":{reason}", priority=True)
+
+    def clear_outbound(self) -> List[bytes]:
+        """
+        Remove and return every message waiting to be written.
+        """
+        cleared = []
+        for queue in (self.priority_queue, self.message_queue):
+            while not queue.empty():
+                cleared.append(queue.get_nowait())
+        self.pending_bytes = 0
+        return cleared
 
     async def task_exception(self, ex: Exception):
         await self.emit_event(Event.on_exception, ex=ex)
@@ -140,28 +406,105 @@ class Bot:
 
         kwargs["bot"] = self
 
-        for handler in self.event_receivers[event]:
-            # Only pass the arguments the handler has specified.
-            sig = inspect.signature(handler)
+        for handler in self.event_handlers.get(event, ()):
+            kwargs["plugin"] = handler.plugin
 
-            # When event handlers are registered on a plugin, we store the
-            # registering plugin on the function as `plugin`.
-            kwargs["plugin"] = getattr(handler, "plugin", None)
+            # Only pass the arguments the handler has specified.
+            handler_kwargs = {
+                k: kwargs[k] for k in handler.parameters if k in kwargs
+            }
+
+            if handler.block:
+                await handler.f(**handler_kwargs)
+                continue
+
+            # Non-blocking handlers get their own task, which waits for one of
+            # a limited number of slots to run in. We never wait for a slot
+            # ourselves, since that would stop us reading from the socket
+            # (and answering PINGs), but a flood of events can't create an
+            # unbounded number of tasks either.
+            if self.handler_backlog >= self.max_handler_backlog:
+                if not self.handlers_dropped:
+                    logger.warning(
+                        f"[Core] {self.handler_backlog} event handlers are"
+                        " waiting to run, dropping events until they catch"
+                        " up."
+                    )
+                self.handlers_dropped += 1
+                continue
 
-            await handler(
-                **{k: v for k, v in kwargs.items() if k in sig.parameters}
+            self.handler_backlog += 1
+            task = asyncio.create_task(
+                self._run_handler(event, handler, handler_kwargs)
             )
+            self.handler_tasks.add(task)
+            task.add_done_callback(self.handler_tasks.discard)
 
         # Trigger and immediately clear anything waiting on events.
-        ev = self.event_emitters[event]
-        ev.set()
-        ev.clear()
+        ev = self.event_emitters.get(event)
+        if ev is not None:
+            ev.set()
+            ev.clear()
 
-    async def send(self, command: str, *args):
-        await self.send_raw(f'{" ".join((command, *args))}\r\n'.encode())
+    async def _run_handler(self, event: str, handler: Handler, kwargs: dict):
+        """
+        Run a non-blocking event handler once there's a slot for it,
+        reporting any errors it raises through :attr:`Event.on_exception`.
+        """
+        try:
+            await self.handler_slots.acquire()
+        finally:
+            self.handler_backlog -= 1
+
+        # Only once the backlog has cleared some, so a sustained flood isn't
+        # reported over and over.
+        if (
+            self.handlers_dropped
+            and self.handler_backlog <= self.max_handler_backlog // 2
+        ):
+            logger.warning(
+                f"[Core] Dropped {self.handlers_dropped} event handlers while"
+                " the backlog was full."
+            )
+            self.handlers_dropped = 0
 
-    async def send_raw(self, message: bytes):
-        await self.message_queue.put(message)
+        try:
+            await handler.f(**kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            if event == Event.on_exception.value:
+                # Don't recurse if an exception handler itself is broken.
+                logger.exception(f"[Core] Exception handler {handler.f} failed")
+                return
+
+            try:
+                await self.emit_event(Event.on_exception, ex=exc)
+            except Exception:
+                logger.exception(f"[Core] Unhandled exception in {handler.f}")
+        finally:
+            self.handler_slots.release()
+
+    async def send(self, command: str, *args, priority: bool = False):
+        await self.send_raw(
+            f'{" ".join((command, *args))}\r\n'.encode(), priority=priority
+        )
+
+    async def send_raw(self, message: bytes, *, priority: bool = False):
+        """
+        Queue `message` to be written to the server.
+
+        If the outbound queue is full, this waits until there is room. Small
+        protocol replies that must not wait behind a long backlog (such as
+        PONGs) should be sent with `priority`, which uses a separate,
+        unbounded queue that's always written first.
+        """
+        if priority:
+            self.priority_queue.put_nowait(message)
+        else:
+            await self.message_queue.put(message)
+        self.pending_bytes += len(message)
+        self.outbound_ready.set()
 
     async def wait_for(self, event: Union[str, Event]):
         if isinstance(event, Event):
@@ -191,6 +534,7 @@ class Bot:
         """
         for key in plugin.event_receivers.keys():
             self.event_receivers[key].update(plugin.event_receivers[key])
+            self._rebuild_handlers(key)
 
     def unregister_plugin(self, plugin: Plugin):
         """
@@ -198,6 +542,7 @@ class Bot:
         """
         for key in plugin.event_receivers.keys():
             self.event_receivers[key] -= plugin.event_receivers[key]
+            self._rebuild_handlers(key)
 
     def register_handler(self, event: Union[str, Event], f: Callable):
         """
@@ -205,6 +550,7 @@ class Bot:
         """
         event = event.value if isinstance(event, Event) else event.upper()
         self.event_receivers[event].add(f)
+        self._rebuild_handlers(event)
 
     def unregister_handler(self, event: Union[str, Event], f: Callable):
         """
@@ -212,3 +558,18 @@ class Bot:
         """
         event = event.value if isinstance(event, Event) else event.upper()
         self.event_receivers[event].remove(f)
+        self._rebuild_handlers(event)
+
+    def _rebuild_handlers(self, event: str):
+        """
+        Rebuild the dispatch table for `event` from the registered receivers.
+        """
+        cache = {h.f: h for h in self.event_handlers.get(event, ())}
+        handlers = tuple(
+            cache.get(f) or Handler.from_callable(f)
+            for f in self.event_receivers[event]
+        )
+        self.event_handlers[event] = handlers
+        self.event_parameters[event] = frozenset().union(
+            *(h.parameters for h in handlers)
+        )
@@ -0,0 +1,178 @@
+"""
+The :py:`cap_plugin` negotiates IRCv3 capabilities with the server when a
+bot connects.
+
+By default, every capability the bot core knows how to make use of is
+requested. This can be changed per-bot:
+
+.. code::python
+
+    cap_plugin.set(bot, "requested", {"server-time"})
+
+Capabilities the server acknowledged can be checked using
+:py:`cap_plugin.enabled(bot)`.
+
+If the bot connects with a TLS client certificate the network knows about
+(CertFP), it can also authenticate using SASL EXTERNAL before registering:
+
+.. code::python
+
+    cap_plugin.sasl = "EXTERNAL"
+"""
+from typing import Dict, Optional, Set
+
+from notifico.botifico.bot import Bot
+from notifico.botifico.events import Event
+from notifico.botifico.logger import logger
+from notifico.botifico.plugin import Plugin
+
+
+class CapPlugin(Plugin):
+    #: The capabilities botifico knows how to make use of.
+    SUPPORTED = frozenset({"batch", "message-tags", "server-time"})
+    #: The SASL mechanisms botifico can authenticate with.
+    SASL_MECHANISMS = frozenset({"EXTERNAL"})
+
+    #: The SASL mechanism to authenticate with by default, if any. Can be
+    #: changed per-bot with :py:`cap_plugin.set(bot, "sasl", ...)`.
+    sasl: Optional[str] = None
+
+    def sasl_mechanism(self, bot: Bot) -> Optional[str]:
+        """
+        The SASL mechanism `bot` should authenticate with, if any.
+        """
+        return self.get(bot, "sasl", self.sasl)
+
+    def available(self, bot: Bot) -> Dict[str, Optional[str]]:
+        """
+        The capabilities offered by the server, and their values.
+        """
+        available = self.get(bot, "available")
+        if available is None:
+            available = {}
+            self.set(bot, "available", available)
+        return available
+
+    def enabled(self, bot: Bot) -> Set[str]:
+        """
+        The capabilities the server has acknowledged.
+        """
+        enabled = self.get(bot, "enabled")
+        if enabled is None:
+            enabled = set()
+            self.set(bot, "enabled", enabled)
+        return enabled
+
+    def requested(self, bot: Bot) -> Set[str]:
+        """
+        The capabilities we want enabled, if the server supports them.
+        """
+        requested = set(self.get(bot, "requested", self.SUPPORTED))
+        if self.sasl_mechanism(bot) in self.SASL_MECHANISMS:
+            requested.add("sasl")
+        return requested
+
+    async def request(self, bot: Bot, capabilities: Set[str]) -> bool:
+        """
+        Request any of `capabilities` the server has available and aren't
+        already enabled. Returns `True` if a request was sent.
+        """
+        wanted = (capabilities & self.available(bot).keys()) - self.enabled(bot)
+        if not wanted:
+            return False
+
+        await bot.send("CAP", "REQ", f":{' '.join(sorted(wanted))}")
+        return True
+
+    async def end(self, bot: Bot):
+        """
+        End capability negotiation, allowing registration to complete.
+        """
+        if not self.get(bot, "negotiated"):
+            self.set(bot, "negotiated", True)
+            await bot.send("CAP", "END")
+
+
+cap_plugin = CapPlugin(__name__)
+
+
+@cap_plugin.on(Event.on_connected, block=True)
+async def on_connected(bot: Bot, plugin: CapPlugin):
+    plugin.set(bot, "available", {})
+    plugin.set(bot, "enabled", set())
+    plugin.set(bot, "negotiated", False)
+
+    # Sending this before registering makes the server wait for CAP END
+    # before completing registration. Servers without CAP support will
+    # just ignore it.
+    await bot.send("CAP", "LS", "302")
+
+
+@cap_plugin.on("CAP", block=True)
+async def on_cap(bot: Bot, plugin: CapPlugin, args):
+    # CAP <nick> <subcommand> [*] :<capabilities>
+    if len(args) < 3:
+        return
+
+    subcommand = args[1].upper()
+    capabilities = args[-1].split()
+
+    match subcommand:
+        case "LS" | "NEW":
+            available = plugin.available(bot)
+            for capability in capabilities:
+                name, _, value = capability.partition("=")
+                available[name] = value or None
+
+            if subcommand == "LS" and len(args) > 3 and args[2] == "*":
+                # More capabilities are coming in another message.
+                return
+
+            if not await plugin.request(bot, plugin.requested(bot)):
+                await plugin.end(bot)
+        case "ACK":
+            enabled = plugin.enabled(bot)
+            for capability in capabilities:
+                if capability.startswith("-"):
+                    enabled.discard(capability[1:])
+                else:
+                    enabled.add(capability)
+
+            logger.info(f"[cap_plugin] Enabled {capabilities} on {bot}.")
+
+            # Registration is held until we've finished authenticating.
+            if "sasl" in capabilities and not plugin.get(bot, "negotiated"):
+                await bot.send("AUTHENTICATE", plugin.sasl_mechanism(bot))
+                return
+
+            await plugin.end(bot)
+        case "NAK":
+            logger.info(f"[cap_plugin] Server refused {capabilities}.")
+            await plugin.end(bot)
+        case "DEL":
+            for capability in capabilities:
+                plugin.available(bot).pop(capability, None)
+                plugin.enabled(bot).discard(capability)
+
+
+@cap_plugin.on("AUTHENTICATE", block=True)
+async def on_authenticate(bot: Bot, args):
+    if args and args[0] == "+":
+        # EXTERNAL has nothing to send, the server already has our
+        # certificate.
+        await bot.send("AUTHENTICATE", "+")
+
+
+@cap_plugin.on(Event.RPL_SASLSUCCESS, block=True)
+async def on_sasl_success(bot: Bot, plugin: CapPlugin):
+    logger.info(f"[cap_plugin] Authenticated {bot} using SASL.")
+    await plugin.end(bot)
+
+
+@cap_plugin.on(Event.ERR_SASLFAIL, block=True)
+@cap_plugin.on(Event.ERR_SASLABORTED, block=True)
+@cap_plugin.on(Event.ERR_SASLALREADY, block=True)
+async def on_sasl_failure(bot: Bot, plugin: CapPlugin, args):
+    # Carry on without authenticating, rather than never registering.
+    logger.warning(f"[cap_plugin] SASL failed on {bot}: {args[-1]}")
+    await plugin.end(bot)
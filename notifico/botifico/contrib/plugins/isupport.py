@@ -0,0 +1,211 @@
+"""
+The :py:`isupport_plugin` tracks the features and limits a server advertises
+in RPL_ISUPPORT (005) messages when a bot connects, such as how many channels
+the bot may join or how many targets a single PRIVMSG may have.
+
+Ex:
+
+.. code::python
+
+    isupport = isupport_plugin.isupport(bot)
+    if isupport.channel_limit('#notifico') == 0:
+        ...
+"""
+import dataclasses
+import re
+from typing import Dict, Iterable, Optional
+
+from notifico.botifico.bot import Bot
+from notifico.botifico.events import Event
+from notifico.botifico.logger import logger
+from notifico.botifico.plugin import Plugin
+
+
+def _unescape(value: str) -> str:
+    # Values may contain "\xHH" escapes for characters like spaces and "=".
+    return re.sub(r"\\x([0-9A-Fa-f]{2})", lambda m: chr(int(m[1], 16)), value)
+
+
+_ASCII = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"
+)
+_STRICT_RFC1459 = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ[]\\", "abcdefghijklmnopqrstuvwxyz{}|"
+)
+_RFC1459 = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ[]\\~", "abcdefghijklmnopqrstuvwxyz{}|^"
+)
+
+#: Translation tables for the case mappings a server may use.
+CASEMAPPINGS = {
+    "ascii": _ASCII,
+    "rfc1459": _RFC1459,
+    "strict-rfc1459": _STRICT_RFC1459,
+}
+
+
+def _limits(value: str) -> Dict[str, Optional[int]]:
+    """
+    Parse a list of limits like "PRIVMSG:4,NOTICE:,JOIN:1". An empty limit
+    means there is no limit.
+    """
+    limits = {}
+    for limit in value.split(","):
+        if not limit:
+            continue
+        key, _, count = limit.partition(":")
+        limits[key] = int(count) if count else None
+    return limits
+
+
+@dataclasses.dataclass
+class ISupport:
+    """
+    The features and limits advertised by a server.
+
+    Defaults are the values documented for servers that don't send a given
+    token.
+    """
+
+    #: Every token sent by the server, with its (unescaped) value.
+    tokens: Dict[str, Optional[str]] = dataclasses.field(default_factory=dict)
+    #: The name of the network, if the server told us.
+    network: Optional[str] = None
+    #: The case mapping used when comparing nicknames and channel names.
+    casemapping: str = "rfc1459"
+    #: The prefixes used for channel names.
+    chantypes: str = "#&"
+    #: The maximum number of channels that can be joined, by the set of
+    #: channel prefixes the limit applies to. `None` means no limit.
+    chanlimit: Dict[str, Optional[int]] = dataclasses.field(
+        default_factory=dict
+    )
+    #: The maximum number of targets allowed, by command. `None` means no
+    #: limit.
+    targmax: Dict[str, Optional[int]] = dataclasses.field(default_factory=dict)
+    #: The maximum length of a nickname.
+    nicklen: int = 9
+    #: The maximum length of a channel name.
+    channellen: int = 200
+    #: The maximum length of a topic, if limited.
+    topiclen: Optional[int] = None
+    #: The maximum number of modes with a parameter in a single MODE.
+    modes: Optional[int] = 3
+    #: Channel membership modes and their matching nickname prefixes.
+    prefix: Dict[str, str] = dataclasses.field(
+        default_factory=lambda: {"o": "@", "v": "+"}
+    )
+
+    def update(self, tokens: Iterable[str]):
+        """
+        Update the record with the tokens from an RPL_ISUPPORT message.
+        """
+        for token in tokens:
+            if token.startswith("-"):
+                # The server is no longer advertising this token.
+                self.tokens.pop(token[1:], None)
+                continue
+
+            key, has_value, value = token.partition("=")
+            value = _unescape(value) if has_value else None
+            self.tokens[key] = value
+
+            try:
+                self._apply(key, value)
+            except ValueError:
+                logger.warning(
+                    f"[isupport_plugin] Ignoring malformed token {token!r}."
+                )
+
+    def _apply(self, key: str, value: Optional[str]):
+        match key, value:
+            case "NETWORK", str():
+                self.network = value
+            case "CASEMAPPING", str():
+                self.casemapping = value.lower()
+            case "CHANTYPES", _:
+                self.chantypes = value or ""
+            case "CHANLIMIT", str():
+                self.chanlimit = _limits(value)
+            case "MAXCHANNELS", str() if "CHANLIMIT" not in self.tokens:
+                # Obsolete, but still sent by some older servers.
+                self.chanlimit = {self.chantypes: int(value)}
+            case "TARGMAX", _:
+                self.targmax = _limits(value or "")
+            case "MAXTARGETS", str() if "TARGMAX" not in self.tokens:
+                self.targmax = {
+                    "PRIVMSG": int(value),
+                    "NOTICE": int(value),
+                }
+            case "NICKLEN", str():
+                self.nicklen = int(value)
+            case "CHANNELLEN", _:
+                self.channellen = int(value) if value else 200
+            case "TOPICLEN", _:
+                self.topiclen = int(value) if value else None
+            case "MODES", _:
+                self.modes = int(value) if value else None
+            case "PREFIX", _:
+                parsed = re.fullmatch(r"\((.*)\)(.*)", value or "")
+                if parsed is None or len(parsed[1]) != len(parsed[2]):
+                    raise ValueError(value)
+                self.prefix = dict(zip(parsed[1], parsed[2]))
+
+    def casefold(self, value: str) -> str:
+        """
+        Returns `value` folded using the server's case mapping, for comparing
+        nicknames and channel names.
+        """
+        # Unknown mappings (like rfc7613) are close enough to rfc1459 for
+        # the channel names we deal with.
+        return value.translate(CASEMAPPINGS.get(self.casemapping, _RFC1459))
+
+    def chanlimit_group(self, channel: str) -> Optional[str]:
+        """
+        Returns the set of channel prefixes whose limit applies to `channel`,
+        or `None` if no limit applies.
+        """
+        for prefixes in self.chanlimit:
+            if channel[:1] in prefixes:
+                return prefixes
+        return None
+
+    def channel_limit(self, channel: str) -> Optional[int]:
+        """
+        The maximum number of channels like `channel` that may be joined, or
+        `None` if there is no limit.
+        """
+        group = self.chanlimit_group(channel)
+        return None if group is None else self.chanlimit[group]
+
+    def max_targets(self, command: str) -> Optional[int]:
+        """
+        The maximum number of targets `command` accepts, or `None` if there
+        is no limit.
+        """
+        return self.targmax.get(command, 1)
+
+
+class ISupportPlugin(Plugin):
+    def isupport(self, bot: Bot) -> ISupport:
+        isupport = self.get(bot, "isupport")
+        if isupport is None:
+            isupport = ISupport()
+            self.set(bot, "isupport", isupport)
+
+        return isupport
+
+
+isupport_plugin = ISupportPlugin(__name__)
+
+
+@isupport_plugin.on(Event.on_connected, block=True)
+async def on_connected(bot: Bot, plugin: ISupportPlugin):
+    # Nothing from a previous connection carries over.
+    plugin.set(bot, "isupport", ISupport())
+
+
+@isupport_plugin.on(Event.RPL_ISUPPORT, block=True)
+async def on_isupport(bot: Bot, plugin: ISupportPlugin, args):
+    # RPL_ISUPPORT is "<nick> <token>... :are supported by this server".
+    plugin.isupport(bot).update(args[1:-1])
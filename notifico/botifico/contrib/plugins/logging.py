@@ -6,11 +6,13 @@ import logging
 
 from notifico.botifico.events import Event
 from notifico.botifico.logger import logger
+from notifico.botifico.parsing import Message
 from notifico.botifico.plugin import Plugin
 
 log_plugin = Plugin(__name__)
 
 
 @log_plugin.on(Event.on_message)
-async def on_log(command, args, prefix):
-    logger.debug(f"[log_plugin][{command}][{prefix} {args}")
+async def on_log(message: Message):
+    # Log the line as we received it, and only format it if it'll be logged.
+    logger.debug("[log_plugin] %s", message.raw)
@@ -14,5 +14,7 @@ async def on_ping(bot: Bot, args):
     """
     On a `PING`, reply with a `PONG`.
     """
-    await bot.send("PONG", *args)
+    # Servers drop us if we take too long to reply, so don't wait behind any
+    # messages that are already queued.
+    await bot.send("PONG", *args, priority=True)
     logger.debug("[ping_plugin] PONGd a PING")
@@ -1,40 +1,142 @@
 """
-The :py:`rate_limit_plugin` provides a simple way rate limit sending messages.
+The :py:`rate_limit_plugin` rate limits messages being sent by a bot to avoid
+being disconnected for flooding.
+
+Most IRC servers implement flood protection as some variation of a token
+bucket - a client may send a burst of messages at once, after which it has to
+slow down to a steady rate. Some servers also count bytes rather than just
+lines. The limits can be configured for each network, or for every port of
+a host:
+
+.. code::python
+
+    rate_limit_plugin.configure(
+        Network('irc.libera.chat', 6697, True),
+        RateLimit(burst=4, rate=0.5)
+    )
+    rate_limit_plugin.configure('irc.oftc.net', RateLimit(burst=10))
 """
 import asyncio
-import random
+import dataclasses
 import time
+from typing import Dict, Optional, Union
 
-from notifico.botifico.bot import Bot
+from notifico.botifico.bot import Bot, Network
 from notifico.botifico.events import Event
 from notifico.botifico.logger import logger
 from notifico.botifico.plugin import Plugin
 
 
-rate_limit_plugin = Plugin(__name__)
+@dataclasses.dataclass(frozen=True)
+class RateLimit:
+    #: The maximum credit that can be built up, which is the number of
+    #: messages that can be sent back-to-back before being slowed down.
+    burst: float = 5
+    #: The credit regained every second.
+    rate: float = 1
+    #: The credit spent on every message.
+    message_cost: float = 1
+    #: The additional credit spent for every byte in a message.
+    byte_cost: float = 0
 
+    def cost(self, message: bytes) -> float:
+        """
+        The credit needed to send `message`.
+        """
+        # A message more expensive than the whole bucket could never be sent.
+        return min(
+            self.message_cost + len(message) * self.byte_cost, self.burst
+        )
 
-@rate_limit_plugin.on(Event.on_write, block=True)
-async def on_write(bot: Bot):
-    time_between_messages = rate_limit_plugin.get(
-        bot, "time_between_messages", 1
-    )
-    last_message = rate_limit_plugin.get(bot, "last_message", 0)
-
-    # We don't have to do anything fancy here, since there's no way for
-    # something to write unless it ignored our API and just wrote to the
-    # socket.
-    now = time.monotonic()
-
-    if now < last_message + time_between_messages:
-        how_long = last_message + time_between_messages - now
-        logger.debug(
-            f"[rate_limit_plugin] Sleeping for {how_long} seconds to comply"
-            " with rate limit requirements."
+
+class TokenBucket:
+    def __init__(self, limit: RateLimit):
+        self.limit = limit
+        self.tokens = limit.burst
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.limit.burst,
+            self.tokens + (now - self.updated) * self.limit.rate,
         )
-        await asyncio.sleep(
-            (last_message + time_between_messages - now)
-            + random.randint(0, time_between_messages * 2)
+        self.updated = now
+
+    def delay(self, cost: float) -> float:
+        """
+        The number of seconds until `cost` credit will be available.
+        """
+        self.refill()
+        if self.tokens >= cost:
+            return 0
+        return (cost - self.tokens) / self.limit.rate
+
+    async def acquire(self, cost: float):
+        """
+        Wait until `cost` credit is available, and spend it.
+        """
+        while (delay := self.delay(cost)) > 0:
+            logger.debug(
+                f"[rate_limit_plugin] Sleeping for {delay:.2f} seconds to"
+                " comply with rate limit requirements."
+            )
+            await asyncio.sleep(delay)
+
+        self.tokens -= cost
+
+
+class RateLimitPlugin(Plugin):
+    limits: Dict[Union[Network, str], RateLimit]
+
+    def __init__(self, name, *, default: Optional[RateLimit] = None):
+        super().__init__(name)
+        self.default = default or RateLimit()
+        self.limits = {}
+
+    def configure(self, network: Union[Network, str], limit: RateLimit):
+        """
+        Set the rate limit used for all future connections to `network`,
+        which may be a :class:`Network` or just a hostname.
+        """
+        self.limits[network] = limit
+
+    def limit(self, network: Network) -> RateLimit:
+        """
+        Returns the rate limit for connections to `network`.
+        """
+        if network in self.limits:
+            return self.limits[network]
+        return self.limits.get(network.host, self.default)
+
+    def bucket(self, bot: Bot) -> TokenBucket:
+        """
+        Returns the token bucket for the given bot, creating it if needed.
+        """
+        bucket = self.get(bot, "bucket")
+        if bucket is None:
+            bucket = TokenBucket(self.limit(bot.network))
+            self.set(bot, "bucket", bucket)
+        return bucket
+
+    def queue_delay(self, bot: Bot) -> float:
+        """
+        An estimate of how long (in seconds) a message queued now would wait
+        before being sent, counting the length of everything already queued
+        as well as the number of messages.
+        """
+        bucket = self.bucket(bot)
+        limit = bucket.limit
+        return bucket.delay(
+            bot.pending_writes * limit.message_cost
+            + bot.pending_bytes * limit.byte_cost
         )
 
-    rate_limit_plugin.set(bot, "last_message", time.monotonic())
+
+rate_limit_plugin = RateLimitPlugin(__name__)
+
+
+@rate_limit_plugin.on(Event.on_write, block=True)
+async def on_write(bot: Bot, plugin: RateLimitPlugin, message: bytes):
+    bucket = plugin.bucket(bot)
+    await bucket.acquire(bucket.limit.cost(message))
@@ -8,6 +8,12 @@ class Event(enum.Enum):
     on_disconnect = "on_disconnect"
     #: Triggered when a message is received.
     on_message = "on_message"
+    #: Triggered when a complete IRCv3 batch of messages has been received.
+    on_batch = "on_batch"
+    #: Triggered when a Bot managed by a Manager has lost its connection and
+    #: is about to try reconnecting, with the `attempt` number and the
+    #: `delay` (in seconds) before it does.
+    on_reconnect = "on_reconnect"
     #: Triggered when an unhandled exception occurs.
     on_exception = "on_exception"
 
@@ -15,8 +21,26 @@ class Event(enum.Enum):
     #: implementing rate limiting.
     on_write = "on_write"
 
+    #: Sent once we've successfully registered with the server.
+    RPL_WELCOME = "001"
+
+    #: Features and limits supported by the server.
+    RPL_ISUPPORT = "005"
+
     #: End of /motd command.
     RPL_ENDOFMOTD = "376"
 
     #: Server's MOTD fild could not be opened.
     ERR_NOMOTD = "422"
+
+    #: SASL authentication succeeded.
+    RPL_SASLSUCCESS = "903"
+
+    #: SASL authentication failed.
+    ERR_SASLFAIL = "904"
+
+    #: SASL authentication was aborted.
+    ERR_SASLABORTED = "906"
+
+    #: We've already authenticated using SASL.
+    ERR_SASLALREADY = "907"
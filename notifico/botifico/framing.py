@@ -0,0 +1,99 @@
+"""
+Incremental framing of the raw byte stream read off an IRC connection into
+complete, decoded lines.
+"""
+from typing import List
+
+from notifico.botifico.errors import ReadExceededError
+
+
+class LineFramer:
+    def __init__(
+        self,
+        *,
+        encoding: str = "utf-8",
+        fallback_encoding: str = "latin-1",
+        max_buffer_size: int = 0x100000,
+    ):
+        """
+        Splits a stream of bytes into lines.
+
+        Chunks are appended to an internal `bytearray` and only the trailing
+        partial line is ever kept around between calls to :meth:`feed`, so
+        the work done is linear in the amount of data read no matter how many
+        lines arrive in a single chunk.
+
+        Each line is decoded on its own using `encoding`. IRC has no concept
+        of an encoding, and plenty of clients still send latin-1 or worse, so
+        any line that fails to decode is decoded again with
+        `fallback_encoding` instead of killing the connection.
+
+        :param encoding: The preferred encoding for incoming lines.
+        :param fallback_encoding: The encoding to use when a line cannot be
+                                  decoded using `encoding`. Should be an
+                                  encoding that cannot fail, like latin-1.
+        :param max_buffer_size: The maximum number of bytes a partial line may
+                                grow to before giving up.
+        """
+        self.encoding = encoding
+        self.fallback_encoding = fallback_encoding
+        self.max_buffer_size = max_buffer_size
+        self.buffer = bytearray()
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def decode(self, line: bytes | memoryview) -> str:
+        """
+        Decode a single line, falling back to `fallback_encoding` on error.
+        """
+        try:
+            return str(line, self.encoding)
+        except UnicodeDecodeError:
+            return str(line, self.fallback_encoding, "replace")
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """
+        Append `chunk` to the buffer and return every line it completed,
+        without line endings.
+
+        Lines are terminated by LF with an optional preceding CR, since not
+        every server out there bothers with the CR. Empty lines are dropped.
+        """
+        buffer = self.buffer
+        # Only the newly appended data can contain a new line ending, so
+        # don't bother rescanning the partial line we already have.
+        start = len(buffer)
+        buffer += chunk
+
+        end = buffer.find(b"\n", start)
+        if end == -1:
+            if len(buffer) > self.max_buffer_size:
+                # Realistically, the only time this is actually going to
+                # happen is when connected to a malicious server.
+                raise ReadExceededError()
+            return []
+
+        lines = []
+        view = memoryview(buffer)
+        try:
+            position = 0
+            while end != -1:
+                line_end = end
+                if line_end > position and buffer[line_end - 1] == 0x0D:
+                    line_end -= 1
+
+                if line_end > position:
+                    lines.append(self.decode(view[position:line_end]))
+
+                position = end + 1
+                end = buffer.find(b"\n", position)
+        finally:
+            # A bytearray can't be resized while a view of it is exported.
+            view.release()
+
+        del buffer[:position]
+        if len(buffer) > self.max_buffer_size:
+            raise ReadExceededError()
+
+        return lines
@@ -1,19 +1,234 @@
 import asyncio
 import dataclasses
-from collections import defaultdict
-from typing import Dict, Set, Type, Optional, Iterable
+import random
+import ssl
+from collections import defaultdict, deque
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Set,
+    Type,
+    Optional,
+    Iterable,
+    List,
+    Tuple,
+)
 
 from notifico.botifico.bot import Network, Bot
+from notifico.botifico.contrib.plugins.isupport import (
+    ISupport,
+    isupport_plugin,
+)
 from notifico.botifico.contrib.plugins.ready import ready_plugin
 from notifico.botifico.events import Event
 from notifico.botifico.logger import logger
+from notifico.botifico.parsing import Prefix
 from notifico.botifico.plugin import Plugin
+from notifico.botifico.tls import create_ssl_context
+
+
+#: The maximum length of an IRC line, including the trailing CRLF.
+MAX_LINE_LENGTH = 512
+#: Room left for the ":nick!user@host " prefix a server adds to our messages
+#: when relaying them to a channel.
+HOSTMASK_RESERVE = 110
 
 
 @dataclasses.dataclass(frozen=True)
 class Channel:
     name: str
     password: Optional[str] = None
+    #: If set, short consecutive messages to this channel may be combined
+    #: into a single line.
+    pack_messages: bool = False
+
+
+def pack_lines(
+    channel: str, messages: List[str], *, separator: str = " | "
+) -> List[str]:
+    """
+    Combine consecutive messages into as few lines as possible, without any
+    line growing too long to be relayed to `channel`.
+    """
+    budget = (
+        MAX_LINE_LENGTH
+        - HOSTMASK_RESERVE
+        - len(f"PRIVMSG {channel} :\r\n".encode())
+    )
+
+    packed = []
+    for message in messages:
+        if packed:
+            candidate = f"{packed[-1]}{separator}{message}"
+            if len(candidate.encode()) <= budget:
+                packed[-1] = candidate
+                continue
+        packed.append(message)
+    return packed
+
+
+def batch_messages(
+    pending: Dict[Channel, List[str]],
+    *,
+    max_targets: int = 1,
+    separator: str = " | ",
+) -> List[Tuple[List[str], str]]:
+    """
+    Plan the PRIVMSGs needed to deliver `pending` messages, returning a list
+    of (targets, message) pairs.
+
+    Channels that are due the exact same messages are sent them in a single
+    PRIVMSG with several comma-separated targets, up to `max_targets` at
+    once. Channels that have opted into `pack_messages` have their messages
+    combined into as few lines as will fit first.
+
+    The order of messages to any single channel is always preserved.
+    """
+    # Group channels by the (possibly packed) lines they need to receive,
+    # preserving the order in which they were first seen.
+    groups: Dict[Tuple[str, ...], List[str]] = {}
+    for channel, messages in pending.items():
+        if channel.pack_messages:
+            messages = pack_lines(channel.name, messages, separator=separator)
+        groups.setdefault(tuple(messages), []).append(channel.name)
+
+    planned = []
+    for lines, channels in groups.items():
+        longest = max(len(line.encode()) for line in lines)
+
+        # Split the targets into chunks the server will accept, and that
+        # won't push the line we send over the limit.
+        chunks = [[]]
+        for channel in channels:
+            chunk = chunks[-1]
+            length = len(
+                f'PRIVMSG {",".join((*chunk, channel))} :\r\n'.encode()
+            )
+            if chunk and (
+                len(chunk) >= max_targets or length + longest > MAX_LINE_LENGTH
+            ):
+                chunks.append([channel])
+            else:
+                chunk.append(channel)
+
+        for line in lines:
+            for chunk in chunks:
+                planned.append((chunk, line))
+
+    return planned
+
+
+class MessageBatcher:
+    def __init__(self, bot: "ChannelBot", *, delay: float = 0.05):
+        """
+        Collects outgoing channel messages for a short period, so that they
+        can be sent using as few lines as possible.
+
+        :param bot: The bot messages will be sent through.
+        :param delay: How long (in seconds) to wait for more messages before
+                      sending.
+        """
+        self.bot = bot
+        self.delay = delay
+        self.pending: Dict[Channel, List[str]] = {}
+        self.flushed: Optional[asyncio.Future] = None
+        #: Running (or waiting) flushes.
+        self.flushes: Set[asyncio.Task] = set()
+        # A batch may still be blocked on a full outbound queue when the next
+        # one is ready, and must finish first to keep channels in order.
+        self.flush_lock = asyncio.Lock()
+        #: Lines of the batch being sent that haven't been queued on the bot.
+        self.sending: Deque[bytes] = deque()
+        #: Set by :meth:`close`, after which nothing more is sent.
+        self.closed = False
+
+    def queue(self, channel: Channel, message: str) -> asyncio.Future:
+        """
+        Add a message to the next batch, returning a future that completes
+        once it has been queued on the bot.
+
+        Messages to the same channel are always sent in the order they're
+        added.
+        """
+        if self.closed:
+            raise RuntimeError("The batcher has been closed.")
+
+        self.pending.setdefault(channel, []).append(message)
+
+        if self.flushed is None:
+            self.flushed = asyncio.get_running_loop().create_future()
+            task = asyncio.create_task(self.flush())
+            self.flushes.add(task)
+            task.add_done_callback(self.flushes.discard)
+
+        return self.flushed
+
+    async def add(self, channel: Channel, message: str):
+        """
+        Add a message to the next batch, returning once it has been queued
+        on the bot.
+        """
+        await asyncio.shield(self.queue(channel, message))
+
+    async def flush(self):
+        await asyncio.sleep(self.delay)
+
+        async with self.flush_lock:
+            # Anything added while waiting for the previous batch is sent
+            # along with this one.
+            pending, self.pending = self.pending, {}
+            flushed, self.flushed = self.flushed, None
+            self.sending = deque(self._lines(pending))
+
+            try:
+                while self.sending:
+                    await self.bot.send_raw(self.sending[0])
+                    self.sending.popleft()
+            except asyncio.CancelledError:
+                # Closed, which returns whatever is left in `sending`.
+                flushed.set_exception(
+                    RuntimeError("The batcher has been closed.")
+                )
+                raise
+            except Exception as exc:
+                # Let everyone waiting on this batch know it failed.
+                self.sending.clear()
+                flushed.set_exception(exc)
+            else:
+                flushed.set_result(None)
+
+    def _lines(self, pending: Dict[Channel, List[str]]) -> Iterable[bytes]:
+        for targets, message in batch_messages(
+            pending, max_targets=self.bot.max_targets
+        ):
+            yield f"PRIVMSG {','.join(targets)} :{message}\r\n".encode()
+
+    async def close(self) -> List[bytes]:
+        """
+        Stop sending batches, returning the lines of every message that
+        hasn't been queued on the bot yet, in order.
+
+        Messages can't be added once the batcher is closed, and anyone
+        waiting on the unsent messages gets a :class:`RuntimeError`.
+        """
+        self.closed = True
+        for task in self.flushes:
+            task.cancel()
+        await asyncio.gather(*self.flushes, return_exceptions=True)
+
+        unsent = list(self.sending)
+        self.sending.clear()
+
+        pending, self.pending = self.pending, {}
+        unsent.extend(self._lines(pending))
+        if self.flushed is not None:
+            self.flushed.set_exception(
+                RuntimeError("The batcher has been closed.")
+            )
+            self.flushed = None
+
+        return unsent
 
 
 class ChannelProxy:
@@ -25,8 +240,8 @@ class ChannelProxy:
         self.bot = bot
         self.network = network
         self.channel = channel
-        self.bot.register_handler("JOIN", self.on_join)
 
+        # Set and cleared by the ChannelBot as we JOIN and PART the channel.
         self.joined = asyncio.Event()
 
     async def join(self, *, wait=True, timeout: int = 10):
@@ -59,72 +274,244 @@ class ChannelProxy:
             await asyncio.wait_for(self.joined.wait(), timeout=timeout)
 
     async def private_message(self, message: str):
+        await asyncio.shield(await self.queue_message(message))
+
+    async def queue_message(self, message: str) -> asyncio.Future:
+        """
+        JOINs the channel if needed and adds `message` to the bot's next
+        batch, without waiting for it to be sent.
+
+        Returns a future that completes once the message has been queued on
+        the bot.
+        """
         await self.join()
-        await self.bot.send("PRIVMSG", self.channel.name, f":{message}")
+        return self.bot.batcher.queue(self.channel, message)
 
     async def notice(self, message: str):
         await self.bot.send("NOTICE", self.channel.name, f":{message}")
 
-    async def on_join(self, args):
-        if args[0].lower() == self.channel.name.lower():
-            self.joined.set()
-
 
 class ChannelBot(Bot):
     def __init__(self, manager: "Manager", network: Network, **kwargs):
         super().__init__(network=network, **kwargs)
         self.channels = {}
         self.manager = manager
+        self.batcher = MessageBatcher(self)
+        #: Our current nickname, once the server has told us.
+        self.nickname: Optional[str] = None
+        #: Channel proxies by their case-folded name, built lazily.
+        self.channel_index: Optional[Dict[str, List[ChannelProxy]]] = None
+        self.channel_index_casemapping: Optional[str] = None
+
+        self.register_handler(Event.on_connected, self.on_connected)
+        self.register_handler(Event.RPL_WELCOME, self.on_welcome)
+        self.register_handler("NICK", self.on_nick)
+        self.register_handler("JOIN", self.on_join)
+        self.register_handler("PART", self.on_part)
+        self.register_handler("KICK", self.on_kick)
+
+    @property
+    def isupport(self) -> ISupport:
+        """
+        The features and limits advertised by the server we're connected to.
+        """
+        return isupport_plugin.isupport(self)
 
-    def __getitem__(self, channel: Channel):
-        # FIXME: This is missing the logic to handle 005 messages for channel
-        #        limitations. Currently most networks limit you to 255 channels
-        #        per connection, and we're nowhere close to that anywhere but
-        #        irc.libera.chat.
-        return self.channels.setdefault(
-            channel,
-            ChannelProxy(bot=self, network=self.network, channel=channel),
+    @property
+    def max_targets(self) -> int:
+        """
+        The maximum number of targets a single PRIVMSG may have.
+        """
+        return self.isupport.max_targets("PRIVMSG") or 512
+
+    def has_room_for(self, channel: Channel) -> bool:
+        """
+        Returns `True` if this bot can take on `channel` without going over
+        the server's limit on joined channels.
+        """
+        isupport = self.isupport
+        group = isupport.chanlimit_group(channel.name)
+        if group is None or isupport.chanlimit[group] is None:
+            return True
+
+        joined = sum(
+            1
+            for c in self.channels
+            if isupport.chanlimit_group(c.name) == group
         )
+        return joined < isupport.chanlimit[group]
+
+    def __getitem__(self, channel: Channel):
+        proxy = self.channels.get(channel)
+        if proxy is None:
+            proxy = ChannelProxy(
+                bot=self, network=self.network, channel=channel
+            )
+            self.channels[channel] = proxy
+            self.channel_index = None
+        return proxy
+
+    def _proxies(self, channel: str) -> List[ChannelProxy]:
+        """
+        Returns all the proxies for the channel named `channel`.
+        """
+        casemapping = self.isupport.casemapping
+        if (
+            self.channel_index is None
+            or self.channel_index_casemapping != casemapping
+        ):
+            # The index is rebuilt lazily whenever a channel has been added
+            # or the server's casemapping has changed.
+            index = {}
+            for channel_proxy in self.channels.values():
+                index.setdefault(
+                    self.isupport.casefold(channel_proxy.channel.name), []
+                ).append(channel_proxy)
+            self.channel_index = index
+            self.channel_index_casemapping = casemapping
+
+        return self.channel_index.get(self.isupport.casefold(channel), [])
 
     def get_channel(self, channel: str) -> ChannelProxy | None:
+        proxies = self._proxies(channel)
+        return proxies[0] if proxies else None
+
+    def is_me(self, nickname: str) -> bool:
+        """
+        Returns `True` if `nickname` is our own nickname.
+        """
+        return self.nickname is not None and (
+            self.isupport.casefold(nickname)
+            == self.isupport.casefold(self.nickname)
+        )
+
+    async def on_connected(self):
+        # Nothing is joined on a fresh connection.
+        self.nickname = None
         for channel_proxy in self.channels.values():
-            if channel_proxy.channel.name == channel:
-                return channel_proxy
+            channel_proxy.joined.clear()
 
-    async def task_exception(self, ex: Exception):
-        try:
-            self.manager.bots[self.network].remove(self)
-        except KeyError:
-            # We don't care if some other source has already removed us from
-            # our manager's tracking set.
-            pass
+    async def on_welcome(self, args):
+        self.nickname = args[0]
+
+    async def on_nick(self, args, prefix: Prefix):
+        if prefix and self.is_me(prefix.nick):
+            self.nickname = args[0]
+
+    async def on_join(self, args, prefix: Prefix):
+        # Until we know our own nickname, assume every JOIN is our own.
+        if self.nickname is not None and not (
+            prefix and self.is_me(prefix.nick)
+        ):
+            return
 
-        await super().task_exception(ex)
+        for channel in args[0].split(","):
+            for channel_proxy in self._proxies(channel):
+                channel_proxy.joined.set()
+
+    async def on_part(self, args, prefix: Prefix):
+        if prefix and self.is_me(prefix.nick):
+            for channel in args[0].split(","):
+                for channel_proxy in self._proxies(channel):
+                    channel_proxy.joined.clear()
+
+    async def on_kick(self, args):
+        if self.is_me(args[1]):
+            for channel_proxy in self._proxies(args[0]):
+                channel_proxy.joined.clear()
+
+    async def drain(self):
+        """
+        Wait until every message, including any still being batched, has been
+        handed to the server.
+        """
+        if self.batcher.flushed is not None:
+            await asyncio.shield(self.batcher.flushed)
+        await super().drain()
+
+    async def stop_sending(self) -> List[bytes]:
+        """
+        Stop sending channel messages, and remove and return every line that
+        hasn't been written yet, including those still being batched.
+        """
+        # Closed first, or a batch waiting on a full outbound queue would
+        # fill it up again.
+        batched = await self.batcher.close()
+        return self.clear_outbound() + batched
 
 
 class Manager(Plugin):
     bots: Dict[Network, Set[ChannelBot]]
     bot_class: Type[Bot]
 
-    def __init__(self, name: str, *, bot_class: Type[ChannelBot] = ChannelBot):
+    def __init__(
+        self,
+        name: str,
+        *,
+        bot_class: Type[ChannelBot] = ChannelBot,
+        max_bots_per_network: int = 4,
+        ready_timeout: int = 60,
+        connect_interval: float = 5,
+        reconnect_delay: float = 1,
+        max_reconnect_delay: float = 300,
+        ssl_context_factory: Optional[
+            Callable[[Network], ssl.SSLContext]
+        ] = None,
+    ):
         """
         A Manager is a high-level coordinator of one or more bots connected to
         one or more networks.
 
         .. note::
 
-            The `Manager` will always enable the `ready_plugin`, as it's needed
-            to enable channel support.
+            The `Manager` will always enable the `ready_plugin` and the
+            `isupport_plugin`, as they're needed to enable channel support.
 
         :param name: A unique name for the bot, shared across all its instances.
                      Used for namespacing.
         :param bot_class: An optional alternative class to use instead of
                           :class:`ChannelBot`
+        :param max_bots_per_network: The maximum number of connections to
+                                     open to a single network when spreading
+                                     channels across bots.
+        :param ready_timeout: How long (in seconds) to wait for a bot to
+                              finish connecting before placing channels on it.
+        :param connect_interval: The minimum time (in seconds) between opening
+                                 connections to the same network, so we don't
+                                 trip its connection throttling.
+        :param reconnect_delay: The base delay (in seconds) before trying to
+                                reconnect a bot that was disconnected. It's
+                                doubled after every failed attempt.
+        :param max_reconnect_delay: The most we'll wait before trying to
+                                    reconnect.
+        :param ssl_context_factory: An optional callable that creates the TLS
+                                    context for a network using SSL. It's
+                                    called once per network, and the context
+                                    is shared by all of its bots. Defaults to
+                                    :func:`create_ssl_context`.
         """
         super().__init__(name)
         self.bot_class = bot_class
         self.bots = defaultdict(set)
+        self.max_bots_per_network = max_bots_per_network
+        self.ready_timeout = ready_timeout
+        self.connect_interval = connect_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        #: The task keeping each bot connected.
+        self.connections: Dict[ChannelBot, asyncio.Task] = {}
+        #: Bots waiting out the delay before their next reconnect.
+        self.reconnecting: Set[ChannelBot] = set()
+        #: The earliest time (in event loop time) we may next connect to each
+        #: network.
+        self.next_connect: Dict[Network, float] = {}
+        self.ssl_context_factory = ssl_context_factory
+        #: The TLS context of each network using SSL.
+        self.ssl_contexts: Dict[Network, ssl.SSLContext] = {}
+        #: Set once :meth:`shutdown` has been called.
+        self.closing = asyncio.Event()
         self.register_plugin(ready_plugin)
+        self.register_plugin(isupport_plugin)
 
     def register_plugin(self, plugin: Plugin):
         """
@@ -159,7 +546,7 @@ class Manager(Plugin):
         # If there's no bots at all, just assume we need to connect one.
         if not bots:
             bot = await self.add_bot_to_network(network)
-            asyncio.create_task(bot.connect())
+            self.connect(bot)
             return [bot]
 
         return bots
@@ -171,12 +558,135 @@ class Manager(Plugin):
 
         :param network: The Network associated with the new bot.
         """
-        bot = self.bot_class(self, network)
+        bot = self.bot_class(
+            self, network, ssl_context=self.ssl_context(network)
+        )
         bot.register_plugin(self)
         bot.register_handler(Event.on_disconnect, self.on_disconnect)
         self.bots[network].add(bot)
         return bot
 
+    def connect(self, bot: ChannelBot) -> asyncio.Task:
+        """
+        Connect `bot` in the background, and keep it connected until the
+        manager is shut down.
+
+        Whenever its connection ends, the bot is reconnected after a random
+        delay that grows with each failed attempt (exponential backoff with
+        "full jitter"), and the channels it was in are joined again.
+        """
+        task = asyncio.create_task(self._supervise(bot))
+        self.connections[bot] = task
+        task.add_done_callback(lambda _: self.connections.pop(bot, None))
+        return task
+
+    async def _wait_for_turn(self, network: Network):
+        """
+        Wait until enough time has passed since our last connection to
+        `network`.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self.next_connect.get(network, now))
+        self.next_connect[network] = start + self.connect_interval
+
+        if start > now:
+            logger.info(
+                f"[manager] Waiting {start - now:.1f}s before connecting to"
+                f" {network!r}."
+            )
+            await asyncio.sleep(start - now)
+
+    async def _supervise(self, bot: ChannelBot):
+        is_ready = ready_plugin.is_ready(bot)
+        attempt = 0
+        rejoin: List[ChannelProxy] = []
+
+        try:
+            # Bots taken out of `bots` by disconnect() stop reconnecting.
+            while bot in self.bots[bot.network]:
+                await self._wait_for_turn(bot.network)
+
+                restore = None
+                if rejoin:
+                    restore = asyncio.create_task(self._rejoin(bot, rejoin))
+
+                try:
+                    await bot.connect()
+                except Exception:
+                    # Already reported through Event.on_exception. Anything
+                    # left over was meant for the old connection.
+                    bot.clear_outbound()
+                finally:
+                    if restore is not None:
+                        restore.cancel()
+
+                if self.closing.is_set() or bot not in self.bots[bot.network]:
+                    return
+
+                # A connection that got as far as registering wasn't a
+                # failure, so the backoff starts over.
+                if is_ready.is_set():
+                    attempt = 0
+                    rejoin = [
+                        channel_proxy
+                        for channel_proxy in bot.channels.values()
+                        if channel_proxy.joined.is_set()
+                    ]
+                is_ready.clear()
+
+                attempt += 1
+                delay = random.uniform(
+                    0,
+                    min(
+                        self.max_reconnect_delay,
+                        self.reconnect_delay * 2 ** (attempt - 1),
+                    ),
+                )
+                logger.info(
+                    f"[manager] Reconnecting {bot} in {delay:.1f}s (attempt"
+                    f" {attempt})."
+                )
+                self.reconnecting.add(bot)
+                try:
+                    await bot.emit_event(
+                        Event.on_reconnect, attempt=attempt, delay=delay
+                    )
+                    await asyncio.wait_for(self.closing.wait(), timeout=delay)
+                    return
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    self.reconnecting.discard(bot)
+        finally:
+            self.bots[bot.network].discard(bot)
+
+    async def _rejoin(self, bot: ChannelBot, channels: List[ChannelProxy]):
+        """
+        Join `channels` again once `bot` has reconnected.
+        """
+        await ready_plugin.is_ready(bot).wait()
+        logger.info(f"[manager] Rejoining {len(channels)} channels on {bot}.")
+        for channel_proxy in channels:
+            await channel_proxy.join(wait=False)
+
+    def ssl_context(self, network: Network) -> Optional[ssl.SSLContext]:
+        """
+        Returns the TLS context shared by every bot on `network`, or `None`
+        if it doesn't use SSL.
+        """
+        if not network.ssl:
+            return None
+
+        context = self.ssl_contexts.get(network)
+        if context is None:
+            if self.ssl_context_factory is not None:
+                context = self.ssl_context_factory(network)
+            else:
+                context = create_ssl_context()
+            self.ssl_contexts[network] = context
+        return context
+
     async def channel(self, network: Network, channel: Channel) -> ChannelProxy:
         """
         Return a :py:`ChannelProxy` for a bot connected to the given network.
@@ -185,28 +695,161 @@ class Manager(Plugin):
         :param network: The Network to search for the channel.
         :param channel: The Channel to return.
         """
+        if self.closing.is_set():
+            raise RuntimeError("The manager is shutting down.")
+
         bots = list(await self.bots_by_network(network))
         for bot in bots:
             if channel in bot.channels:
                 return bot[channel]
 
-        # TODO: Check to see if the bot is at the channel cap per connection
-        #       (which comes from capabilities listed in 005), and create a
-        #       new connection if it is.
-        return bots[-1][channel]
+        # We can't know how many channels a bot can join until it has finished
+        # connecting and the server has told us its limits. Bots waiting to
+        # reconnect may be for minutes, so they're left out.
+        connecting = [
+            asyncio.create_task(ready_plugin.is_ready(bot).wait())
+            for bot in bots
+            if bot not in self.reconnecting
+        ]
+        if connecting:
+            _, pending = await asyncio.wait(
+                connecting, timeout=self.ready_timeout
+            )
+            for task in pending:
+                task.cancel()
+
+        # Someone else may have placed the channel while we were waiting.
+        bots = list(self.bots[network])
+        for bot in bots:
+            if channel in bot.channels:
+                return bot[channel]
+
+        ready = [bot for bot in bots if ready_plugin.is_ready(bot).is_set()]
+        candidates = [bot for bot in ready if bot.has_room_for(channel)]
+        if not candidates:
+            if len(bots) < self.max_bots_per_network:
+                logger.info(
+                    f"[manager] No connected bot on {network!r} has room,"
+                    " opening a new connection."
+                )
+                bot = await self.add_bot_to_network(network)
+                self.connect(bot)
+                return bot[channel]
+
+            if not ready:
+                raise asyncio.TimeoutError(
+                    f"No bot on {network!r} is connected, and the connection"
+                    " limit has been reached."
+                )
+
+            logger.warning(
+                f"[manager] All bots on {network!r} are full and the"
+                " connection limit has been reached."
+            )
+            candidates = ready
+
+        # Spread channels across connections, preferring the least loaded.
+        return min(candidates, key=lambda b: len(b.channels))[channel]
+
+    async def shutdown(
+        self, *, timeout: float = 10, reason: str = "Shutting down"
+    ) -> Dict[ChannelBot, List[bytes]]:
+        """
+        Disconnect every bot, giving them up to `timeout` seconds to finish
+        sending what they already have queued before they QUIT.
+
+        Returns the messages each bot didn't get to send in time, so they can
+        be saved and sent later.
+        """
+        self.closing.set()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        bots = [bot for bots in self.bots.values() for bot in bots]
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    *(bot.drain() for bot in bots), return_exceptions=True
+                ),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                "[manager] Timed out waiting for outgoing messages to be sent."
+            )
+
+        unsent = {}
+        for bot in bots:
+            leftover = await bot.stop_sending()
+            if leftover:
+                unsent[bot] = leftover
+            await bot.quit(reason)
+
+        # The server closes the connection once it has seen our QUIT. Anything
+        # that hasn't by the deadline, or never finished connecting, is
+        # dropped.
+        connections = list(self.connections.values())
+        if connections:
+            _, pending = await asyncio.wait(
+                connections, timeout=max(deadline - loop.time(), 1)
+            )
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+
+        return unsent
+
+    async def disconnect(
+        self,
+        network: Network,
+        *,
+        timeout: float = 10,
+        reason: str = "Disconnecting",
+    ) -> Dict[ChannelBot, List[bytes]]:
+        """
+        QUIT every bot on `network` and stop reconnecting them, such as when
+        another process has taken over the network.
+
+        Returns the messages each bot didn't get to send, like
+        :meth:`shutdown`.
+        """
+        bots = self.bots.pop(network, set())
+
+        unsent = {}
+        connections = []
+        for bot in bots:
+            leftover = await bot.stop_sending()
+            if leftover:
+                unsent[bot] = leftover
+
+            task = self.connections.get(bot)
+            if task is None:
+                continue
+            connections.append(task)
+
+            if ready_plugin.is_ready(bot).is_set():
+                await bot.quit(reason)
+            else:
+                # Still connecting, or waiting to reconnect.
+                task.cancel()
+
+        if connections:
+            _, pending = await asyncio.wait(connections, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+
+        return unsent
 
     async def on_disconnect(self, bot: ChannelBot):
         """
         Event handler called whenever a bot is disconnected from the network.
 
+        The bot is kept around, since it'll be reconnected unless we're
+        shutting down.
+
         :param bot: The bot disconnecting.
         """
-        try:
-            self.bots[bot.network].remove(bot)
-        except KeyError:
-            # In the very rare chance something else has already removed us
-            # (such as an exception occurring while handling disconnect), we
-            # don't really care.
-            pass
-
         logger.info(f"[manager] Bot disconnected cleanly {bot}")
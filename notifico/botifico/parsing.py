@@ -1,8 +1,12 @@
 import dataclasses
-from typing import Optional
+import datetime
+import re
+import sys
+from types import MappingProxyType
+from typing import Dict, Optional, Tuple, List, Mapping
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Prefix:
     nick: str
     user: Optional[str] = None
@@ -25,33 +29,177 @@ def unpack_prefix(prefix):
     return Prefix(nick=prefix, user=user, host=host)
 
 
+_TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+
+def unpack_tags(tags: str) -> Dict[str, str]:
+    """
+    Unpacks IRCv3 message tags (without the leading "@").
+
+    Tags without a value are given an empty string.
+    """
+    unpacked = {}
+    for tag in tags.split(";"):
+        if not tag:
+            continue
+        key, _, value = tag.partition("=")
+        if "\\" in value:
+            value = re.sub(
+                r"\\(.?)", lambda m: _TAG_ESCAPES.get(m[1], m[1]), value
+            )
+        unpacked[key] = value
+    return unpacked
+
+
+def server_time(tags: Dict[str, str]) -> Optional[datetime.datetime]:
+    """
+    Returns the time a message was sent from its IRCv3 `server-time` tag,
+    if present and valid.
+    """
+    value = tags.get("time")
+    if not value:
+        return None
+
+    try:
+        # fromisoformat() doesn't understand the "Z" suffix until 3.11.
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+#: Shared by every message without tags, so untagged lines don't each need
+#: their own empty dict.
+_NO_TAGS: Mapping[str, str] = MappingProxyType({})
+
+#: Normalized, interned commands by how they appeared on the wire.
+_COMMANDS: Dict[str, str] = {}
+#: The most commands we'll remember, so a misbehaving server can't grow
+#: :data:`_COMMANDS` forever.
+_MAX_COMMANDS = 512
+
+
+def _normalize_command(command: str) -> str:
+    normalized = sys.intern(command.upper())
+    if len(_COMMANDS) < _MAX_COMMANDS:
+        _COMMANDS[command] = normalized
+    return normalized
+
+
+class Message:
+    """
+    A single incoming IRC message.
+
+    The prefix is only unpacked when it's first used, since most handlers
+    never look at it. Commands are normalized to upper case and interned, so
+    comparing them is cheap.
+    """
+
+    __slots__ = ("raw", "tags", "source", "command", "args", "_prefix")
+
+    #: The complete line, as received (without the line ending).
+    raw: str
+    #: IRCv3 message tags, if any were sent.
+    tags: Mapping[str, str]
+    #: The unparsed prefix, without the leading ":", if there was one.
+    source: Optional[str]
+    command: str
+    args: List[str]
+
+    def __init__(
+        self,
+        raw: str,
+        tags: Mapping[str, str],
+        source: Optional[str],
+        command: str,
+        args: List[str],
+    ):
+        self.raw = raw
+        self.tags = tags
+        self.source = source
+        self.command = command
+        self.args = args
+        self._prefix = None
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}({self.raw!r})>"
+
+    @property
+    def prefix(self) -> Optional[Prefix]:
+        if self._prefix is None and self.source is not None:
+            self._prefix = unpack_prefix(self.source)
+        return self._prefix
+
+    @classmethod
+    def parse(cls, line: str) -> Optional["Message"]:
+        """
+        Parses a complete IRC message, returning `None` if the line is
+        empty.
+
+        :param line: An RFC compliant IRC message, optionally with IRCv3
+                     message tags.
+        """
+        raw = line = line.rstrip()
+        if not line:
+            return None
+
+        tags = _NO_TAGS
+        source = None
+
+        if line[0] == "@":
+            tags, _, line = line[1:].partition(" ")
+            tags = unpack_tags(tags)
+            line = line.lstrip()
+            if not line:
+                return cls(raw, tags, None, "", [])
+
+        if line[0] == ":":
+            source, _, line = line[1:].partition(" ")
+
+        trailing = line.find(" :")
+        if trailing == -1:
+            args = line.split()
+        else:
+            args = line[:trailing].split()
+            args.append(line[trailing + 2 :])
+
+        if args:
+            command = args.pop(0)
+            command = _COMMANDS.get(command) or _normalize_command(command)
+        else:
+            command = ""
+
+        return cls(raw, tags, source, command, args)
+
+
 def unpack_message(line):
     """
     Unpacks a complete, RFC compliant IRC message, returning the
     [optional] prefix, command, and parameters.
 
+    Any IRCv3 message tags are discarded, use
+    :func:`unpack_tagged_message` to keep them.
+
     :param line: An RFC compliant IRC message.
     """
-    if not line:
+    unpacked = unpack_tagged_message(line)
+    if unpacked is None:
         return None
+    return unpacked[1:]
 
-    prefix = None
-
-    line = line.rstrip()
 
-    if line[0] == ":":
-        prefix, line = line[1:].split(" ", 1)
-        prefix = unpack_prefix(prefix)
-    if " :" in line:
-        line, trailing = line.split(" :", 1)
-        args = line.split()
-        args.append(trailing)
-    else:
-        args = line.split()
+def unpack_tagged_message(
+    line,
+) -> Optional[Tuple[Dict[str, str], Optional[Prefix], str, List[str]]]:
+    """
+    Unpacks a complete IRC message, returning its IRCv3 tags, [optional]
+    prefix, command, and parameters.
 
-    try:
-        command = args.pop(0)
-    except IndexError:
-        command = ""
+    Prefer :meth:`Message.parse`, which avoids unpacking the prefix unless
+    it's needed.
 
-    return prefix, command.upper(), args
+    :param line: An RFC compliant IRC message.
+    """
+    message = Message.parse(line) if line else None
+    if message is None:
+        return None
+    return dict(message.tags), message.prefix, message.command, message.args
@@ -1,9 +1,23 @@
+import inspect
 from collections import defaultdict
-from typing import Dict, Set, Callable, Union
+from typing import Dict, Set, Callable, Union, FrozenSet
 
 from notifico.botifico.events import Event
 
 
+def handler_parameters(f: Callable) -> FrozenSet[str]:
+    """
+    Returns the names of the parameters accepted by the event handler `f`.
+
+    This is cached on the handler by :meth:`Plugin.on`, since it's far too
+    slow to be looked up every time an event is dispatched.
+    """
+    parameters = getattr(f, "handler_parameters", None)
+    if parameters is None:
+        parameters = frozenset(inspect.signature(f).parameters)
+    return parameters
+
+
 class Plugin:
     event_receivers: Dict[str, Set[Callable]]
     name: str
@@ -32,6 +46,7 @@ class Plugin:
             f.plugin = self
             # Yep this too.
             f.plugin_should_block = block
+            f.handler_parameters = handler_parameters(f)
             self.event_receivers[event].add(f)
             return f
 
@@ -0,0 +1,88 @@
+"""
+TLS support for bots connecting to networks over SSL.
+
+A single :class:`SessionCachingContext` should be kept for each network and
+shared by every connection to it, so the certificate store is only loaded
+once and reconnects can resume the previous TLS session instead of doing a
+full handshake.
+"""
+import ssl
+from typing import Optional
+
+
+class SessionCachingContext(ssl.SSLContext):
+    """
+    An :class:`ssl.SSLContext` that remembers the last TLS session
+    negotiated through it, and offers to resume it on the next connection.
+
+    Servers that don't support (or have forgotten) the session simply do a
+    full handshake. Since a session belongs to a single server, a context
+    should only be used to connect to one network.
+    """
+
+    #: The most recent session, set by :meth:`save_session`.
+    session: Optional[ssl.SSLSession] = None
+
+    def wrap_bio(
+        self,
+        incoming,
+        outgoing,
+        server_side=False,
+        server_hostname=None,
+        session=None,
+    ):
+        # asyncio never passes a session, so this is the only way to get one
+        # into the handshake.
+        return super().wrap_bio(
+            incoming,
+            outgoing,
+            server_side=server_side,
+            server_hostname=server_hostname,
+            session=session or self.session,
+        )
+
+    def save_session(self, ssl_object: Optional[ssl.SSLObject]):
+        """
+        Remember the session of a connection so it can be resumed later.
+
+        With TLS 1.3 the session ticket is only sent after the handshake, so
+        this is best called as the connection ends.
+        """
+        if ssl_object is not None and ssl_object.session is not None:
+            self.session = ssl_object.session
+
+
+def create_ssl_context(
+    *,
+    verify: bool = True,
+    cafile: Optional[str] = None,
+    certfile: Optional[str] = None,
+    keyfile: Optional[str] = None,
+) -> SessionCachingContext:
+    """
+    Create a context for connecting to a network over TLS.
+
+    :param verify: If `False`, the server's certificate isn't checked at
+                   all. Many IRC networks still use self-signed
+                   certificates.
+    :param cafile: An optional file of CA certificates to trust instead of
+                   the system's.
+    :param certfile: An optional client certificate, which networks can use
+                     to identify us (CertFP), including with SASL EXTERNAL.
+    :param keyfile: The private key for `certfile`, if it isn't included in
+                    the same file.
+    """
+    context = SessionCachingContext(ssl.PROTOCOL_TLS_CLIENT)
+
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    elif cafile:
+        context.load_verify_locations(cafile)
+    else:
+        context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+
+    if certfile:
+        context.load_cert_chain(certfile, keyfile)
+
+    return context
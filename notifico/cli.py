@@ -5,6 +5,7 @@ from pathlib import Path
 from typing import List
 
 import click
+from flask import current_app
 from flask.cli import FlaskGroup
 from sqlalchemy import update, delete
 
@@ -19,6 +20,12 @@ from notifico.models import (
     NetworkEvent,
 )
 from notifico.models.user import User
+from notifico.services.counters import MessageCounters
+from notifico.services.hook_cache import (
+    invalidate_network,
+    invalidate_project,
+    invalidate_user,
+)
 
 
 @click.group(cls=FlaskGroup, create_app=create_app)
@@ -112,6 +119,9 @@ def purge(make_changes=False):
         - Projects with 0 events older than 24h.
         - Users with 0 projects older than 30 days.
     """
+    # Projects might have messages that just haven't been counted yet.
+    MessageCounters.from_app(current_app).flush(db_session)
+
     projects = Project.query.filter(
         Project.message_count == 0,
         Project.created
@@ -122,6 +132,7 @@ def purge(make_changes=False):
         print(f"- [project] {project.name}")
 
         if make_changes:
+            invalidate_project(project)
             db_session.delete(project)
 
     if make_changes:
@@ -137,6 +148,7 @@ def purge(make_changes=False):
         print(f"- [user] {user.username}")
 
         if make_changes:
+            invalidate_user(user)
             db_session.delete(user)
 
     if make_changes:
@@ -219,6 +231,10 @@ def irc_merge(network_id: int, other_network: List[int]):
     if not confirm:
         return
 
+    # Cached hooks still send to the networks being merged away.
+    for other in IRCNetwork.query.filter(IRCNetwork.id.in_(other_network)):
+        invalidate_network(other)
+
     db_session.execute(
         update(Channel)
         .where(Channel.network_id.in_(other_network))
@@ -1,6 +1,5 @@
 import fnmatch
 import re
-import json
 
 import flask_wtf as wtf
 from functools import wraps
@@ -22,7 +21,7 @@ def simplify_payload(payload):
         "branch": None,
         "tag": None,
         "pusher": None,
-        "files": {"all": [], "added": [], "removed": [], "modified": []},
+        "files": {"added": 0, "removed": 0, "modified": 0},
         "original": payload,
     }
 
@@ -47,8 +46,7 @@ def simplify_payload(payload):
     # Summarize file movement over all the commits.
     for commit in payload.get("commits", tuple()):
         for type_ in ("added", "removed", "modified"):
-            result["files"][type_].extend(commit[type_])
-            result["files"]["all"].extend(commit[type_])
+            result["files"][type_] += len(commit[type_])
 
     return result
 
@@ -275,9 +273,9 @@ def _create_push_summary(project_name, j, config):
     # File movement summary.
     line.append(
         "[+{added}/-{removed}/\u00B1{modified}]".format(
-            added=len(j["files"]["added"]),
-            removed=len(j["files"]["removed"]),
-            modified=len(j["files"]["modified"]),
+            added=j["files"]["added"],
+            removed=j["files"]["removed"],
+            modified=j["files"]["modified"],
         )
     )
 
@@ -395,10 +393,10 @@ class GithubHook(EnvironmentMixin, IncomingHookService):
     def handle_request(cls, user, request, hook):
         # Support both json payloads as well as form encoded payloads
         if request.headers.get("Content-Type") == "application/json":
-            payload = request.get_json()
+            payload = cls.request_json(request)
         else:
             try:
-                payload = json.loads(request.form["payload"])
+                payload = cls.loads(request.form["payload"])
             except KeyError:
                 return
 
@@ -19,7 +19,7 @@ def simplify_payload(payload):
         "branch": None,
         "tag": None,
         "pusher": None,
-        "files": {"all": [], "added": [], "removed": [], "modified": []},
+        "files": {"added": 0, "removed": 0, "modified": 0},
         "original": payload,
     }
 
@@ -35,8 +35,7 @@ def simplify_payload(payload):
     # Summarize file movement over all the commits.
     for commit in payload.get("commits", []):
         for type_ in ("added", "removed", "modified"):
-            result["files"][type_].extend(commit[type_])
-            result["files"]["all"].extend(commit[type_])
+            result["files"][type_] += len(commit[type_])
 
     return result
 
@@ -202,9 +201,9 @@ def _create_push_summary(project_name, j, config):
     # File movement summary.
     line.append(
         "[+{added}/-{removed}/\u00B1{modified}]".format(
-            added=len(j["files"]["added"]),
-            removed=len(j["files"]["removed"]),
-            modified=len(j["files"]["modified"]),
+            added=j["files"]["added"],
+            removed=j["files"]["removed"],
+            modified=j["files"]["modified"],
         )
     )
 
@@ -301,7 +300,7 @@ class GitlabHook(EnvironmentMixin, IncomingHookService):
 
     @classmethod
     def handle_request(cls, user, request, hook):
-        payload = request.get_json()
+        payload = cls.request_json(request)
         if not payload:
             return
 
@@ -1,6 +1,10 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
 
 from notifico.settings import Settings
 
@@ -12,3 +16,44 @@ db_session = scoped_session(SessionLocal)
 
 Base = declarative_base()
 Base.query = db_session.query_property()
+
+T = TypeVar("T")
+
+#: The maximum number of threads used by :func:`run_in_session`, matching
+#: the default size of the engine's connection pool.
+DB_WORKERS = 5
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+async def run_in_session(f: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Call `f(session, *args, **kwargs)` in a worker thread, with a new session
+    that's committed if `f` returns and rolled back if it raises.
+
+    For use from asyncio code (such as the IRC bot), where querying the
+    database directly would block the event loop.
+
+    .. note::
+
+        Objects loaded by `f` are detached once it returns, so it should
+        return plain values rather than models.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=DB_WORKERS, thread_name_prefix="notifico-db"
+        )
+
+    def _run():
+        session: Session = SessionLocal()
+        try:
+            result = f(session, *args, **kwargs)
+            session.commit()
+            return result
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    return await asyncio.get_running_loop().run_in_executor(_executor, _run)
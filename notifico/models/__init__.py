@@ -1,7 +1,7 @@
 from notifico.models.chat import ChatLog, ChatMessage
 from notifico.models.user import User, Role, Permission
 from notifico.models.channel import Channel, IRCNetwork, NetworkEvent
-from notifico.models.hook import Hook
+from notifico.models.hook import Hook, MessageCountFlush
 from notifico.models.project import Project
 
 ALL_MODELS = [
@@ -11,6 +11,7 @@ ALL_MODELS = [
     Channel,
     IRCNetwork,
     Hook,
+    MessageCountFlush,
     Project,
     NetworkEvent,
     ChatLog,
@@ -160,6 +160,10 @@ class Channel(Base, HasPermissions):
     # Set if this channel should be logged.
     logged = sa.Column(sa.Boolean, default=False)
 
+    # Set if short, consecutive messages to this channel may be combined into
+    # a single line.
+    pack_messages = sa.Column(sa.Boolean, default=False)
+
     @classmethod
     def only_readable(cls, q: Query) -> Query:
         from notifico.models.project import Project
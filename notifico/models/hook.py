@@ -55,3 +55,16 @@ class Hook(Base):
                 )
             case _:
                 raise ValueError(f"Don't know how to generate a URL for {of=}.")
+
+
+class MessageCountFlush(Base):
+    """
+    A batch of message counts written to the database by
+    :class:`~notifico.services.counters.MessageCounters`, recorded in the
+    same transaction so a batch is never written twice.
+    """
+
+    __tablename__ = "message_count_flush"
+
+    id = sa.Column(sa.String(32), primary_key=True)
+    created = sa.Column(sa.TIMESTAMP(), default=datetime.datetime.utcnow)
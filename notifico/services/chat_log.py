@@ -0,0 +1,296 @@
+"""
+Writes chat messages logged by the IRC bot to the database.
+"""
+import asyncio
+import datetime
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import sentry_sdk
+import sqlalchemy as sa
+from sqlalchemy import orm
+from sqlalchemy.orm import Session
+
+from notifico.botifico.bot import Network
+from notifico.botifico.contrib.plugins.isupport import CASEMAPPINGS
+from notifico.botifico.logger import logger
+from notifico.database import run_in_session
+from notifico.models import ChatLog, ChatMessage, IRCNetwork
+from notifico.models import Channel as ChannelModel
+
+#: A logged line, as the ID of the ChatLog it belongs to and its ChatMessage
+#: values.
+Line = Tuple[int, Dict[str, Any]]
+
+#: A logged IRC channel, as its network and case-folded name.
+LoggedChannel = Tuple[Network, str]
+
+_RFC1459 = CASEMAPPINGS["rfc1459"]
+
+
+def _casefold(channel_name: str) -> str:
+    # Channels are configured without knowing the server's case mapping, so
+    # we use the most common one.
+    return channel_name.translate(_RFC1459)
+
+
+def _load_logged_channels(
+    session: Session,
+    *,
+    network: Optional[Network] = None,
+    channel_name: Optional[str] = None,
+) -> Dict[LoggedChannel, int]:
+    """
+    Returns the ChatLog ID of every IRC channel being logged, optionally
+    only for a single channel.
+
+    Channels that don't have a ChatLog yet are given one, shared by every
+    database channel for the same IRC channel.
+    """
+    channels = (
+        session.query(ChannelModel)
+        .join(ChannelModel.network)
+        .options(orm.contains_eager(ChannelModel.network))
+        .filter(
+            ChannelModel.logged.is_(True),
+            ChannelModel.public.is_(True),
+            sa.or_(
+                ChannelModel.password.is_(None), ChannelModel.password == ""
+            ),
+        )
+    )
+    if network is not None:
+        channels = channels.filter(
+            IRCNetwork.host == network.host,
+            IRCNetwork.port == network.port,
+            IRCNetwork.ssl == network.ssl,
+        )
+    if channel_name is not None:
+        # Narrowed down further below, using the right case mapping.
+        channels = channels.filter(
+            sa.func.lower(ChannelModel.channel) == channel_name.lower()
+        )
+
+    by_channel = defaultdict(list)
+    for channel in channels:
+        key = (
+            Network(
+                channel.network.host,
+                channel.network.port,
+                channel.network.ssl,
+            ),
+            _casefold(channel.channel),
+        )
+        by_channel[key].append(channel)
+
+    if channel_name is not None:
+        by_channel = {
+            k: v
+            for k, v in by_channel.items()
+            if k[1] == _casefold(channel_name)
+        }
+
+    logs = {}
+    for key, channels in by_channel.items():
+        # In theory every Channel that matches should have the same ChatLog.
+        chat_log = next((c.chat_log for c in channels if c.chat_log), None)
+        if chat_log is None:
+            chat_log = ChatLog(line_count=0)
+            session.add(chat_log)
+
+        for channel in channels:
+            channel.chat_log = chat_log
+
+        session.flush()
+        logs[key] = chat_log.id
+
+    return logs
+
+
+class LoggedChannels:
+    """
+    Tracks which IRC channels are being logged, and the ChatLog each of them
+    is logged to, so logging a line doesn't need to touch the database.
+
+    It should be loaded with :meth:`reload` at startup and periodically
+    after that, and kept up to date as logging is started and stopped with
+    :meth:`refresh`.
+    """
+
+    def __init__(self):
+        self.logs: Dict[LoggedChannel, int] = {}
+
+    def get(self, network: Network, channel_name: str) -> Optional[int]:
+        """
+        Returns the ID of the ChatLog for an IRC channel, or `None` if it
+        isn't being logged.
+        """
+        return self.logs.get((network, _casefold(channel_name)))
+
+    async def reload(self):
+        """
+        Reload every logged channel from the database.
+        """
+        self.logs = await run_in_session(_load_logged_channels)
+
+    async def refresh(self, network: Network, channel_name: str):
+        """
+        Reload a single IRC channel from the database, such as after logging
+        has been started or stopped.
+        """
+        logs = await run_in_session(
+            _load_logged_channels, network=network, channel_name=channel_name
+        )
+        key = (network, _casefold(channel_name))
+        if key in logs:
+            self.logs[key] = logs[key]
+        else:
+            self.logs.pop(key, None)
+
+
+def write_lines(session: Session, lines: List[Line]):
+    """
+    Write `lines` with a single multi-row INSERT, updating the line count of
+    each ChatLog once.
+    """
+    counts = defaultdict(int)
+    for log_id, _ in lines:
+        counts[log_id] += 1
+
+    session.execute(
+        sa.insert(ChatMessage),
+        [{**values, "log_id": log_id} for log_id, values in lines],
+    )
+    for log_id, count in counts.items():
+        session.execute(
+            sa.update(ChatLog)
+            .where(ChatLog.id == log_id)
+            .values(line_count=ChatLog.line_count + count)
+        )
+
+
+class ChatLogWriter:
+    """
+    Buffers logged chat messages and writes them to the database in batches,
+    rather than with a transaction per line.
+
+    Buffered lines are written once `flush_lines` have been collected or
+    `flush_interval` seconds after the first one, whichever comes first.
+    Call :meth:`close` before exiting to write anything still buffered.
+    """
+
+    def __init__(
+        self,
+        *,
+        flush_lines: int = 500,
+        flush_interval: float = 1,
+        max_buffered: int = 10000,
+    ):
+        """
+        :param flush_lines: The number of buffered lines that triggers a
+                            write.
+        :param flush_interval: The most time (in seconds) a line is buffered
+                               before being written.
+        :param max_buffered: The most lines that will be held in memory.
+                             Further lines are dropped until the buffer has
+                             been written, such as when the database is
+                             down.
+        """
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.buffer: List[Line] = []
+        #: The number of lines dropped because the buffer was full.
+        self.dropped = 0
+        #: The number of lines currently being written.
+        self._writing = 0
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def write(
+        self,
+        log_id: int,
+        *,
+        message: Dict[str, Any],
+        sender: Optional[str],
+        timestamp: datetime.datetime,
+    ) -> bool:
+        """
+        Buffer a line to be written to a ChatLog.
+
+        Returns `False` if the line was dropped because the buffer is full.
+        """
+        if len(self.buffer) + self._writing >= self.max_buffered:
+            if not self.dropped:
+                logger.warning("[chat_log] Buffer is full, dropping lines.")
+            self.dropped += 1
+            return False
+
+        self.buffer.append(
+            (
+                log_id,
+                {"message": message, "sender": sender, "timestamp": timestamp},
+            )
+        )
+
+        if len(self.buffer) == self.flush_lines:
+            self._spawn(self.flush())
+        elif self._timer is None:
+            self._timer = self._spawn(self._flush_later())
+
+        return True
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.flush_interval)
+        finally:
+            self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        """
+        Write everything buffered so far.
+        """
+        # Flushes happen one at a time, so lines are written in order.
+        async with self._lock:
+            lines, self.buffer = self.buffer, []
+            if not lines:
+                return
+
+            self._writing = len(lines)
+            try:
+                await self.write_lines(lines)
+            except Exception as exception:
+                # Retrying could hold on to a bad batch forever, so the
+                # lines are lost.
+                sentry_sdk.capture_exception(exception)
+                logger.exception(
+                    f"[chat_log] Failed to write {len(lines)} lines."
+                )
+            else:
+                if self.dropped:
+                    logger.warning(
+                        f"[chat_log] Dropped {self.dropped} lines while the"
+                        " buffer was full."
+                    )
+                    self.dropped = 0
+            finally:
+                self._writing = 0
+
+    async def write_lines(self, lines: List[Line]):
+        await run_in_session(write_lines, lines)
+
+    async def close(self):
+        """
+        Write anything still buffered, waiting for any writes in progress.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        await self.flush()
@@ -0,0 +1,169 @@
+"""
+Message counters for hooks and projects, collected in Redis and written to
+the database in batches rather than with an UPDATE per webhook.
+"""
+import datetime
+import uuid
+from typing import Dict, Iterable, Optional
+
+import sqlalchemy as sa
+from redis.exceptions import ResponseError
+from sqlalchemy.orm import Session
+
+from notifico.models import Hook, MessageCountFlush, Project
+
+
+class MessageCounters:
+    #: Key name for the hash of uncounted messages, by hook ID.
+    key_hooks = "counters:hook"
+    #: Key name for the hash of uncounted messages, by project ID.
+    key_projects = "counters:project"
+    #: Suffix for a hash that's in the middle of being flushed.
+    flushing_suffix = ":flushing"
+    #: How long the IDs of completed flushes are kept in the database.
+    flushes_kept_for = datetime.timedelta(days=7)
+
+    def __init__(self, redis=None):
+        self._redis = redis
+
+    @classmethod
+    def from_app(cls, app):
+        """
+        Returns a MessageCounters configured for the given Flask app.
+        """
+        return cls(redis=app.redis)
+
+    @property
+    def r(self):
+        return self._redis
+
+    def increment(self, hook_id: int, project_id: int, amount: int = 1):
+        """
+        Count `amount` messages received by a hook and its project.
+        """
+        with self.r.pipeline(transaction=False) as pipe:
+            pipe.hincrby(self.key_hooks, hook_id, amount)
+            pipe.hincrby(self.key_projects, project_id, amount)
+            pipe.execute()
+
+    def _pending(
+        self, key: str, ids: Optional[Iterable[int]]
+    ) -> Dict[int, int]:
+        # Counts being flushed haven't reached the database yet either.
+        keys = (key, key + self.flushing_suffix)
+
+        pending = {}
+        if ids is None:
+            with self.r.pipeline(transaction=False) as pipe:
+                for k in keys:
+                    pipe.hgetall(k)
+                for counts in pipe.execute():
+                    for k, v in counts.items():
+                        pending[int(k)] = pending.get(int(k), 0) + int(v)
+            return pending
+
+        ids = list(ids)
+        if not ids:
+            return pending
+
+        with self.r.pipeline(transaction=False) as pipe:
+            for k in keys:
+                pipe.hmget(k, ids)
+            for counts in pipe.execute():
+                for id_, v in zip(ids, counts):
+                    if v is not None:
+                        pending[id_] = pending.get(id_, 0) + int(v)
+        return pending
+
+    def pending_hooks(
+        self, hook_ids: Optional[Iterable[int]] = None
+    ) -> Dict[int, int]:
+        """
+        Returns the messages counted for hooks that haven't been written to
+        the database yet, for the given hooks or all of them.
+        """
+        return self._pending(self.key_hooks, hook_ids)
+
+    def pending_projects(
+        self, project_ids: Optional[Iterable[int]] = None
+    ) -> Dict[int, int]:
+        """
+        Returns the messages counted for projects that haven't been written
+        to the database yet, for the given projects or all of them.
+        """
+        return self._pending(self.key_projects, project_ids)
+
+    def flush(self, session: Session):
+        """
+        Write every pending count to the database, with one UPDATE per hook
+        and project rather than one per message.
+
+        Counts being written are set aside in Redis under a flush ID, which
+        is recorded in the same transaction as the UPDATE and only removed
+        from Redis once it's been committed. Counts never go missing from
+        :meth:`pending_hooks` and :meth:`pending_projects` before they're in
+        the database (though they're briefly counted twice, between the
+        commit and removing them), and a flush that's interrupted after
+        committing is recognised and not written again.
+        """
+        for key, model in (
+            (self.key_hooks, Hook),
+            (self.key_projects, Project),
+        ):
+            flushing = key + self.flushing_suffix
+
+            # Left behind by a flush that didn't finish, which has to be
+            # finished first or RENAME would overwrite it.
+            if self.r.exists(flushing):
+                self._flush(session, model, flushing)
+
+            try:
+                # Atomically takes the current counts, while new ones start
+                # over in a fresh hash.
+                self.r.rename(key, flushing)
+            except ResponseError:
+                # Nothing has been counted.
+                continue
+
+            self._flush(session, model, flushing)
+
+    def _flush(self, session: Session, model, flushing: str):
+        flushing_id = flushing + ":id"
+
+        # Keeps the ID of an earlier attempt to flush the same counts.
+        with self.r.pipeline(transaction=False) as pipe:
+            pipe.set(flushing_id, uuid.uuid4().hex, nx=True)
+            pipe.get(flushing_id)
+            pipe.hgetall(flushing)
+            _, flush_id, counts = pipe.execute()
+        flush_id = flush_id.decode("utf-8")
+
+        try:
+            if session.query(MessageCountFlush).get(flush_id) is None:
+                self._write(session, model, counts)
+                session.add(MessageCountFlush(id=flush_id))
+                session.query(MessageCountFlush).filter(
+                    MessageCountFlush.created
+                    < datetime.datetime.utcnow() - self.flushes_kept_for
+                ).delete(synchronize_session=False)
+                session.commit()
+        except Exception:
+            # Still set aside, to be tried again by the next flush.
+            session.rollback()
+            raise
+
+        self.r.delete(flushing, flushing_id)
+
+    @staticmethod
+    def _write(session: Session, model, counts: Dict[bytes, bytes]):
+        if not counts:
+            return
+
+        table = model.__table__
+        count = sa.func.coalesce(table.c.message_count, 0)
+        session.execute(
+            sa.update(table)
+            .where(table.c.id == sa.bindparam("row_id"))
+            .values(message_count=count + sa.bindparam("amount")),
+            [{"row_id": int(k), "amount": int(v)} for k, v in counts.items()],
+        )
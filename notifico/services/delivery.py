@@ -0,0 +1,547 @@
+"""
+Consumers for the queue of outgoing messages filled by
+:class:`~notifico.services.messages.MessageService`, used by the IRC bot.
+"""
+import asyncio
+import dataclasses
+import math
+import os
+import random
+import socket
+import time
+from collections import defaultdict, deque
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+
+from notifico.botifico.logger import logger
+from notifico.services.messages import MessageService
+
+
+@dataclasses.dataclass(frozen=True)
+class Delivery:
+    """
+    A single message taken off the queue, which must be acknowledged once
+    it's been handled.
+    """
+
+    #: The JSON-encoded message.
+    payload: bytes
+    #: The stream the message was read from, when using stream delivery.
+    stream: Optional[str] = None
+    #: The ID of the message in its stream.
+    id: Optional[bytes] = None
+
+
+class QueueConsumer:
+    """
+    Consumes messages from the Redis list used as the outgoing message queue.
+
+    Messages are atomically moved onto a processing list as they're received,
+    and only removed from it once they've been acknowledged with :meth:`ack`.
+    If the bot dies while messages are in flight, :meth:`recover` puts them
+    back at the front of the queue the next time it starts.
+
+    This only relies on BLMOVE (Redis 6.2+), and doesn't need keyspace
+    notifications or any other change to the Redis configuration.
+    """
+
+    def __init__(
+        self,
+        r: redis.Redis,
+        *,
+        key: str = MessageService.key_queue_messages,
+        processing_key: str = MessageService.key_processing_messages,
+        batch_size: int = 100,
+        timeout: int = 5,
+    ):
+        """
+        :param r: An asyncio Redis client.
+        :param key: The list messages are pushed to.
+        :param processing_key: The list messages are parked on until they've
+                               been acknowledged.
+        :param batch_size: The maximum number of messages to take off the
+                           queue at once.
+        :param timeout: The number of seconds to block waiting for a message
+                        before trying again.
+        """
+        self.r = r
+        self.key = key
+        self.processing_key = processing_key
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    async def recover(self) -> int:
+        """
+        Return any messages left unacknowledged by a previous run to the
+        front of the queue, in their original order.
+
+        Returns the number of recovered messages.
+        """
+        recovered = 0
+        while await self.r.lmove(
+            self.processing_key, self.key, "RIGHT", "LEFT"
+        ):
+            recovered += 1
+        return recovered
+
+    async def receive(self) -> List[Delivery]:
+        """
+        Wait for messages to be pushed onto the queue, returning up to
+        `batch_size` of them.
+
+        Returns an empty list if nothing arrived before the timeout.
+        """
+        first = await self.r.blmove(
+            self.key, self.processing_key, self.timeout, "LEFT", "RIGHT"
+        )
+        if first is None:
+            return []
+
+        # Grab whatever else is already waiting in a single round trip. LMOVE
+        # on an empty list just returns None, so we can't over-read.
+        async with self.r.pipeline(transaction=False) as pipe:
+            for _ in range(self.batch_size - 1):
+                pipe.lmove(self.key, self.processing_key, "LEFT", "RIGHT")
+            rest = await pipe.execute()
+
+        return [Delivery(payload=m) for m in (first, *rest) if m is not None]
+
+    async def ack(self, *deliveries: Delivery):
+        """
+        Acknowledge that `deliveries` have been handled, removing them from
+        the processing list.
+
+        LREM searches the list from the front, where the oldest messages
+        are, and since messages are mostly acknowledged in the order they
+        were received it usually stops after a few entries. Identical
+        messages can't be told apart, so acknowledging one of them removes
+        whichever copy comes first. That's harmless, since the copies left
+        behind are the same as the ones still in flight.
+        """
+        if not deliveries:
+            return
+
+        async with self.r.pipeline(transaction=False) as pipe:
+            for delivery in deliveries:
+                pipe.lrem(self.processing_key, 1, delivery.payload)
+            await pipe.execute()
+
+    async def requeue(self, network_id: int, *payloads: bytes):
+        """
+        Put new messages at the front of the queue, such as those a bot
+        didn't get to send before shutting down.
+
+        :param network_id: The network the messages are for. Unused, since
+                           every network shares the same queue.
+        :param payloads: The JSON-encoded messages, in the order they should
+                         be sent.
+        """
+        if payloads:
+            # LPUSH reverses its arguments, so the first ends up in front.
+            await self.r.lpush(self.key, *reversed(payloads))
+
+
+# Only touch a lease if we're still the one holding it.
+_RENEW_LEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class StreamConsumer:
+    """
+    Consumes messages from the per-network Redis Streams used for stream
+    delivery.
+
+    Several bot processes can run at once. Each network is handled by a
+    single process at a time, which holds a lease on it that must be
+    renewed by calling :meth:`claim_networks` regularly. Processes only
+    take on new networks while they hold less than their fair share, and
+    give up any networks over their share, so a newly started process gets
+    some of the load. The leases of a process that stops renewing them
+    expire and are picked up by the others.
+
+    Messages are read through a consumer group and acknowledged with
+    :meth:`ack`. Messages left unacknowledged for too long, such as those
+    held by a process that died, are claimed and delivered again.
+    """
+
+    #: Key name for the lease on a network.
+    key_lease = "messages:lease:{network_id}"
+    #: Key name for the sorted set of live consumers, scored by when their
+    #: registration expires.
+    key_consumers = "messages:consumers"
+
+    def __init__(
+        self,
+        r: redis.Redis,
+        *,
+        group: str = "notifico",
+        name: Optional[str] = None,
+        lease_ttl: int = 30,
+        claim_idle: int = 60,
+        batch_size: int = 100,
+        timeout: int = 5,
+    ):
+        """
+        :param r: An asyncio Redis client.
+        :param group: The name of the consumer group shared by all bot
+                      processes.
+        :param name: A unique name for this consumer, defaulting to the
+                     hostname and PID.
+        :param lease_ttl: The number of seconds a lease on a network lasts
+                          without being renewed.
+        :param claim_idle: The number of seconds a message may go without
+                           being acknowledged before it's delivered again.
+        :param batch_size: The maximum number of messages to read at once.
+        :param timeout: The number of seconds to block waiting for a message
+                        before trying again.
+        """
+        self.r = r
+        self.group = group
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_ttl = lease_ttl
+        self.claim_idle = claim_idle
+        self.batch_size = batch_size
+        self.timeout = timeout
+        #: The IDs of the networks we currently hold a lease on.
+        self.networks: Set[int] = set()
+        #: Messages that have been delivered and not yet acknowledged.
+        self.in_flight: Set[Delivery] = set()
+        #: Reclaimed messages waiting to be delivered.
+        self.reclaimed: List[Delivery] = []
+        self._renew = r.register_script(_RENEW_LEASE)
+        self._release = r.register_script(_RELEASE_LEASE)
+
+    @staticmethod
+    def stream(network_id: int) -> str:
+        return MessageService.key_stream_messages.format(network_id=network_id)
+
+    async def claim_networks(self) -> Tuple[Set[int], Set[int]]:
+        """
+        Renew the leases we hold, take on new networks up to our fair share
+        (or give up those over it), and reclaim stuck messages.
+
+        Returns the IDs of any newly claimed networks, and of any networks
+        we no longer hold. Bots on networks we no longer hold should be
+        disconnected, since another process is taking them over.
+        """
+        now = time.time()
+        async with self.r.pipeline(transaction=False) as pipe:
+            pipe.zadd(self.key_consumers, {self.name: now + self.lease_ttl})
+            pipe.zremrangebyscore(self.key_consumers, "-inf", now)
+            pipe.zcard(self.key_consumers)
+            pipe.smembers(MessageService.key_stream_networks)
+            _, _, consumers, networks = await pipe.execute()
+
+        ttl = self.lease_ttl * 1000
+        lost = set()
+        for network_id in list(self.networks):
+            key = self.key_lease.format(network_id=network_id)
+            if not await self._renew(keys=[key], args=[self.name, ttl]):
+                logger.warning(f"[delivery] Lost the lease on {network_id}.")
+                self.networks.discard(network_id)
+                lost.add(network_id)
+
+        networks = {int(n) for n in networks}
+        share = math.ceil(len(networks) / max(consumers, 1))
+
+        # Make room for processes that have just started, which would
+        # otherwise never get anything.
+        excess = len(self.networks) - share
+        if excess > 0:
+            released = random.sample(sorted(self.networks), excess)
+            for network_id in released:
+                key = self.key_lease.format(network_id=network_id)
+                await self._release(keys=[key], args=[self.name])
+                self.networks.discard(network_id)
+                lost.add(network_id)
+            logger.info(f"[delivery] Released networks {sorted(released)}.")
+
+        # Shuffled, so processes starting together don't all go after the
+        # same networks.
+        unclaimed = list(networks - self.networks)
+        random.shuffle(unclaimed)
+
+        claimed = set()
+        for network_id in unclaimed:
+            if len(self.networks) >= share:
+                break
+
+            key = self.key_lease.format(network_id=network_id)
+            if await self.r.set(key, self.name, nx=True, px=ttl):
+                await self._create_group(self.stream(network_id))
+                self.networks.add(network_id)
+                claimed.add(network_id)
+
+        if claimed:
+            logger.info(f"[delivery] Claimed networks {sorted(claimed)}.")
+
+        for network_id in self.networks:
+            await self._reclaim(self.stream(network_id))
+
+        return claimed, lost
+
+    async def add_networks(self, network_ids: Iterable[int]):
+        """
+        Make networks available to be claimed before anything has been sent
+        to them, such as those with logged channels to join.
+
+        Networks are otherwise only added once a message is queued for them.
+        """
+        network_ids = list(network_ids)
+        if network_ids:
+            await self.r.sadd(MessageService.key_stream_networks, *network_ids)
+
+    async def release(self):
+        """
+        Give up all of our leases, so other processes can pick up our
+        networks right away.
+        """
+        for network_id in self.networks:
+            key = self.key_lease.format(network_id=network_id)
+            await self._release(keys=[key], args=[self.name])
+
+        self.networks.clear()
+        await self.r.zrem(self.key_consumers, self.name)
+
+    async def _create_group(self, stream: str):
+        try:
+            await self.r.xgroup_create(
+                stream, self.group, id="0", mkstream=True
+            )
+        except ResponseError as exception:
+            if "BUSYGROUP" not in str(exception):
+                raise
+
+    async def _reclaim(self, stream: str):
+        """
+        Claim every message in `stream` that has gone unacknowledged for too
+        long, queueing it to be delivered again.
+        """
+        start = "0-0"
+        while True:
+            response = await self.r.xautoclaim(
+                stream,
+                self.group,
+                self.name,
+                self.claim_idle * 1000,
+                start_id=start,
+                count=self.batch_size,
+            )
+            start, entries = response[0], response[1]
+
+            for delivery in await self._deliveries(stream, entries):
+                # We may simply be slow to handle something ourselves.
+                if delivery not in self.in_flight:
+                    self.reclaimed.append(delivery)
+
+            if start in (b"0-0", "0-0"):
+                return
+
+    async def _deliveries(self, stream, entries) -> List[Delivery]:
+        deliveries = []
+        trimmed = []
+        for entry_id, fields in entries:
+            # Entries trimmed from the stream while pending have no fields.
+            if not fields:
+                trimmed.append(entry_id)
+                continue
+            deliveries.append(
+                Delivery(payload=fields[b"message"], stream=stream, id=entry_id)
+            )
+
+        if trimmed:
+            # There's nothing left to deliver, and before Redis 7 they'd stay
+            # pending (and be claimed again) forever.
+            await self.r.xack(stream, self.group, *trimmed)
+        return deliveries
+
+    async def receive(self) -> List[Delivery]:
+        """
+        Wait for messages on the streams of the networks we hold, returning
+        up to `batch_size` of them.
+
+        Returns an empty list if nothing arrived before the timeout.
+        """
+        if self.reclaimed:
+            deliveries = self.reclaimed[: self.batch_size]
+            del self.reclaimed[: self.batch_size]
+        elif not self.networks:
+            await asyncio.sleep(self.timeout)
+            return []
+        else:
+            response = await self.r.xreadgroup(
+                self.group,
+                self.name,
+                {self.stream(n): ">" for n in self.networks},
+                count=self.batch_size,
+                block=self.timeout * 1000,
+            )
+            deliveries = [
+                delivery
+                for stream, entries in response or ()
+                for delivery in await self._deliveries(stream.decode(), entries)
+            ]
+
+        self.in_flight.update(deliveries)
+        return deliveries
+
+    def holds(self, delivery: Delivery) -> bool:
+        """
+        Returns `True` if we still hold the network `delivery` is for.
+        """
+        return any(delivery.stream == self.stream(n) for n in self.networks)
+
+    def forget(self, delivery: Delivery):
+        """
+        Stop tracking `delivery` without acknowledging it, leaving it to be
+        claimed by whichever process now holds its network.
+        """
+        self.in_flight.discard(delivery)
+
+    async def ack(self, *deliveries: Delivery):
+        """
+        Acknowledge that `deliveries` have been handled.
+        """
+        by_stream = defaultdict(list)
+        for delivery in deliveries:
+            by_stream[delivery.stream].append(delivery.id)
+            self.in_flight.discard(delivery)
+
+        for stream, ids in by_stream.items():
+            await self.r.xack(stream, self.group, *ids)
+
+    async def requeue(self, network_id: int, *payloads: bytes):
+        """
+        Add new messages to the stream of `network_id`, such as those a bot
+        didn't get to send before shutting down.
+
+        Streams can only be appended to, so they'll be sent after anything
+        already waiting for the network.
+        """
+        if not payloads:
+            return
+
+        async with self.r.pipeline(transaction=False) as pipe:
+            for payload in payloads:
+                pipe.xadd(self.stream(network_id), {"message": payload})
+            pipe.sadd(MessageService.key_stream_networks, network_id)
+            await pipe.execute()
+
+
+class OrderedDispatcher:
+    """
+    Hands queued messages to a handler, keeping messages with the same key
+    in order while limiting how many are being handled at once.
+
+    Every key gets its own FIFO queue and worker, which is only running
+    while there's something in the queue. The handler is awaited for one
+    message at a time, and may return an awaitable for any remaining work
+    that doesn't affect ordering (such as waiting for the message to
+    actually be sent), letting the worker move on to the next message.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[Optional[Awaitable]]],
+        *,
+        max_in_flight: int = 1000,
+    ):
+        """
+        :param handler: Called with each message, in order for each key.
+        :param max_in_flight: The maximum number of messages that may be
+                              queued or being handled at once. Once reached,
+                              :meth:`submit` waits for one to finish.
+        """
+        self.handler = handler
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.queues: Dict[Hashable, Deque[Any]] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        #: The running worker for each key with queued messages.
+        self.workers: Set[asyncio.Task] = set()
+
+    @property
+    def depths(self) -> Dict[Hashable, int]:
+        """
+        The number of messages waiting to be handled, by key.
+        """
+        return {key: len(queue) for key, queue in self.queues.items()}
+
+    def depth(self, key: Hashable) -> int:
+        """
+        The number of messages waiting to be handled for `key`.
+        """
+        queue = self.queues.get(key)
+        return len(queue) if queue is not None else 0
+
+    async def submit(self, key: Hashable, message: Any):
+        """
+        Queue `message` to be handled after every earlier message with the
+        same `key`.
+        """
+        await self.slots.acquire()
+
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+            worker = self._spawn(self._work(key, queue))
+            self.workers.add(worker)
+            worker.add_done_callback(self.workers.discard)
+
+        queue.append(message)
+
+    def cancel(self):
+        """
+        Stop handling messages. Messages still waiting to be handled are
+        dropped, while any remaining work returned by the handler for
+        earlier messages is left to finish.
+        """
+        for worker in self.workers:
+            worker.cancel()
+
+    def _spawn(self, coroutine: Awaitable) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _work(self, key: Hashable, queue: Deque[Any]):
+        try:
+            while queue:
+                remaining = None
+                try:
+                    remaining = await self.handler(queue.popleft())
+                except Exception:
+                    logger.exception(f"[delivery] Failed to handle {key!r}")
+
+                if remaining is None:
+                    self.slots.release()
+                else:
+                    self._spawn(remaining).add_done_callback(
+                        lambda _: self.slots.release()
+                    )
+        finally:
+            del self.queues[key]
@@ -0,0 +1,184 @@
+"""
+A cache of everything needed to handle a request to an incoming webhook, so
+that the (very busy) hook endpoint doesn't need to touch the database.
+
+Cached hooks must be invalidated whenever the hook, its project, or the
+project's channels (or their networks) are changed.
+"""
+import dataclasses
+from typing import Any, Iterable, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import orm
+
+from notifico import hook_cache
+from notifico.models import Channel, Hook, IRCNetwork, Project, User
+
+#: Cache key for a hook, by its key.
+key_hook = "hook:{key}"
+
+
+@dataclasses.dataclass(frozen=True)
+class CachedNetwork:
+    id: int
+    host: str
+    port: int
+    ssl: bool
+
+
+@dataclasses.dataclass(frozen=True)
+class CachedChannel:
+    """
+    The parts of a :class:`~notifico.models.Channel` needed to send it a
+    message.
+    """
+
+    id: int
+    channel: str
+    password: Optional[str]
+    pack_messages: bool
+    network_id: int
+    network: CachedNetwork
+
+
+@dataclasses.dataclass(frozen=True)
+class CachedProject:
+    id: int
+    public: bool
+    owner_id: int
+    channels: Tuple[CachedChannel, ...]
+
+    @property
+    def owner(self) -> Optional[User]:
+        """
+        The project's owner, which is loaded from the database every time
+        it's used.
+        """
+        return User.query.get(self.owner_id)
+
+
+@dataclasses.dataclass(frozen=True)
+class CachedHook:
+    """
+    A read-only stand-in for a :class:`~notifico.models.Hook`, which can be
+    passed to a service in its place.
+    """
+
+    id: int
+    key: str
+    service_id: int
+    config: Any
+    project: CachedProject
+
+
+def _cached_hook(h: Hook) -> CachedHook:
+    channels = (
+        Channel.query.filter_by(project_id=h.project.id)
+        .options(orm.joinedload(Channel.network))
+        .order_by(Channel.id)
+    )
+
+    return CachedHook(
+        id=h.id,
+        key=h.key,
+        service_id=h.service_id,
+        config=h.config,
+        project=CachedProject(
+            id=h.project.id,
+            public=bool(h.project.public),
+            owner_id=h.project.owner_id,
+            channels=tuple(
+                CachedChannel(
+                    id=c.id,
+                    channel=c.channel,
+                    password=c.password,
+                    pack_messages=bool(c.pack_messages),
+                    network_id=c.network_id,
+                    network=CachedNetwork(
+                        id=c.network.id,
+                        host=c.network.host,
+                        port=c.network.port,
+                        ssl=c.network.ssl,
+                    ),
+                )
+                for c in channels
+            ),
+        ),
+    )
+
+
+def get_hook(project_id: int, key: str) -> Optional[CachedHook]:
+    """
+    Returns the hook with the given key on the given project, or `None` if
+    there isn't one.
+    """
+    cached = hook_cache.get(key_hook.format(key=key))
+    if cached is None:
+        h = (
+            Hook.query.filter_by(key=key)
+            .options(orm.joinedload(Hook.project))
+            .first()
+        )
+        if not h or not h.project:
+            # Misses aren't cached, so a new hook works right away.
+            return None
+
+        cached = _cached_hook(h)
+        hook_cache.set(
+            key_hook.format(key=key),
+            cached,
+            timeout=current_app.config["HOOK_CACHE_TIMEOUT"],
+        )
+
+    if cached.project.id != project_id:
+        return None
+    return cached
+
+
+def _invalidate(keys: Iterable[str]):
+    cache_keys = [key_hook.format(key=key) for key in keys]
+    if cache_keys:
+        hook_cache.delete_many(*cache_keys)
+
+
+def invalidate_hook(hook: Hook):
+    """
+    Forget the cached copy of `hook`, such as after its configuration has
+    changed.
+    """
+    _invalidate([hook.key])
+
+
+def invalidate_project(project: Project):
+    """
+    Forget the cached copies of every hook on `project`, such as after its
+    settings or channels have changed.
+    """
+    _invalidate(h.key for h in project.hooks)
+
+
+def invalidate_user(user: User):
+    """
+    Forget the cached copies of every hook on projects owned by `user`, such
+    as before their account is deleted.
+    """
+    hooks = (
+        Hook.query.with_entities(Hook.key)
+        .join(Hook.project)
+        .filter(Project.owner_id == user.id)
+    )
+    _invalidate(key for (key,) in hooks)
+
+
+def invalidate_network(network: IRCNetwork):
+    """
+    Forget the cached copies of every hook that sends messages to `network`.
+    """
+    hooks = (
+        Hook.query.with_entities(Hook.key)
+        .join(Hook.project)
+        .join(Channel, Channel.project_id == Project.id)
+        .filter(Channel.network_id == network.id)
+        .distinct()
+    )
+    _invalidate(key for (key,) in hooks)
@@ -2,30 +2,59 @@
 Contains the main Notifico IRC bot implementation built on top of Botifico.
 """
 import asyncio
+import dataclasses
 import datetime
 import json
+import signal
 import traceback
-from typing import Any, Dict, Iterable
+from collections import defaultdict
+from typing import (
+    Any,
+    Awaitable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
 
 import sentry_sdk
 import redis.asyncio as redis
 from redis.asyncio.retry import Retry
 from redis.backoff import NoBackoff
 import sqlalchemy as sa
+from sqlalchemy import orm
+from sqlalchemy.orm import Session
 
-from notifico import create_app, db_session
+from notifico import create_app
+from notifico.database import run_in_session
 from notifico.botifico.bot import Bot, Network
+from notifico.botifico.contrib.plugins.cap import cap_plugin
 from notifico.botifico.contrib.plugins.identity import identity_plugin
 from notifico.botifico.contrib.plugins.logging import log_plugin
-from notifico.botifico.contrib.plugins.rate_limit import rate_limit_plugin
+from notifico.botifico.contrib.plugins.rate_limit import (
+    RateLimit,
+    rate_limit_plugin,
+)
 from notifico.botifico.events import Event
-from notifico.botifico.parsing import Prefix
+from notifico.botifico.logger import logger
+from notifico.botifico.parsing import Message, server_time
 from notifico.botifico.plugin import Plugin
+from notifico.botifico.tls import create_ssl_context
 from notifico.botifico.manager import ChannelBot, ChannelProxy, Manager, Channel
 from notifico.botifico.contrib.plugins.ping import ping_plugin
-from notifico.models import ChatLog, ChatMessage, IRCNetwork, NetworkEvent
+from notifico.models import IRCNetwork, NetworkEvent
 from notifico.models import Channel as ChannelModel
 
+from notifico.services.chat_log import ChatLogWriter, LoggedChannels
+from notifico.services.delivery import (
+    Delivery,
+    OrderedDispatcher,
+    QueueConsumer,
+    StreamConsumer,
+)
 from notifico.settings import Settings
 
 
@@ -37,51 +66,189 @@ tracker = Plugin("tracker")
 # for logging.
 chat_logger = Plugin("chat_logger")
 
+#: The number of reconnects in a row, without successfully registering, after
+#: which we consider a network to be blocking us.
+BLOCKED_AFTER_ATTEMPTS = 5
 
-def _get_matching_networks(network: Network) -> Iterable[IRCNetwork]:
-    return db_session.query(IRCNetwork).filter(
+
+class ChannelResolver:
+    """
+    Caches the IRC network and channel each database channel refers to, so
+    queued messages can be delivered without touching the database.
+
+    Messages queued by :class:`~notifico.services.messages.MessageService`
+    carry their resolved target, which is always preferred. The database is
+    only used for older messages that don't, and entries are dropped when
+    the web app tells us a channel or network has changed.
+    """
+
+    def __init__(self):
+        #: (network ID, Network, Channel) by database channel ID.
+        self.targets: Dict[int, Tuple[int, Network, Channel]] = {}
+
+    @staticmethod
+    def target(channel: ChannelModel) -> Tuple[int, Network, Channel]:
+        """
+        Returns the target of a database channel.
+        """
+        return (
+            channel.network_id,
+            Network(
+                channel.network.host,
+                channel.network.port,
+                channel.network.ssl,
+            ),
+            Channel(
+                channel.channel,
+                password=channel.password,
+                pack_messages=bool(channel.pack_messages),
+            ),
+        )
+
+    async def resolve(
+        self, j: Dict[str, Any]
+    ) -> Optional[Tuple[Network, Channel]]:
+        """
+        Returns the network and channel a queued message is for, or `None`
+        if the channel no longer exists.
+        """
+        if (target := j.get("target")) is not None:
+            resolved = (
+                target["network"],
+                Network(target["host"], target["port"], target["ssl"]),
+                Channel(
+                    target["channel"],
+                    password=target["password"],
+                    pack_messages=target["pack_messages"],
+                ),
+            )
+            # Messages requeued at shutdown don't know their channel's ID.
+            if j.get("channel") is None:
+                return resolved[1], resolved[2]
+            self.targets[j["channel"]] = resolved
+        elif j["channel"] not in self.targets:
+            target = await run_in_session(_channel_target, j["channel"])
+            if target is None:
+                return None
+            self.targets[j["channel"]] = target
+
+        _, network, channel = self.targets[j["channel"]]
+        return network, channel
+
+    def network_id(self, network: Network) -> Optional[int]:
+        """
+        Returns the database ID of `network`, if we've seen a channel on it.
+        """
+        return next(
+            (n_id for n_id, n, _ in self.targets.values() if n == network), None
+        )
+
+    def invalidate(
+        self,
+        *,
+        channel_id: Optional[int] = None,
+        network_id: Optional[int] = None,
+    ):
+        """
+        Forget the cached target of a channel, or of every channel on a
+        network.
+        """
+        self.targets.pop(channel_id, None)
+        if network_id is not None:
+            self.targets = {
+                k: v for k, v in self.targets.items() if v[0] != network_id
+            }
+
+
+resolver = ChannelResolver()
+chat_log_writer = ChatLogWriter()
+logged_channels = LoggedChannels()
+
+
+def _channel_target(
+    session: Session, channel_id: int
+) -> Optional[Tuple[int, Network, Channel]]:
+    channel = session.query(ChannelModel).get(channel_id)
+    return ChannelResolver.target(channel) if channel is not None else None
+
+
+def _get_matching_networks(
+    session: Session, network: Network
+) -> Iterable[IRCNetwork]:
+    return session.query(IRCNetwork).filter(
         IRCNetwork.host == network.host,
         IRCNetwork.port == network.port,
         IRCNetwork.ssl == network.ssl,
     )
 
 
-@tracker.on(Event.on_connected)
-async def on_connect(bot: Bot):
-    for network in _get_matching_networks(bot.network):
-        db_session.add(
+def _add_network_event(session: Session, network: Network, description: str):
+    for network in _get_matching_networks(session, network):
+        session.add(
             NetworkEvent(
                 network=network,
                 event=NetworkEvent.Event.INFO,
-                description="Connected to IRC network.",
+                description=description,
             )
         )
 
-    db_session.commit()
+
+@tracker.on(Event.on_connected)
+async def on_connect(bot: Bot):
+    await run_in_session(
+        _add_network_event, bot.network, "Connected to IRC network."
+    )
 
 
 @tracker.on(Event.on_disconnect)
 async def on_disconnect(bot: Bot):
-    for network in _get_matching_networks(bot.network):
-        db_session.add(
-            NetworkEvent(
-                network=network,
-                event=NetworkEvent.Event.INFO,
-                description="Disconnected from IRC network.",
-            )
-        )
+    await run_in_session(
+        _add_network_event, bot.network, "Disconnected from IRC network."
+    )
+
+
+def _set_network_status(
+    session: Session, network: Network, status: IRCNetwork.Status
+):
+    for network in _get_matching_networks(session, network):
+        network.status = status
 
-    db_session.commit()
+
+@tracker.on(Event.RPL_WELCOME)
+async def on_welcome(bot: Bot):
+    await run_in_session(
+        _set_network_status, bot.network, IRCNetwork.Status.HEALTHY
+    )
+
+
+@tracker.on(Event.on_reconnect)
+async def on_reconnect(bot: Bot, attempt: int):
+    # Losing a connection now and then is normal, but failing to get back in
+    # again and again usually means the network is throttling or banning us.
+    if attempt >= BLOCKED_AFTER_ATTEMPTS:
+        status = IRCNetwork.Status.TEMPORARY_BLOCK
+    else:
+        status = IRCNetwork.Status.DEGRADING
+
+    await run_in_session(_set_network_status, bot.network, status)
 
 
 @chat_logger.on(Event.on_message)
-async def on_message(bot: ChannelBot, command: str, args, prefix: Prefix):
-    # TODO: We should be caching in here, and relying on the start-logging
-    #       and stop-logging signals to invalidate it. However, for now volume
-    #       is low enough that we can just query the database every time.
+async def on_message(
+    bot: ChannelBot,
+    command: str,
+    args,
+    message: Message,
+    tags: Mapping[str, str],
+):
     if command not in ("PRIVMSG",):
         return
 
+    if message.prefix and bot.is_me(message.prefix.nick):
+        # Our own messages, echoed back by servers with echo-message, are
+        # notifications rather than chat.
+        return
+
     channel: ChannelProxy | None = bot.get_channel(args[0])
     if not channel or channel.channel.password:
         # We don't log messages to channels that are password protected.
@@ -90,127 +257,399 @@ async def on_message(bot: ChannelBot, command: str, args, prefix: Prefix):
         # to a channel that shouldn't actually be public.
         return
 
-    # Find all the database-backed Channels that match the current IRC channel.
-    channels = (
-        db_session.query(ChannelModel)
-        .join(ChannelModel.network)
-        .filter(
-            IRCNetwork.host == bot.network.host,
-            IRCNetwork.port == bot.network.port,
-            IRCNetwork.ssl == bot.network.ssl,
-        )
-        .filter(
-            ChannelModel.channel == channel.channel.name,
-            ChannelModel.logged.is_(True),
-            ChannelModel.public.is_(True),
-            sa.or_(
-                ChannelModel.password.is_(None), ChannelModel.password == ""
-            ),
-        )
-        .all()
-    )
-
-    if not channels:
+    log_id = logged_channels.get(bot.network, channel.channel.name)
+    if log_id is None:
         return
 
-    # In theory every Channel that matches should have the same ChatLog.
-    chat_log = (
-        db_session.query(ChatLog)
-        .filter(
-            ChatLog.channels.any(ChannelModel.id.in_([c.id for c in channels]))
-        )
-        .first()
+    match args[1]:
+        case text if text.startswith("\x01ACTION "):
+            # Special handling for /me
+            logged = {"type": "action", "message": text[7:-1]}
+        case text if text.startswith("\x01"):
+            # Ignore all other CTCP messages.
+            return
+        case text:
+            logged = {"type": "message", "message": text}
+
+    # Prefer the time the server says the message was sent, if it supports
+    # the server-time capability.
+    ts = server_time(tags) or datetime.datetime.now(tz=datetime.timezone.utc)
+
+    chat_log_writer.write(
+        log_id,
+        message=logged,
+        sender=message.prefix.nick,
+        timestamp=ts,
     )
-    if chat_log is None:
-        chat_log = ChatLog(line_count=1)
-        chat_log.channels.extend(channels)
-    else:
-        chat_log.line_count = ChatLog.line_count + 1
-
-    db_session.add(chat_log)
-
-    ts = datetime.datetime.now(tz=datetime.timezone.utc)
-
-    match command:
-        case "PRIVMSG":
-            if args[1].startswith("\x01ACTION "):
-                # Special handling for /me
-                db_session.add(
-                    ChatMessage(
-                        chat_log=chat_log,  # noqa, PyCharm doesn't understand this.
-                        message={"type": "action", "message": args[1][7:-1]},
-                        sender=prefix.nick,
-                        timestamp=ts,
-                    )
-                )
-            elif args[1].startswith("\x01"):
-                # Ignore all other CTCP messages.
-                pass
-            else:
-                db_session.add(
-                    ChatMessage(
-                        chat_log=chat_log,  # noqa, PyCharm doesn't understand this.
-                        message={"type": "message", "message": args[1]},
-                        sender=prefix.nick,
-                        timestamp=ts,
-                    )
-                )
 
-    db_session.commit()
 
+async def _handle_single_message(
+    j: Dict[str, Any], manager: Manager
+) -> Optional[Awaitable]:
+    """
+    Handle a single message from the queue.
+
+    Outgoing channel messages are returned as soon as they've been added to
+    the channel's outgoing batch, along with an awaitable that completes
+    once they've been handed to a bot.
+    """
+    match j["type"]:
+        case "message" | "start-logging" | "stop-logging":
+            resolved = await resolver.resolve(j)
+            if resolved is None:
+                logger.warning(
+                    "[irc_bot] Dropping message for deleted channel"
+                    f" {j['channel']}."
+                )
+                return
+        case "invalidate":
+            # A channel or network has been changed by the web app.
+            resolver.invalidate(
+                channel_id=j.get("channel"), network_id=j.get("network")
+            )
+            return
 
-async def _handle_single_message(j: Dict[str, Any], manager: Manager):
     match j["type"]:
         case "message":
             # Incoming message destined for a specific IRC channel.
-            channel = db_session.query(ChannelModel).get(j["channel"])
-
             try:
-                c = await manager.channel(
-                    Network(
-                        channel.network.host,
-                        channel.network.port,
-                        channel.network.ssl,
-                    ),
-                    Channel(channel.channel, password=channel.password),
-                )
-                await c.private_message(j["payload"]["msg"])
+                c = await manager.channel(*resolved)
+                return await c.queue_message(j["payload"]["msg"])
             except Exception as exception:
                 sentry_sdk.capture_exception(exception)
                 traceback.print_exc()
         case "start-logging":
             # Enable logging on an already-connected channel.
-            channel = db_session.query(ChannelModel).get(j["channel"])
-
             try:
-                c = await manager.channel(
-                    Network(
-                        channel.network.host,
-                        channel.network.port,
-                        channel.network.ssl,
-                    ),
-                    Channel(channel.channel, password=channel.password),
-                )
+                await logged_channels.refresh(resolved[0], resolved[1].name)
+                c = await manager.channel(*resolved)
                 await c.join()
             except Exception as exception:
                 sentry_sdk.capture_exception(exception)
                 traceback.print_exc()
         case "stop-logging":
-            # Disable logging on an already-connected channel.
-            raise NotImplementedError()
+            # Disable logging on an already-connected channel. We stay in the
+            # channel, since it may still have messages sent to it.
+            await logged_channels.refresh(resolved[0], resolved[1].name)
+
+
+async def _handle_queued_message(
+    delivery: Delivery,
+    j: Dict[str, Any],
+    consumer: QueueConsumer | StreamConsumer,
+    manager: Manager,
+) -> Optional[Awaitable]:
+    if isinstance(consumer, StreamConsumer) and not consumer.holds(delivery):
+        # Read before we gave up its network, which another process now
+        # serves. It'll claim the message once it's been pending long enough.
+        consumer.forget(delivery)
+        return None
+
+    try:
+        sent = await _handle_single_message(j, manager)
+    except Exception as exception:
+        sentry_sdk.capture_exception(exception)
+        traceback.print_exc()
+        sent = None
+
+    return _acknowledge(delivery, sent, consumer)
+
+
+async def _acknowledge(
+    delivery: Delivery,
+    sent: Optional[Awaitable],
+    consumer: QueueConsumer | StreamConsumer,
+):
+    try:
+        if sent is not None:
+            await sent
+    except Exception as exception:
+        sentry_sdk.capture_exception(exception)
+        traceback.print_exc()
+    finally:
+        # Even messages we failed to handle are acknowledged, or they'd be
+        # retried (and fail) every time the bot is restarted.
+        await consumer.ack(delivery)
+
+
+async def process_messages(
+    consumer: QueueConsumer | StreamConsumer,
+    manager: Manager,
+    *,
+    max_in_flight: int = 1000,
+):
+    """
+    Process messages from the message queue, forever.
 
+    Messages for the same channel are handled in the order they were
+    queued, and no more than `max_in_flight` are handled at once.
+    """
 
-async def process_messages(r, manager: Manager):
+    async def _handle(item):
+        return await _handle_queued_message(*item, consumer, manager)
+
+    dispatcher = OrderedDispatcher(_handle, max_in_flight=max_in_flight)
+
+    try:
+        while True:
+            for delivery in await consumer.receive():
+                try:
+                    j = json.loads(delivery.payload.decode("utf-8"))
+                except ValueError as exception:
+                    sentry_sdk.capture_exception(exception)
+                    traceback.print_exc()
+                    await consumer.ack(delivery)
+                    continue
+
+                # Waits here once we're at the limit, so a large backlog is
+                # left in Redis rather than piling up in memory.
+                await dispatcher.submit(j.get("channel"), (delivery, j))
+    finally:
+        # Anything we haven't started handling is never acknowledged, so
+        # it's delivered again once we're back.
+        dispatcher.cancel()
+
+
+def _logged_channel_targets(
+    session: Session, network_ids=None
+) -> Dict[int, Tuple[int, Network, Channel]]:
+    channels = (
+        session.query(ChannelModel)
+        .options(orm.joinedload(ChannelModel.network))
+        .filter(
+            ChannelModel.logged.is_(True),
+            ChannelModel.public.is_(True),
+            sa.or_(
+                ChannelModel.password.is_(None), ChannelModel.password == ""
+            ),
+        )
+    )
+    if network_ids is not None:
+        channels = channels.filter(ChannelModel.network_id.in_(network_ids))
+
+    return {channel.id: ChannelResolver.target(channel) for channel in channels}
+
+
+def _network_ids(session: Session) -> List[int]:
+    return [network_id for (network_id,) in session.query(IRCNetwork.id)]
+
+
+async def _join_logged_channels(manager: Manager, network_ids=None):
+    """
+    Join every channel with logging enabled, optionally only those on the
+    given networks.
+    """
+    # We normally only JOIN a channel the first time we get a message.
+    # Except if logging is enabled for a channel, we want to JOIN it as
+    # soon as we possibly can, or we'll miss things.
+    # TODO: Periodically try to join channels that might have failed due
+    #       to a network error.
+    targets = await run_in_session(_logged_channel_targets, network_ids)
+
+    # Loaded all at once here, rather than one by one when handled.
+    resolver.targets.update(targets)
+
+    by_network = defaultdict(list)
+    for channel_id, (network_id, _, _) in targets.items():
+        by_network[network_id].append(channel_id)
+
+    for channel_ids in by_network.values():
+        asyncio.create_task(_join_channels(manager, channel_ids))
+
+
+async def _join_channels(manager: Manager, channel_ids: List[int]):
+    """
+    Join channels on a single network one at a time, so that (re)starting
+    doesn't flood the network with JOINs.
     """
-    Process as many messages on the message queue as possible.
+    for channel_id in channel_ids:
+        await _handle_single_message(
+            {"type": "start-logging", "channel": channel_id}, manager
+        )
+
+
+async def _maintain_leases(consumer: StreamConsumer, manager: Manager):
+    """
+    Keep our network leases renewed, joining the logged channels of any
+    network we take on and disconnecting from any we lose, so a network is
+    never served (or logged) by two processes at once.
     """
     while True:
-        v = await r.lpop("messages")
-        if v is None:
-            return
+        try:
+            claimed, lost = await consumer.claim_networks()
+            if lost:
+                await _disconnect_networks(manager, consumer, lost)
+            if claimed:
+                await _join_logged_channels(manager, claimed)
+        except Exception as exception:
+            sentry_sdk.capture_exception(exception)
+            traceback.print_exc()
+
+        await asyncio.sleep(consumer.lease_ttl / 3)
+
+
+async def _disconnect_networks(
+    manager: Manager, consumer: StreamConsumer, network_ids: Set[int]
+):
+    """
+    Disconnect our bots from networks another process is taking over,
+    putting anything they didn't get to send back on the network's stream.
+    """
+    networks = {
+        network
+        for network_id, network, _ in resolver.targets.values()
+        if network_id in network_ids
+    }
+    for network in networks:
+        unsent = await manager.disconnect(network, reason="Handing over")
+        await _requeue_unsent(consumer, unsent)
 
-        j = json.loads(v.decode("utf-8"))
-        asyncio.create_task(_handle_single_message(j, manager))
+
+async def _reconcile_logged_channels(interval: float = 300):
+    """
+    Periodically reload the logged channels from the database, in case we
+    missed a start-logging or stop-logging message.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await logged_channels.reload()
+        except Exception as exception:
+            sentry_sdk.capture_exception(exception)
+            traceback.print_exc()
+
+
+async def _monitor_loop_lag(interval: float = 1, threshold: float = 0.1):
+    """
+    Warn whenever the event loop falls behind by more than `threshold`
+    seconds, which means something blocked it and held up every bot.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = loop.time() - start - interval
+        if lag > threshold:
+            logger.warning(f"[irc_bot] Event loop lagged by {lag:.3f}s.")
+
+
+def _unsent_messages(
+    bot: ChannelBot, network_id: int, lines: List[bytes]
+) -> List[Dict[str, Any]]:
+    """
+    Turn the channel messages a bot didn't get to send back into queue
+    messages, so they can be sent once we're restarted.
+    """
+    messages = []
+    for line in lines:
+        message = Message.parse(line.decode("utf-8"))
+        # Anything else (JOINs, PONGs...) is meaningless on a new connection.
+        if message is None or message.command != "PRIVMSG":
+            continue
+
+        targets, text = message.args
+        for target in targets.split(","):
+            channel_proxy = bot.get_channel(target)
+            if channel_proxy is None:
+                continue
+
+            channel = channel_proxy.channel
+            messages.append(
+                {
+                    "type": "message",
+                    "channel": None,
+                    "target": {
+                        "network": network_id,
+                        "host": bot.network.host,
+                        "port": bot.network.port,
+                        "ssl": bot.network.ssl,
+                        "channel": channel.name,
+                        "password": channel.password,
+                        "pack_messages": channel.pack_messages,
+                    },
+                    "payload": {"msg": text},
+                }
+            )
+    return messages
+
+
+async def _shutdown(
+    manager: Manager,
+    consumer: QueueConsumer | StreamConsumer,
+    *,
+    timeout: float = 10,
+):
+    """
+    Disconnect every bot, putting anything they didn't get to send back on
+    the queue.
+    """
+    unsent = await manager.shutdown(timeout=timeout)
+    await _requeue_unsent(consumer, unsent)
+
+
+async def _requeue_unsent(
+    consumer: QueueConsumer | StreamConsumer,
+    unsent: Dict[ChannelBot, List[bytes]],
+):
+    """
+    Put the channel messages bots didn't get to send back on the queue.
+    """
+    for bot, lines in unsent.items():
+        network_id = resolver.network_id(bot.network)
+        if network_id is None:
+            logger.warning(
+                f"[irc_bot] Dropping {len(lines)} unsent lines for"
+                f" {bot.network!r}, it's no longer known."
+            )
+            continue
+
+        messages = _unsent_messages(bot, network_id, lines)
+        await consumer.requeue(
+            network_id, *(json.dumps(m).encode("utf-8") for m in messages)
+        )
+        logger.info(
+            f"[irc_bot] Requeued {len(messages)} unsent messages for"
+            f" {bot.network!r}."
+        )
+
+
+async def _serve(
+    consumer: QueueConsumer | StreamConsumer,
+    manager: Manager,
+    settings: Settings,
+):
+    """
+    Process messages until we get a SIGTERM or SIGINT, then shut down
+    gracefully.
+    """
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    processing = asyncio.create_task(
+        process_messages(
+            consumer, manager, max_in_flight=settings.MESSAGE_MAX_IN_FLIGHT
+        )
+    )
+    stopped = asyncio.create_task(stopping.wait())
+    try:
+        done, _ = await asyncio.wait(
+            [processing, stopped], return_when=asyncio.FIRST_COMPLETED
+        )
+        if processing in done:
+            # Raise whatever stopped us.
+            processing.result()
+    finally:
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(signum)
+        stopped.cancel()
+        processing.cancel()
+
+        logger.info("[irc_bot] Shutting down.")
+        await _shutdown(
+            manager, consumer, timeout=settings.IRC_SHUTDOWN_TIMEOUT
+        )
 
 
 async def wait_for_events():
@@ -219,11 +658,12 @@ async def wait_for_events():
 
     Once messages are received, they're pushed to a Manager.
 
+    With the "stream" `MESSAGE_DELIVERY`, several of these can be run at
+    once and the networks will be shared between them.
+
     .. note::
 
-        For this to work efficiently, Redis needs to have event emitting
-        enabled. Use `CONFIG SET notify-keyspace-events Kl` to enable
-        [K]eyspace events for [l]ist commands.
+        Consuming the queue requires Redis 6.2 or newer.
     """
     settings = Settings()
     app = create_app()
@@ -232,61 +672,74 @@ async def wait_for_events():
         sentry_sdk.init(dsn=settings.SENTRY_DSN)
 
     with app.app_context():
-        manager = Manager("botifico")
+        manager = Manager(
+            "botifico",
+            connect_interval=settings.IRC_CONNECT_INTERVAL,
+            reconnect_delay=settings.IRC_RECONNECT_DELAY,
+            max_reconnect_delay=settings.IRC_MAX_RECONNECT_DELAY,
+            # One context per network, so its certificate store is loaded
+            # once and reconnects can resume the previous TLS session.
+            ssl_context_factory=lambda network: create_ssl_context(
+                verify=settings.IRC_SSL_VERIFY,
+                cafile=settings.IRC_SSL_CAFILE,
+                certfile=settings.IRC_CLIENT_CERT,
+                keyfile=settings.IRC_CLIENT_KEY,
+            ),
+        )
         manager.register_plugin(ping_plugin)
+        manager.register_plugin(cap_plugin)
+        if settings.IRC_CLIENT_CERT:
+            cap_plugin.sasl = "EXTERNAL"
         manager.register_plugin(identity_plugin)
         manager.register_plugin(log_plugin)
         manager.register_plugin(rate_limit_plugin)
+        rate_limit_plugin.default = RateLimit(
+            burst=settings.IRC_RATE_LIMIT_BURST,
+            rate=settings.IRC_RATE_LIMIT_RATE,
+            byte_cost=settings.IRC_RATE_LIMIT_BYTE_COST,
+        )
+        for host, limit in settings.IRC_RATE_LIMITS.items():
+            rate_limit_plugin.configure(
+                host, dataclasses.replace(rate_limit_plugin.default, **limit)
+            )
         manager.register_plugin(tracker)
         manager.register_plugin(chat_logger)
 
         r = await redis.from_url(settings.REDIS, retry=Retry(NoBackoff(), 50))
-
-        # If someone is using redis for something else, we probably don't want
-        # to clobber their config but for our purposes, we need to enable
-        # keyspace events.
-        await r.config_set("notify-keyspace-events", "Kl")
-
-        # We normally only JOIN a channel the first time we get a message.
-        # Except if logging is enabled for a channel, we want to JOIN it as
-        # soon as we possibly can, or we'll miss things.
-        # TODO: Periodically try to join channels that might have failed due
-        #       to a network error.
-        channels = (
-            db_session.query(ChannelModel)
-            .with_entities(ChannelModel.id)
-            .filter(
-                ChannelModel.logged.is_(True),
-                ChannelModel.public.is_(True),
-                sa.or_(
-                    ChannelModel.password.is_(None), ChannelModel.password == ""
-                ),
-            )
-        )
-
-        for channel in channels:
-            asyncio.create_task(
-                _handle_single_message(
-                    {"type": "start-logging", "channel": channel.id}, manager
+        lag_monitor = asyncio.create_task(_monitor_loop_lag())
+
+        await logged_channels.reload()
+        reconciler = asyncio.create_task(_reconcile_logged_channels())
+
+        try:
+            if settings.MESSAGE_DELIVERY == "stream":
+                consumer = StreamConsumer(r)
+                # A network is only claimed once it has a stream, which would
+                # leave the logged channels of quiet networks (including all
+                # of them, right after switching to stream delivery) unjoined.
+                await consumer.add_networks(await run_in_session(_network_ids))
+                # We only find out which networks are ours once we've claimed
+                # them, so logged channels are joined as that happens.
+                leases = asyncio.create_task(
+                    _maintain_leases(consumer, manager)
                 )
+                try:
+                    await _serve(consumer, manager, settings)
+                finally:
+                    leases.cancel()
+                    await consumer.release()
+            else:
+                consumer = QueueConsumer(r)
+                await _join_logged_channels(manager)
+                # Anything that was being handled when the bot last stopped
+                # goes back on the queue, so it isn't lost.
+                await consumer.recover()
+                await _serve(consumer, manager, settings)
+        finally:
+            lag_monitor.cancel()
+            reconciler.cancel()
+            await asyncio.gather(
+                lag_monitor, reconciler, return_exceptions=True
             )
-
-        # Before we start waiting for events, process anything already in the
-        # queue.
-        await process_messages(r, manager)
-
-        notifications: redis.client.PubSub = r.pubsub()
-        # We listen to a special notifications PubSub channel which will trigger
-        # whenever an operation occurs on our messages queue.
-        await notifications.subscribe("__keyspace@0__:messages")
-
-        async for message in notifications.listen():  # noqa
-            match message["type"]:
-                case "subscribe":
-                    continue
-                case "message":
-                    match message["data"]:
-                        case b"rpush":
-                            # New data has been pushed to the messages queue,
-                            # try to snag it.
-                            await process_messages(r, manager)
+            # Don't lose anything logged just before stopping.
+            await chat_log_writer.close()
@@ -1,14 +1,44 @@
 import json
+from typing import Iterable, List, Tuple
 
 
 class MessageService(object):
     #: Key name for the outgoing message queue.
     key_queue_messages = "messages"
+    #: Key name for messages taken off the queue that are still being
+    #: handled.
+    key_processing_messages = "messages:processing"
     #: Key name for recent messages.
     key_recent_messages = "recent_messages"
+    #: Key name for the outgoing message stream of a network, when using
+    #: stream delivery.
+    key_stream_messages = "messages:stream:{network_id}"
+    #: Key name for the set of networks with an outgoing message stream.
+    key_stream_networks = "messages:networks"
 
-    def __init__(self, redis=None):
+    def __init__(self, redis=None, *, delivery="list", stream_maxlen=10000):
+        """
+        :param redis: A Redis client.
+        :param delivery: How messages are delivered to the IRC bots, either
+                         "list" for a single queue or "stream" for a Redis
+                         Stream per network.
+        :param stream_maxlen: The approximate maximum number of messages to
+                              keep in each stream.
+        """
         self._redis = redis
+        self.delivery = delivery
+        self.stream_maxlen = stream_maxlen
+
+    @classmethod
+    def from_app(cls, app):
+        """
+        Returns a MessageService configured for the given Flask app.
+        """
+        return cls(
+            redis=app.redis,
+            delivery=app.config["MESSAGE_DELIVERY"],
+            stream_maxlen=app.config["MESSAGE_STREAM_MAXLEN"],
+        )
 
     @property
     def r(self):
@@ -30,7 +60,24 @@ class MessageService(object):
         """
         Sends `message` to `channel`.
         """
-        message_dump = json.dumps(
+        self._queue(self._message_dump(message, channel), channel.network_id)
+
+    def send_messages(self, messages: Iterable[str], channels: Iterable):
+        """
+        Sends every message in `messages` to every channel in `channels`, in
+        order, with a single round trip to Redis.
+        """
+        channels = list(channels)
+        self._queue_many(
+            [
+                (channel.network_id, self._message_dump(message, channel))
+                for message in messages
+                for channel in channels
+            ]
+        )
+
+    def _message_dump(self, message: str, channel) -> str:
+        return json.dumps(
             {
                 "type": "message",
                 "payload": {
@@ -39,27 +86,101 @@ class MessageService(object):
                     .replace("\x01", "")
                 },
                 "channel": channel.id,
+                "target": self.target(channel),
             }
         )
-        self.r.rpush(self.key_queue_messages, message_dump)
 
     def start_logging(self, channel):
         """
         Starts logging for `channel`.
         """
         message_dump = json.dumps(
-            {"type": "start-logging", "channel": channel.id}
+            {
+                "type": "start-logging",
+                "channel": channel.id,
+                "target": self.target(channel),
+            }
         )
-        self.r.rpush(self.key_queue_messages, message_dump)
+        self._queue(message_dump, channel.network_id)
 
     def stop_logging(self, channel):
         """
         Stops logging for `channel`.
         """
         message_dump = json.dumps(
-            {"type": "stop-logging", "channel": channel.id}
+            {
+                "type": "stop-logging",
+                "channel": channel.id,
+                "target": self.target(channel),
+            }
         )
-        self.r.rpush(self.key_queue_messages, message_dump)
+        self._queue(message_dump, channel.network_id)
+
+    def channel_changed(self, channel):
+        """
+        Lets the IRC bots know `channel` has been changed or deleted.
+        """
+        message_dump = json.dumps({"type": "invalidate", "channel": channel.id})
+        self._queue(message_dump, channel.network_id)
+
+    def network_changed(self, network):
+        """
+        Lets the IRC bots know `network` has been changed or deleted.
+        """
+        message_dump = json.dumps({"type": "invalidate", "network": network.id})
+        self._queue(message_dump, network.id)
+
+    @staticmethod
+    def target(channel) -> dict:
+        """
+        Returns everything the IRC bots need to know to deliver a message to
+        `channel`, so they don't need to look it up.
+        """
+        return {
+            "network": channel.network_id,
+            "host": channel.network.host,
+            "port": channel.network.port,
+            "ssl": channel.network.ssl,
+            "channel": channel.channel,
+            "password": channel.password,
+            "pack_messages": bool(channel.pack_messages),
+        }
+
+    def _queue(self, message_dump: str, network_id: int):
+        """
+        Queue `message_dump` for delivery by the IRC bots.
+        """
+        self._queue_many([(network_id, message_dump)])
+
+    def _queue_many(self, message_dumps: List[Tuple[int, str]]):
+        """
+        Queue each `(network_id, message_dump)` in `message_dumps`, in order,
+        for delivery by the IRC bots.
+        """
+        if not message_dumps:
+            return
+
+        if self.delivery != "stream":
+            self.r.rpush(
+                self.key_queue_messages, *(dump for _, dump in message_dumps)
+            )
+            return
+
+        # Each network gets its own stream, so every message for a network
+        # is handled by the single bot process holding its lease, in order.
+        with self.r.pipeline() as pipe:
+            for network_id, message_dump in message_dumps:
+                pipe.xadd(
+                    self.key_stream_messages.format(network_id=network_id),
+                    {"message": message_dump},
+                    maxlen=self.stream_maxlen,
+                    approximate=True,
+                )
+            pipe.sadd(
+                self.key_stream_networks,
+                *{network_id for network_id, _ in message_dumps},
+            )
+            pipe.execute()
 
     def log_message(self, message, project, log_cap=200):
         """
@@ -68,7 +189,7 @@ class MessageService(object):
         final_message = {
             "msg": message,
             "project_id": project.id,
-            "owner_id": project.owner.id,
+            "owner_id": project.owner_id,
         }
         message_dump = json.dumps(final_message)
 
@@ -1,11 +1,13 @@
 """
 A collection of utility methods for common site statistics.
 """
+from flask import current_app
 from sqlalchemy import func, text
 
 from notifico import cache
 from notifico.database import db_session
 from notifico.models import Project, Channel, User, IRCNetwork
+from notifico.services.counters import MessageCounters
 
 
 @cache.memoize(timeout=60 * 5)
@@ -13,11 +15,23 @@ def total_messages(user=None):
     """
     Sum the total number of messages across all projects.
     """
+    counters = MessageCounters.from_app(current_app)
+
     q = db_session.query(func.sum(Project.message_count))
     if user:
         q = q.filter(Project.owner_id == user.id)
-
-    return q.scalar() or 0
+        pending = counters.pending_projects(
+            project_id
+            for (project_id,) in db_session.query(Project.id).filter(
+                Project.owner_id == user.id
+            )
+        )
+    else:
+        pending = counters.pending_projects()
+
+    # Include messages that have been counted, but not yet flushed to the
+    # database.
+    return (q.scalar() or 0) + sum(pending.values())
 
 
 @cache.memoize(timeout=60 * 5)
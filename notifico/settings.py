@@ -3,7 +3,7 @@ import secrets
 import typing as t
 from typing import Optional
 
-from pydantic import BaseSettings, Field
+from pydantic import BaseSettings, Field, validator
 
 
 class Settings(BaseSettings):
@@ -39,6 +39,49 @@ class Settings(BaseSettings):
     IRC_NICKNAME: str = "Not"
     IRC_USERNAME: str = "notifico"
     IRC_REALNAME: str = "Notifico! - https://github.com/tktech/notifico"
+    #: The number of messages the bot may send back-to-back before being rate
+    #: limited.
+    IRC_RATE_LIMIT_BURST: float = 5
+    #: The sustained number of messages per second the bot may send.
+    IRC_RATE_LIMIT_RATE: float = 1
+    #: An additional per-byte cost for every message, in messages. For servers
+    #: that measure flooding in bytes rather than lines.
+    IRC_RATE_LIMIT_BYTE_COST: float = 0
+    #: Rate limits for specific networks by hostname, overriding any of the
+    #: IRC_RATE_LIMIT_* defaults, such as
+    #: {"irc.libera.chat": {"burst": 4, "rate": 0.5}}.
+    IRC_RATE_LIMITS: t.Dict[str, t.Dict[str, float]] = {}
+    #: The minimum number of seconds between connections to the same IRC
+    #: network, so restarting doesn't trip its connection throttling.
+    IRC_CONNECT_INTERVAL: float = 5
+    #: The base number of seconds to wait before reconnecting a bot, doubled
+    #: after every failed attempt up to IRC_MAX_RECONNECT_DELAY.
+    IRC_RECONNECT_DELAY: float = 1
+    IRC_MAX_RECONNECT_DELAY: float = 300
+    #: If False, the certificates of IRC networks using SSL aren't verified.
+    IRC_SSL_VERIFY: bool = True
+    #: An optional file of CA certificates to trust instead of the system's.
+    IRC_SSL_CAFILE: Optional[str] = None
+    #: An optional TLS client certificate (and its key, if not in the same
+    #: file) the bots identify with. If set, the bots also authenticate with
+    #: SASL EXTERNAL on networks that support it.
+    IRC_CLIENT_CERT: Optional[str] = None
+    IRC_CLIENT_KEY: Optional[str] = None
+    #: How many seconds the bot waits for queued messages to be sent when
+    #: shutting down. Anything left is put back on the message queue.
+    IRC_SHUTDOWN_TIMEOUT: float = 10
+
+    #: How outgoing messages are delivered to the IRC bots. "list" uses a
+    #: single queue and supports one `notifico bots start` process, while
+    #: "stream" uses a Redis Stream per network so several bot processes can
+    #: share the networks between them. Requires Redis 6.2 or newer.
+    MESSAGE_DELIVERY: t.Literal["list", "stream"] = "list"
+    #: The approximate maximum number of undelivered messages kept for each
+    #: network when using stream delivery.
+    MESSAGE_STREAM_MAXLEN: int = 10000
+    #: The maximum number of outgoing messages a bot process will take off
+    #: the queue before earlier ones have been handed to a bot.
+    MESSAGE_MAX_IN_FLIGHT: int = 1000
 
     #: An optional Sentry DSN for error reporting.
     SENTRY_DSN: Optional[str] = None
@@ -47,10 +90,46 @@ class Settings(BaseSettings):
     #: headers.
     USE_PROXY_HEADERS: int = 0
 
+    #: If True, incoming webhooks are stored in Redis and acknowledged with a
+    #: 202 right away, and are handled by the Celery workers instead.
+    HOOK_ASYNC_INGEST: bool = False
+    #: How long (in seconds) a stored webhook is kept waiting for a worker
+    #: before it's dropped.
+    HOOK_INGEST_TTL: int = 60 * 60 * 24
+    #: The Flask-Caching backend hooks are cached in for the webhook
+    #: endpoint, separate from CACHE_TYPE. Edits clear a cached hook right
+    #: away, but only with a cache shared by every process (such as the
+    #: default RedisCache). With a per-process SimpleCache, other processes
+    #: only see changes once HOOK_CACHE_TIMEOUT runs out.
+    HOOK_CACHE_TYPE: str = "RedisCache"
+    #: The Redis server used by a RedisCache, defaulting to REDIS.
+    HOOK_CACHE_REDIS_URL: Optional[str] = None
+    #: How long (in seconds) a hook is cached for the webhook endpoint.
+    HOOK_CACHE_TIMEOUT: int = 60 * 5
+    #: The largest webhook body (in bytes) that will be accepted, anything
+    #: larger gets a 413. GitHub caps its own payloads at 25MB.
+    HOOK_MAX_BODY_SIZE: Optional[int] = 1024 * 1024 * 25
+
     #: The list of modules Celery should look into for background tasks.
-    celery_imports: t.List[str] = ["notifico.tasks.mail"]
+    celery_imports: t.List[str] = [
+        "notifico.tasks.mail",
+        "notifico.tasks.hooks",
+    ]
     #: The serializer celery should use when storing tasks and results.
     celery_task_serializer: str = "json"
+    #: Periodic tasks, run by `celery beat`. Message counts are only kept
+    #: in Redis until they're written to the database by
+    #: flush-message-counts.
+    celery_beat_schedule: t.Dict[str, t.Dict[str, t.Any]] = {
+        "flush-message-counts": {
+            "task": "notifico.tasks.hooks.flush_message_counts",
+            "schedule": 60.0,
+        },
+    }
+
+    @validator("HOOK_CACHE_REDIS_URL", always=True)
+    def _default_hook_cache_redis_url(cls, v, values):
+        return v or values.get("REDIS")
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,108 @@
+import json
+import uuid
+
+from celery import shared_task
+from flask import current_app, request, Request
+from werkzeug.local import LocalProxy
+
+from notifico.database import db_session
+from notifico.models import Hook
+from notifico.service import incoming_services
+from notifico.services.counters import MessageCounters
+from notifico.services.hook_cache import CachedHook
+
+#: Key name for a webhook request waiting to be handled by
+#: :func:`process_hook`.
+key_ingest = "hooks:ingest:{id}"
+
+
+def handle_hook(h: Hook | CachedHook, req: Request):
+    """
+    Count a request to `h` and pass it to the hook's service, queueing any
+    messages it produces.
+    """
+    hook = incoming_services()[h.service_id]
+    if hook is None:
+        # TODO: This should be logged somewhere.
+        return
+
+    # Counted in Redis, and written to the hook and project by
+    # flush_message_counts().
+    MessageCounters.from_app(current_app).increment(h.id, h.project.id)
+
+    # Services rarely look at the owner, so it's only loaded if they do.
+    hook._request(LocalProxy(lambda: h.project.owner), req, h)
+
+    db_session.commit()
+
+
+def ingest_hook(h: Hook | CachedHook, req: Request):
+    """
+    Store a request to `h` in Redis and queue it to be handled by a Celery
+    worker, so the webhook can be acknowledged right away.
+    """
+    ingest_id = uuid.uuid4().hex
+    key = key_ingest.format(id=ingest_id)
+
+    with current_app.redis.pipeline() as pipe:
+        pipe.hset(
+            key,
+            mapping={
+                "request": json.dumps(
+                    {
+                        "path": req.path,
+                        "method": req.method,
+                        "query_string": req.query_string.decode("latin-1"),
+                        "headers": list(req.headers.items()),
+                    }
+                ),
+                "body": req.get_data(),
+            },
+        )
+        # Don't keep requests around forever if the workers are down.
+        pipe.expire(key, current_app.config["HOOK_INGEST_TTL"])
+        pipe.execute()
+
+    process_hook.delay(h.id, ingest_id)
+
+
+@shared_task
+def process_hook(hook_id: int, ingest_id: str):
+    """
+    Handle a webhook request stored by :func:`ingest_hook`.
+
+    Runs inside the app context provided by :mod:`notifico.worker`.
+    """
+    key = key_ingest.format(id=ingest_id)
+    with current_app.redis.pipeline() as pipe:
+        pipe.hgetall(key)
+        pipe.delete(key)
+        stored, _ = pipe.execute()
+
+    if not stored:
+        # Expired before we got to it, or already handled.
+        return
+
+    h = Hook.query.get(hook_id)
+    if not h or not h.project:
+        # Deleted since the request was accepted.
+        return
+
+    environ = json.loads(stored[b"request"])
+    with current_app.test_request_context(
+        environ["path"],
+        method=environ["method"],
+        query_string=environ["query_string"],
+        headers=environ["headers"],
+        data=stored.get(b"body", b""),
+    ):
+        handle_hook(h, request)
+
+
+@shared_task
+def flush_message_counts():
+    """
+    Write the message counts collected by :func:`handle_hook` to the
+    database. Run periodically by Celery beat.
+    """
+    MessageCounters.from_app(current_app).flush(db_session)
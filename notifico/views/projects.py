@@ -1,3 +1,4 @@
+import io
 from functools import wraps
 
 from flask import (
@@ -13,6 +14,7 @@ from flask import (
 )
 import flask_wtf as wtf
 from flask_babel import lazy_gettext as _
+from werkzeug.exceptions import RequestEntityTooLarge
 from wtforms import fields, validators
 
 from notifico import user_required, csrf
@@ -20,7 +22,14 @@ from notifico.database import db_session
 from notifico.models import User, Project, Hook, Channel, IRCNetwork
 from notifico.permissions import Action
 from notifico.service import incoming_services
+from notifico.services.counters import MessageCounters
+from notifico.services.hook_cache import (
+    get_hook,
+    invalidate_hook,
+    invalidate_project,
+)
 from notifico.services.messages import MessageService
+from notifico.tasks.hooks import handle_hook, ingest_hook
 
 projects = Blueprint("projects", __name__, template_folder="templates")
 
@@ -94,6 +103,14 @@ class ChannelEditForm(wtf.FlaskForm):
         default=True,
         description=_("Allow others to see that this channel exists."),
     )
+    pack_messages = fields.BooleanField(
+        _("Combine Messages"),
+        default=False,
+        description=_(
+            "Combine short messages sent in quick succession into a single"
+            " line, to reduce how many lines are sent to the channel."
+        ),
+    )
 
     def validate_public(self, field: fields.StringField):
         channel: Channel | None = getattr(self.meta, "channel", None)
@@ -266,6 +283,7 @@ def edit_project(u: User, p: Project):
                     p.website = edit_form.website.data
                     p.public = edit_form.public.data
                     db_session.commit()
+                    invalidate_project(p)
                     flash(
                         _("Changes to your project have been saved."),
                         category="success",
@@ -273,6 +291,8 @@ def edit_project(u: User, p: Project):
                     return redirect(p.url(p.Page.DETAILS))
         case "delete":
             if delete_form.validate_on_submit():
+                # Its hooks are about to go with it.
+                invalidate_project(p)
                 db_session.delete(p)
                 db_session.commit()
 
@@ -297,10 +317,16 @@ def details(u, p: Project):
     if not Project.can(Action.READ, obj=p):
         return abort(403)
 
+    # Messages counted since the counts were last written to the database.
+    pending_counts = MessageCounters.from_app(current_app).pending_hooks(
+        h.id for h in p.hooks
+    )
+
     return render_template(
         "projects/project_details.html",
         project=p,
         user=u,
+        pending_counts=pending_counts,
         page_title="Notifico! - {u.username}/{p.name}".format(u=u, p=p),
     )
 
@@ -364,6 +390,7 @@ def edit_hook(u, p: Project, hid):
         h.config = hook_service.pack_form(form)
         db_session.add(h)
         db_session.commit()
+        invalidate_hook(h)
         return redirect(url_for(".details", p=p.name, u=u.username))
     elif form is None and request.method == "POST":
         db_session.add(h)
@@ -383,33 +410,60 @@ def edit_hook(u, p: Project, hid):
     )
 
 
+class _CappedInput(io.RawIOBase):
+    """
+    Wraps a WSGI input stream, failing with a 413 once more than `limit`
+    bytes have been read. Werkzeug's own limit quietly cuts bodies without a
+    Content-Length short instead.
+    """
+
+    def __init__(self, stream, limit: int):
+        self.stream = stream
+        self.remaining = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        # Reading a single byte past the limit is enough to know.
+        data = self.stream.read(min(len(b), self.remaining + 1))
+        self.remaining -= len(data)
+        if self.remaining < 0:
+            raise RequestEntityTooLarge()
+        b[: len(data)] = data
+        return len(data)
+
+
 @projects.route("/h/<int:pid>/<key>", methods=["GET", "POST"])
 @csrf.exempt
 def hook_receive(pid, key):
-    h = Hook.query.filter_by(key=key, project_id=pid).first()
-    if not h or not h.project:
+    h = get_hook(pid, key)
+    if h is None:
         # The hook being pushed to doesn't exist, has been deleted,
         # or is a leftover from a project cull (which destroyed the project
         # but not the hooks associated with it).
         return abort(404)
 
-    # Increment the hooks message_count....
-    Hook.query.filter_by(id=h.id).update(
-        {Hook.message_count: Hook.message_count + 1}
-    )
-    # ... and the project-wide message_count.
-    Project.query.filter_by(id=h.project.id).update(
-        {Project.message_count: Project.message_count + 1}
-    )
-
-    hook = incoming_services()[h.service_id]
-    if hook is None:
-        # TODO: This should be logged somewhere.
-        return ""
-
-    hook._request(h.project.owner, request, h)
-
-    db_session.commit()
+    max_body_size = current_app.config["HOOK_MAX_BODY_SIZE"]
+    if max_body_size is not None:
+        if (request.content_length or 0) > max_body_size:
+            return abort(413)
+
+        # Chunked requests don't have a Content-Length, so the body is
+        # capped as it's read. It's read (and cached for the service) right
+        # away, so nothing is done with a request that's going to fail.
+        request.environ["wsgi.input"] = _CappedInput(
+            request.environ["wsgi.input"], max_body_size
+        )
+        request.get_data()
+
+    if current_app.config["HOOK_ASYNC_INGEST"]:
+        # Handled by a Celery worker, so slow services can't hold up (or
+        # time out) whoever is sending the webhook.
+        ingest_hook(h, request)
+        return "", 202
+
+    handle_hook(h, request)
     return ""
 
 
@@ -432,6 +486,7 @@ def delete_hook(u, p: Project, hid):
         p.hooks.remove(h)
         db_session.delete(h)
         db_session.commit()
+        invalidate_hook(h)
         return redirect(url_for(".details", p=p.name, u=u.username))
 
     return render_template("projects/delete_hook.html", project=p, hook=h)
@@ -501,10 +556,12 @@ def new_channel(u, p: Project):
                     network=channel.network,
                     public=channel.public,
                     password=channel.password,
+                    pack_messages=channel.pack_messages,
                     project=p,
                 )
             )
             db_session.commit()
+            invalidate_project(p)
             flash(
                 _("The channel has been added to your project."),
                 category="success",
@@ -527,10 +584,12 @@ def new_channel(u, p: Project):
                     network=network,
                     password=form.password.data,
                     public=form.public.data,
+                    pack_messages=form.pack_messages.data,
                 )
                 p.channels.append(c)
                 db_session.add(c)
                 db_session.commit()
+                invalidate_project(p)
 
                 flash(
                     _("The channel has been added to your project."),
@@ -574,7 +633,7 @@ def edit_channel(u, p: Project, cid):
     )
     delete_form = ChannelDeleteForm(prefix="delete", meta={"channel": c})
 
-    ms = MessageService(redis=current_app.redis)  # noqa
+    ms = MessageService.from_app(current_app)
 
     match request.form.get("action"):
         case "edit":
@@ -591,6 +650,8 @@ def edit_channel(u, p: Project, cid):
                 else:
                     edit_form.populate_obj(c)
                     db_session.commit()
+                    ms.channel_changed(c)
+                    invalidate_project(p)
                     flash(
                         _("The channel has been updated."), category="success"
                     )
@@ -600,6 +661,8 @@ def edit_channel(u, p: Project, cid):
                 c.project.channels.remove(c)
                 db_session.delete(c)
                 db_session.commit()
+                ms.channel_changed(c)
+                invalidate_project(p)
                 flash(_("The channel has been deleted."), category="success")
                 return redirect(url_for(".details", p=p.name, u=u.username))
         case "logging":
@@ -2,6 +2,7 @@ from typing import Optional
 
 import flask_wtf as wtf
 from flask import (
+    current_app,
     g,
     redirect,
     url_for,
@@ -24,6 +25,8 @@ from notifico import (
     Permission,
 )
 from notifico.models import IRCNetwork
+from notifico.services.hook_cache import invalidate_network, invalidate_user
+from notifico.services.messages import MessageService
 from notifico.views.account_forms import UserPasswordForm, UserDeleteForm
 
 
@@ -114,6 +117,7 @@ def security():
             case "delete-account":
                 if delete_form.validate_on_submit():
                     session.clear()
+                    invalidate_user(g.user)
                     db_session.delete(g.user)
                     db_session.commit()
                     flash(
@@ -195,6 +199,10 @@ def irc_network_edit(network_id: int):
                     network_form.populate_obj(network)
                     db_session.add(network)
                     db_session.commit()
+                    invalidate_network(network)
+                    MessageService.from_app(current_app).network_changed(
+                        network
+                    )
 
                     flash(
                         lg("Your custom network has been updated."),
@@ -204,8 +212,12 @@ def irc_network_edit(network_id: int):
                     return redirect(url_for(".irc"))
             case "delete":
                 if delete_form.validate_on_submit():
+                    invalidate_network(network)
                     db_session.delete(network)
                     db_session.commit()
+                    MessageService.from_app(current_app).network_changed(
+                        network
+                    )
 
                     flash(
                         lg("Your custom network has been deleted."),
@@ -0,0 +1,108 @@
+import asyncio
+
+from notifico.botifico.bot import Bot, Network
+from notifico.botifico.contrib.plugins.ping import ping_plugin
+from notifico.botifico.events import Event
+from notifico.botifico.parsing import Message
+from notifico.botifico.plugin import Plugin
+
+
+def test_ping_with_write_backlog():
+    """
+    Ensure a bot with a long, slowly-draining backlog of messages still
+    answers PINGs promptly.
+    """
+    slow_writes = Plugin("test_slow_writes")
+
+    @slow_writes.on(Event.on_write, block=True)
+    async def on_write():
+        await asyncio.sleep(0.05)
+
+    async def _run():
+        received = []
+        got_pong = asyncio.Event()
+
+        async def _server(reader, writer):
+            writer.write(b"PING :12345\r\n")
+            await writer.drain()
+            while line := await reader.readline():
+                received.append(line)
+                if line.startswith(b"PONG"):
+                    got_pong.set()
+            writer.close()
+
+        server = await asyncio.start_server(_server, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        bot = Bot(Network("127.0.0.1", port, False), max_queue_size=10)
+        bot.register_plugin(ping_plugin)
+        bot.register_plugin(slow_writes)
+
+        for i in range(5):
+            await bot.send("PRIVMSG", "#a", f":backlog {i}")
+
+        connection = asyncio.create_task(bot.connect())
+        await asyncio.wait_for(got_pong.wait(), timeout=5)
+
+        # Without a priority lane, the PONG would be behind all five
+        # messages.
+        pong = next(i for i, l in enumerate(received) if l.startswith(b"PONG"))
+        assert pong < 2
+        assert bot.pending_writes > 0
+
+        connection.cancel()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(_run())
+
+
+def test_batches():
+    """
+    Ensure messages in an IRCv3 batch are held until the batch ends, and
+    that collapsed batch types are only dispatched as a whole.
+    """
+    received = []
+
+    async def on_batch(batch):
+        received.append((batch.type, len(batch.messages)))
+
+    async def on_quit(args):
+        received.append(("QUIT", args[0]))
+
+    async def on_privmsg(args):
+        received.append(("PRIVMSG", args[1]))
+
+    async def _run():
+        bot = Bot(Network("irc.example.com", 6697, True))
+        bot.register_handler(Event.on_batch, on_batch)
+        bot.register_handler("QUIT", on_quit)
+        bot.register_handler("PRIVMSG", on_privmsg)
+
+        lines = [
+            ":irc BATCH +a netsplit irc.a irc.b",
+            "@batch=a :x!y@z QUIT :irc.a irc.b",
+            "@batch=a :y!y@z QUIT :irc.a irc.b",
+            ":irc BATCH +b chathistory #a",
+            "@batch=b :x!y@z PRIVMSG #a :one",
+            "@batch=b :irc BATCH +c example",
+            "@batch=c :x!y@z PRIVMSG #a :two",
+            ":irc BATCH -c",
+            ":irc BATCH -b",
+            ":x!y@z PRIVMSG #a :three",
+        ]
+        for line in lines:
+            await bot._receive(Message.parse(line))
+
+        # The netsplit only ends after everything else.
+        await bot._receive(Message.parse(":irc BATCH -a"))
+
+    asyncio.run(_run())
+    assert received == [
+        ("chathistory", 2),
+        ("PRIVMSG", "one"),
+        ("example", 1),
+        ("PRIVMSG", "two"),
+        ("PRIVMSG", "three"),
+        ("netsplit", 2),
+    ]
@@ -0,0 +1,39 @@
+import asyncio
+
+from notifico.botifico.bot import Bot, Network
+from notifico.botifico.contrib.plugins.cap import cap_plugin
+from notifico.botifico.events import Event
+from notifico.botifico.parsing import Message
+
+
+def test_sasl_external():
+    """
+    Ensure SASL EXTERNAL is requested when enabled, and holds registration
+    until authentication has finished.
+    """
+
+    async def _run():
+        bot = Bot(Network("irc.example.com", 6697, True))
+        bot.register_plugin(cap_plugin)
+        cap_plugin.set(bot, "sasl", "EXTERNAL")
+
+        await bot.emit_event(Event.on_connected)
+
+        lines = [
+            ":irc CAP * LS :sasl server-time",
+            ":irc CAP * ACK :sasl server-time",
+            "AUTHENTICATE +",
+            ":irc 903 * :SASL authentication successful",
+        ]
+        for line in lines:
+            await bot._receive(Message.parse(line))
+
+        return bot.clear_outbound()
+
+    assert asyncio.run(_run()) == [
+        b"CAP LS 302\r\n",
+        b"CAP REQ :sasl server-time\r\n",
+        b"AUTHENTICATE EXTERNAL\r\n",
+        b"AUTHENTICATE +\r\n",
+        b"CAP END\r\n",
+    ]
@@ -0,0 +1,156 @@
+import asyncio
+import inspect
+import time
+
+from notifico.botifico.bot import Bot, Network
+from notifico.botifico.events import Event
+from notifico.botifico.plugin import Plugin
+
+
+def _make_bot() -> Bot:
+    plugin = Plugin("test_dispatch")
+
+    @plugin.on(Event.on_message)
+    async def on_message(command, args, prefix):
+        pass
+
+    @plugin.on(Event.on_message)
+    async def on_message_with_bot(bot: Bot, plugin: Plugin, command):
+        assert plugin.name == "test_dispatch"
+
+    @plugin.on("PRIVMSG")
+    async def on_privmsg(bot: Bot, args):
+        pass
+
+    bot = Bot(Network("irc.example.com", 6697, True))
+    bot.register_plugin(plugin)
+    return bot
+
+
+def test_dispatch_passes_requested_arguments():
+    """
+    Ensure handlers only receive the arguments they ask for.
+    """
+    received = {}
+
+    async def on_join(args, bot):
+        received.update(args=args, bot=bot)
+
+    bot = Bot(Network("irc.example.com", 6697, True))
+    bot.register_handler("join", on_join)
+
+    asyncio.run(bot.emit_event("JOIN", args=["#a"], prefix=None))
+    assert received == {"args": ["#a"], "bot": bot}
+
+    bot.unregister_handler("JOIN", on_join)
+    assert not bot.event_handlers["JOIN"]
+
+
+def test_dispatch_benchmark(monkeypatch):
+    """
+    Dispatch a large number of events, ensuring no handler introspection
+    happens on the hot path.
+    """
+    bot = _make_bot()
+
+    def _no_signature(*args, **kwargs):
+        raise AssertionError("inspect.signature() called during dispatch.")
+
+    monkeypatch.setattr(inspect, "signature", _no_signature)
+
+    async def _dispatch(count: int):
+        for _ in range(count):
+            await bot.emit_event(
+                Event.on_message,
+                command="PRIVMSG",
+                args=["#a", "hello"],
+                prefix=None,
+            )
+            await bot.emit_event("PRIVMSG", args=["#a", "hello"], prefix=None)
+
+    count = 20000
+    start = time.perf_counter()
+    asyncio.run(_dispatch(count))
+    elapsed = time.perf_counter() - start
+
+    # Timings vary too much between machines to assert on, so they're only
+    # reported (with `pytest -s`).
+    print(f"\n{elapsed / count * 1e6:.2f}us to dispatch each event pair")
+
+
+def test_dispatch_non_blocking_handlers():
+    """
+    Ensure non-blocking handlers run in their own tasks, and that their
+    errors are reported through `on_exception`.
+    """
+    plugin = Plugin("test_non_blocking")
+    release = asyncio.Event()
+    errors = []
+
+    @plugin.on("PRIVMSG")
+    async def on_slow_privmsg():
+        await release.wait()
+
+    @plugin.on("PRIVMSG")
+    async def on_broken_privmsg():
+        raise ValueError("broken")
+
+    @plugin.on(Event.on_exception, block=True)
+    async def on_exception(ex):
+        errors.append(ex)
+
+    async def _dispatch():
+        bot = Bot(Network("irc.example.com", 6697, True))
+        bot.register_plugin(plugin)
+
+        # This would never return if the slow handler was awaited inline.
+        await bot.emit_event("PRIVMSG", args=["#a", "hello"], prefix=None)
+        assert bot.in_flight_handlers == 2
+
+        release.set()
+        await asyncio.gather(*bot.handler_tasks)
+        assert bot.in_flight_handlers == 0
+
+    asyncio.run(_dispatch())
+    assert len(errors) == 1 and isinstance(errors[0], ValueError)
+
+
+def test_dispatch_handler_backlog():
+    """
+    Ensure dispatching never waits for a handler slot, and that events are
+    dropped once too many handlers are waiting for one.
+    """
+    plugin = Plugin("test_backlog")
+    release = asyncio.Event()
+    handled = []
+
+    @plugin.on("PRIVMSG")
+    async def on_privmsg(args):
+        await release.wait()
+        handled.append(args[1])
+
+    async def _dispatch():
+        bot = Bot(
+            Network("irc.example.com", 6697, True),
+            max_handler_tasks=1,
+            max_handler_backlog=2,
+        )
+        bot.register_plugin(plugin)
+
+        for i in range(4):
+            await asyncio.wait_for(
+                bot.emit_event("PRIVMSG", args=["#a", i], prefix=None), 1
+            )
+            # Let the handler take a slot, or start waiting for one.
+            await asyncio.sleep(0)
+
+        # One running, two waiting, and the last one dropped.
+        assert bot.in_flight_handlers == 3
+        assert bot.handler_backlog == 2
+
+        release.set()
+        await asyncio.gather(*bot.handler_tasks)
+        assert bot.handler_backlog == 0
+
+    asyncio.run(_dispatch())
+    assert handled == [0, 1, 2]
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from notifico.botifico.errors import ReadExceededError
+from notifico.botifico.framing import LineFramer
+
+
+def _names_burst(count: int) -> bytes:
+    """
+    Build a synthetic burst of server traffic, similar to what's sent when
+    joining a very large channel.
+    """
+    return b"".join(
+        b":irc.example.com 353 Not = #big :"
+        + b" ".join(b"user%d_%d" % (i, j) for j in range(20))
+        + b"\r\n"
+        for i in range(count)
+    )
+
+
+def test_framing_partial_lines():
+    """
+    Ensure lines split across chunks are reassembled.
+    """
+    framer = LineFramer()
+
+    assert framer.feed(b"PING :irc.exa") == []
+    assert framer.feed(b"mple.com\r\nPRIVMSG #a :hi\r") == [
+        "PING :irc.example.com"
+    ]
+    assert framer.feed(b"\n\r\n:a!b@c JOIN #a\n") == [
+        "PRIVMSG #a :hi",
+        ":a!b@c JOIN #a",
+    ]
+    assert len(framer) == 0
+
+
+def test_framing_fallback_encoding():
+    """
+    Ensure a line that isn't valid UTF-8 doesn't break the lines around it.
+    """
+    framer = LineFramer()
+
+    assert framer.feed(
+        "PRIVMSG #a :café\r\n".encode("utf-8")
+        + "PRIVMSG #a :café\r\n".encode("latin-1")
+    ) == ["PRIVMSG #a :café", "PRIVMSG #a :café"]
+
+
+def test_framing_buffer_limit():
+    """
+    Ensure an unterminated line can't grow forever.
+    """
+    framer = LineFramer(max_buffer_size=16)
+
+    with pytest.raises(ReadExceededError):
+        framer.feed(b"x" * 17)
+
+
+def test_framing_burst_benchmark():
+    """
+    Feed synthetic bursts of increasing size through the framer, reporting
+    the time taken per line, which should stay (roughly) flat.
+    """
+    timings = {}
+    for count in (1000, 16000):
+        burst = _names_burst(count)
+        framer = LineFramer()
+
+        start = time.perf_counter()
+        lines = []
+        for i in range(0, len(burst), 0x4000):
+            lines.extend(framer.feed(burst[i : i + 0x4000]))
+        # A single enormous chunk is the worst case for naive splitting.
+        lines.extend(framer.feed(burst))
+        timings[count] = (time.perf_counter() - start) / count
+
+        assert len(lines) == count * 2
+
+    # Timings vary too much between machines to assert on, so they're only
+    # reported (with `pytest -s`). Quadratic behaviour would be off by orders
+    # of magnitude.
+    for count, timing in timings.items():
+        print(f"\n{count} names: {timing * 1e6:.2f}us per line")
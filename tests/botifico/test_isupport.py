@@ -0,0 +1,79 @@
+import asyncio
+
+from notifico.botifico.bot import Network
+from notifico.botifico.contrib.plugins.isupport import ISupport, isupport_plugin
+from notifico.botifico.contrib.plugins.ready import ready_plugin
+from notifico.botifico.manager import Channel, ChannelBot, Manager
+
+
+def test_isupport_parsing():
+    """
+    Ensure RPL_ISUPPORT tokens are parsed into their typed fields.
+    """
+    isupport = ISupport()
+    isupport.update(
+        [
+            "CHANLIMIT=#&:100,+:",
+            "TARGMAX=NAMES:1,PRIVMSG:4,NOTICE:,JOIN:",
+            "NICKLEN=30",
+            "CASEMAPPING=ascii",
+            "PREFIX=(qaohv)~&@%+",
+            "NETWORK=Example\\x20Net",
+            "MODES",
+            "EXCEPTS",
+        ]
+    )
+
+    assert isupport.network == "Example Net"
+    assert isupport.casemapping == "ascii"
+    assert isupport.nicklen == 30
+    assert isupport.modes is None
+    assert isupport.prefix["h"] == "%"
+    assert "EXCEPTS" in isupport.tokens
+
+    assert isupport.channel_limit("#notifico") == 100
+    assert isupport.channel_limit("&notifico") == 100
+    assert isupport.channel_limit("+notifico") is None
+    assert isupport.chanlimit_group("#a") == isupport.chanlimit_group("&a")
+
+    assert isupport.max_targets("PRIVMSG") == 4
+    assert isupport.max_targets("NOTICE") is None
+    assert isupport.max_targets("KICK") == 1
+
+    isupport.update(["-EXCEPTS", "PREFIX=(ov"])
+    assert "EXCEPTS" not in isupport.tokens
+    assert isupport.prefix["h"] == "%"
+
+
+def test_manager_channel_sharding():
+    """
+    Ensure the manager opens new connections once a bot is at the server's
+    channel limit, spreading channels across them.
+    """
+
+    class FakeBot(ChannelBot):
+        async def connect(self):
+            isupport_plugin.isupport(self).update(["CHANLIMIT=#:2"])
+            ready_plugin.is_ready(self).set()
+            # Stay "connected", or the manager would reconnect us.
+            await asyncio.get_running_loop().create_future()
+
+    async def _place():
+        manager = Manager(
+            "test_sharding",
+            bot_class=FakeBot,
+            max_bots_per_network=2,
+            connect_interval=0,
+        )
+        network = Network("irc.example.com", 6697, True)
+
+        for i in range(5):
+            await manager.channel(network, Channel(f"#channel{i}"))
+            # Let the newly created bots "connect".
+            await asyncio.sleep(0)
+
+        return sorted(len(bot.channels) for bot in manager.bots[network])
+
+    # The last channel doesn't fit anywhere, so goes on the least loaded bot
+    # once we've reached our connection limit.
+    assert asyncio.run(_place()) == [2, 3]
@@ -1,4 +1,18 @@
-from notifico.botifico.manager import Manager, Plugin
+import asyncio
+
+import pytest
+
+from notifico.botifico.bot import Network
+from notifico.botifico.manager import (
+    Channel,
+    ChannelBot,
+    Manager,
+    Plugin,
+    batch_messages,
+    pack_lines,
+)
+from notifico.botifico.events import Event
+from notifico.botifico.parsing import Prefix
 
 
 def test_plugin_event_registration():
@@ -18,3 +32,362 @@ def test_plugin_event_registration():
     manager.register_plugin(plugin)
 
     assert on_test in manager.event_receivers['test']
+
+
+def test_batch_messages_coalescing():
+    """
+    Ensure identical messages to several channels are coalesced, without
+    going over the target limit or reordering messages.
+    """
+    a, b, c = Channel("#a"), Channel("#b"), Channel("#c")
+
+    planned = batch_messages(
+        {a: ["one", "two"], b: ["one", "two"], c: ["one", "two"]},
+        max_targets=2,
+    )
+    assert planned == [
+        (["#a", "#b"], "one"),
+        (["#c"], "one"),
+        (["#a", "#b"], "two"),
+        (["#c"], "two"),
+    ]
+
+    # Channels getting different messages can't be merged.
+    planned = batch_messages({a: ["one", "two"], b: ["two"]}, max_targets=4)
+    assert planned == [(["#a"], "one"), (["#a"], "two"), (["#b"], "two")]
+
+
+def test_batch_messages_packing():
+    """
+    Ensure short messages are only packed for channels that opted in, and
+    that packed lines stay within the line length limit.
+    """
+    packed = Channel("#packed", pack_messages=True)
+    unpacked = Channel("#unpacked")
+
+    planned = batch_messages({packed: ["one", "two"], unpacked: ["one", "two"]})
+    assert planned == [
+        (["#packed"], "one | two"),
+        (["#unpacked"], "one"),
+        (["#unpacked"], "two"),
+    ]
+
+    lines = pack_lines("#packed", ["x" * 150] * 10)
+    assert len(lines) == 5
+    assert all(len(f"PRIVMSG #packed :{line}\r\n") <= 402 for line in lines)
+
+
+def test_channel_index():
+    """
+    Ensure channels are found regardless of case, and that JOIN/PART/KICK
+    only change state when they're about us.
+    """
+
+    async def _run():
+        manager = Manager("test_channel_index")
+        bot = ChannelBot(manager, Network("irc.example.com", 6697, True))
+        proxy = bot[Channel("#Notifico[dev]")]
+
+        assert bot.get_channel("#notifico{DEV}") is proxy
+        assert bot.get_channel("#other") is None
+
+        await bot.emit_event("001", args=["Not", "Welcome"], prefix=None)
+
+        await bot.emit_event(
+            "JOIN", args=["#notifico[dev]"], prefix=Prefix("someone")
+        )
+        assert not proxy.joined.is_set()
+
+        await bot.emit_event(
+            "JOIN", args=["#NOTIFICO[DEV]"], prefix=Prefix("NOT")
+        )
+        assert proxy.joined.is_set()
+
+        await bot.emit_event(
+            "KICK", args=["#notifico[dev]", "someone"], prefix=Prefix("op")
+        )
+        assert proxy.joined.is_set()
+
+        await bot.emit_event(
+            "KICK", args=["#notifico[dev]", "Not"], prefix=Prefix("op")
+        )
+        assert not proxy.joined.is_set()
+
+    asyncio.run(_run())
+
+
+def test_shutdown():
+    """
+    Ensure shutting down sends what it can before QUITting, and returns
+    whatever couldn't be sent in time.
+    """
+    slow_writes = Plugin("test_slow_writes")
+
+    @slow_writes.on(Event.on_write, block=True)
+    async def on_write(message: bytes):
+        if b"#slow" in message:
+            await asyncio.sleep(0.5)
+
+    async def _run():
+        received = []
+
+        async def _server(reader, writer):
+            while line := await reader.readline():
+                received.append(line)
+                if line.startswith(b"QUIT"):
+                    break
+            writer.close()
+
+        server = await asyncio.start_server(_server, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        manager = Manager("botifico", connect_interval=0)
+        manager.register_plugin(slow_writes)
+        bot = await manager.add_bot_to_network(
+            Network("127.0.0.1", port, False)
+        )
+        manager.connect(bot)
+
+        for i in range(3):
+            await bot.send("PRIVMSG", "#fast", f":{i}")
+        for i in range(3):
+            await bot.send("PRIVMSG", "#slow", f":{i}")
+
+        unsent = await manager.shutdown(timeout=0.2, reason="Bye")
+
+        assert received[:3] == [
+            f"PRIVMSG #fast :{i}\r\n".encode() for i in range(3)
+        ]
+        assert received[-1] == b"QUIT :Bye\r\n"
+        # The first slow message was already being written.
+        assert unsent == {
+            bot: [f"PRIVMSG #slow :{i}\r\n".encode() for i in (1, 2)]
+        }
+        assert manager.connections == {}
+
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(_run())
+
+
+def test_reconnect():
+    """
+    Ensure a bot that loses its connection is reconnected and rejoins the
+    channels it was in.
+    """
+    reconnects = []
+
+    async def on_reconnect(attempt, delay):
+        reconnects.append(attempt)
+
+    async def _run():
+        connections = 0
+        rejoined = asyncio.Event()
+
+        async def _server(reader, writer):
+            nonlocal connections
+            connections += 1
+
+            writer.write(b":irc 001 bot :Welcome\r\n:irc 376 bot :End\r\n")
+            while line := await reader.readline():
+                if line.startswith(b"QUIT"):
+                    break
+                elif line == b"JOIN #a\r\n":
+                    writer.write(b":bot!u@h JOIN #a\r\n")
+                    if connections > 1:
+                        rejoined.set()
+                    else:
+                        # Drop the first connection once the bot is in.
+                        break
+                await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(_server, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        manager = Manager("botifico", connect_interval=0, reconnect_delay=0.01)
+        bot = await manager.add_bot_to_network(
+            Network("127.0.0.1", port, False)
+        )
+        bot.register_handler(Event.on_reconnect, on_reconnect)
+        manager.connect(bot)
+
+        await bot[Channel("#a")].join()
+        await asyncio.wait_for(rejoined.wait(), timeout=5)
+
+        assert connections == 2
+        assert bot in manager.bots[bot.network]
+
+        await manager.shutdown(timeout=0.1)
+        assert manager.bots[bot.network] == set()
+
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(_run())
+    assert reconnects == [1]
+
+
+def test_disconnect():
+    """
+    Ensure disconnecting from a network QUITs its bots and stops them from
+    reconnecting.
+    """
+
+    async def _run():
+        connections = 0
+        quit_ = asyncio.Event()
+
+        async def _server(reader, writer):
+            nonlocal connections
+            connections += 1
+
+            writer.write(b":irc 001 bot :Welcome\r\n:irc 376 bot :End\r\n")
+            while line := await reader.readline():
+                if line.startswith(b"QUIT"):
+                    quit_.set()
+                    break
+                elif line == b"JOIN #a\r\n":
+                    writer.write(b":bot!u@h JOIN #a\r\n")
+                await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(_server, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        network = Network("127.0.0.1", port, False)
+
+        manager = Manager("botifico", connect_interval=0, reconnect_delay=0.01)
+        bot = await manager.add_bot_to_network(network)
+        manager.connect(bot)
+        await bot[Channel("#a")].join()
+
+        assert await manager.disconnect(network, timeout=1) == {}
+        assert quit_.is_set()
+        assert not manager.bots[network]
+        assert bot not in manager.connections
+
+        # Given plenty of time to (wrongly) reconnect.
+        await asyncio.sleep(0.1)
+        assert connections == 1
+
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(_run())
+
+
+def test_channel_while_reconnecting():
+    """
+    Ensure channels aren't held up by (or placed on) a bot that's waiting to
+    reconnect, when another connection can take them.
+    """
+
+    async def _run():
+        async def _server(reader, writer):
+            writer.write(b":irc 001 bot :Welcome\r\n:irc 376 bot :End\r\n")
+            while line := await reader.readline():
+                if line.startswith(b"QUIT"):
+                    break
+                elif line.startswith(b"JOIN "):
+                    channel = line.split()[1]
+                    writer.write(b":bot!u@h JOIN " + channel + b"\r\n")
+                await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(_server, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        network = Network("127.0.0.1", port, False)
+
+        manager = Manager("botifico", connect_interval=0, ready_timeout=60)
+        stuck = await manager.add_bot_to_network(network)
+        manager.reconnecting.add(stuck)
+
+        # A new connection is opened rather than waiting on `stuck`.
+        a = await asyncio.wait_for(manager.channel(network, Channel("#a")), 1)
+        assert a.bot is not stuck
+        await a.join()
+
+        # Which is used from then on, since it has room.
+        b = await asyncio.wait_for(manager.channel(network, Channel("#b")), 1)
+        assert b.bot is a.bot
+        assert len(manager.bots[network]) == 2
+        assert stuck.channels == {}
+
+        manager.bots[network].discard(stuck)
+        await manager.shutdown(timeout=0.1)
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(_run())
+
+
+def test_batcher_backpressure():
+    """
+    Ensure batches to the same channel are sent in order, even when one is
+    still waiting on a full outbound queue as the next is flushed.
+    """
+
+    async def _run():
+        bot = ChannelBot(
+            Manager("botifico"),
+            Network("irc.example.com", 6667, False),
+            max_queue_size=1,
+        )
+        sent = []
+
+        async def _slow_writer():
+            while True:
+                sent.append(await bot.message_queue.get())
+                await asyncio.sleep(0.05)
+
+        writer = asyncio.create_task(_slow_writer())
+
+        flushed = []
+        for b in range(3):
+            for i in range(5):
+                flushed.append(bot.batcher.queue(Channel("#a"), f"b{b}.{i}"))
+            await asyncio.sleep(bot.batcher.delay * 1.5)
+
+        await asyncio.gather(*flushed)
+        await asyncio.sleep(0.05)
+        writer.cancel()
+        return sent
+
+    assert asyncio.run(_run()) == [
+        f"PRIVMSG #a :b{b}.{i}\r\n".encode() for b in range(3) for i in range(5)
+    ]
+
+
+def test_stop_sending():
+    """
+    Ensure stopping a bot returns messages still being batched, including
+    those of a batch blocked on a full outbound queue, which never reach the
+    queue afterwards.
+    """
+
+    async def _run():
+        bot = ChannelBot(
+            Manager("botifico"),
+            Network("irc.example.com", 6667, False),
+            max_queue_size=1,
+        )
+
+        first = [bot.batcher.queue(Channel("#a"), f"{i}") for i in range(3)]
+        await asyncio.sleep(bot.batcher.delay * 2)
+        # Only the first line fits, the rest of the batch is waiting on it.
+        second = bot.batcher.queue(Channel("#a"), "3")
+
+        assert await bot.stop_sending() == [
+            f"PRIVMSG #a :{i}\r\n".encode() for i in range(4)
+        ]
+        for flushed in (first[0], second):
+            with pytest.raises(RuntimeError):
+                await flushed
+        with pytest.raises(RuntimeError):
+            bot.batcher.queue(Channel("#a"), "4")
+
+        await asyncio.sleep(bot.batcher.delay * 2)
+        assert bot.message_queue.empty()
+
+    asyncio.run(_run())
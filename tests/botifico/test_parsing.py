@@ -0,0 +1,143 @@
+import datetime
+import pathlib
+import timeit
+
+from notifico.botifico.parsing import (
+    Message,
+    Prefix,
+    server_time,
+    unpack_message,
+    unpack_prefix,
+    unpack_tagged_message,
+    unpack_tags,
+)
+
+#: A sample of real server traffic, mostly from a busy channel.
+TRAFFIC = (
+    (pathlib.Path(__file__).parent / "data" / "traffic.txt")
+    .read_text()
+    .splitlines()
+)
+
+
+def test_unpack_message():
+    """
+    Ensure plain RFC1459 messages are unpacked.
+    """
+    assert unpack_message(":nick!user@host privmsg #a :hello world") == (
+        Prefix(nick="nick", user="user", host="host"),
+        "PRIVMSG",
+        ["#a", "hello world"],
+    )
+    assert unpack_message("PING :irc.example.com") == (
+        None,
+        "PING",
+        ["irc.example.com"],
+    )
+
+
+def test_unpack_tagged_message():
+    """
+    Ensure IRCv3 message tags are unpacked and unescaped.
+    """
+    tags, prefix, command, args = unpack_tagged_message(
+        "@time=2023-04-09T02:38:10.578Z;batch=yXNAbvnRHTRBv;"
+        "+example.com/note=a\\sb\\:c\\\\;flag "
+        ":nick!user@host PRIVMSG #a :hello"
+    )
+
+    assert tags == {
+        "time": "2023-04-09T02:38:10.578Z",
+        "batch": "yXNAbvnRHTRBv",
+        "+example.com/note": "a b;c\\",
+        "flag": "",
+    }
+    assert prefix.nick == "nick"
+    assert (command, args) == ("PRIVMSG", ["#a", "hello"])
+
+    assert server_time(tags) == datetime.datetime(
+        2023, 4, 9, 2, 38, 10, 578000, tzinfo=datetime.timezone.utc
+    )
+    assert server_time({"time": "yesterday"}) is None
+
+    # Tags are silently dropped by the old interface.
+    assert unpack_message("@a=b PING :x") == (None, "PING", ["x"])
+
+
+def _tuple_unpack(line):
+    """
+    The tuple-based parser :class:`Message` replaced, kept to benchmark
+    against.
+    """
+    prefix = None
+    tags = {}
+
+    line = line.rstrip()
+    if line[0] == "@":
+        tags, _, line = line[1:].partition(" ")
+        tags = unpack_tags(tags)
+        line = line.lstrip()
+
+    if line[0] == ":":
+        prefix, line = line[1:].split(" ", 1)
+        prefix = unpack_prefix(prefix)
+    if " :" in line:
+        line, trailing = line.split(" :", 1)
+        args = line.split()
+        args.append(trailing)
+    else:
+        args = line.split()
+
+    return tags, prefix, args.pop(0).upper(), args
+
+
+def test_message_parse():
+    """
+    Ensure messages are parsed the same way as by unpack_tagged_message(),
+    with the prefix only unpacked when it's used.
+    """
+    message = Message.parse("@a=b :nick!user@host privmsg #a :hello world")
+    assert message.raw == "@a=b :nick!user@host privmsg #a :hello world"
+    assert message.command == "PRIVMSG"
+    assert message.args == ["#a", "hello world"]
+    assert message.tags == {"a": "b"}
+    assert message.source == "nick!user@host"
+    assert message._prefix is None
+    assert message.prefix == Prefix(nick="nick", user="user", host="host")
+    assert message.prefix is message.prefix
+
+    # Commands are normalized and interned, regardless of their case.
+    assert Message.parse("ping x").command is Message.parse("PING y").command
+
+    assert Message.parse("") is None
+    assert Message.parse("   ") is None
+    assert Message.parse("PING").args == []
+    assert Message.parse(":irc.example.com").command == ""
+
+    for line in TRAFFIC:
+        assert unpack_tagged_message(line) == _tuple_unpack(line)
+
+
+def test_message_benchmark():
+    """
+    Compare parsing real server traffic into Messages with the tuple-based
+    parser it replaced.
+
+    Timings are only reported (with ``pytest -s``), since wall-clock
+    comparisons are too noisy to fail a test run on.
+    """
+    timings = {
+        name: min(
+            timeit.repeat(
+                lambda: [parse(line) for line in TRAFFIC],
+                number=200,
+                repeat=5,
+            )
+        )
+        for name, parse in (
+            ("tuple", _tuple_unpack),
+            ("message", Message.parse),
+        )
+    }
+    for name, timing in timings.items():
+        print(f"\n{name}: {timing:.4f}s to parse {len(TRAFFIC)} lines x200")
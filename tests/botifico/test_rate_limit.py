@@ -0,0 +1,76 @@
+import asyncio
+
+from notifico.botifico.bot import Bot, Network
+from notifico.botifico.contrib.plugins import rate_limit
+from notifico.botifico.contrib.plugins.rate_limit import RateLimit, TokenBucket
+
+
+def test_token_bucket(monkeypatch):
+    """
+    Ensure the token bucket allows a burst, then slows down to its rate.
+    """
+    now = [100.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+
+    limit = RateLimit(burst=3, rate=0.5, byte_cost=0.01)
+    bucket = TokenBucket(limit)
+
+    # The first 3 messages go out immediately.
+    for _ in range(3):
+        assert bucket.delay(1) == 0
+        bucket.tokens -= 1
+
+    assert bucket.delay(1) == 2
+
+    now[0] += 1
+    assert bucket.delay(1) == 1
+
+    # Credit never builds past the burst size.
+    now[0] += 60
+    assert bucket.delay(3) == 0
+    assert bucket.tokens == 3
+
+    assert limit.cost(b"x" * 100) == 2
+    assert limit.cost(b"x" * 1000) == 3
+
+
+def test_configure():
+    """
+    Ensure limits can be set for a network or for every port of a host.
+    """
+    plugin = rate_limit.RateLimitPlugin("test", default=RateLimit(burst=1))
+    plugin.configure("irc.oftc.net", RateLimit(burst=2))
+    plugin.configure(Network("irc.oftc.net", 6697, True), RateLimit(burst=3))
+
+    assert plugin.limit(Network("irc.libera.chat", 6697, True)).burst == 1
+    assert plugin.limit(Network("irc.oftc.net", 6667, False)).burst == 2
+    assert plugin.limit(Network("irc.oftc.net", 6697, True)).burst == 3
+
+
+def test_queue_delay(monkeypatch):
+    """
+    Ensure the estimated wait counts the bytes of queued messages, as well
+    as the number of them.
+    """
+    now = [100.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+
+    plugin = rate_limit.RateLimitPlugin(
+        "test", default=RateLimit(burst=2, rate=1, byte_cost=0.01)
+    )
+    bot = Bot(Network("irc.libera.chat", 6697, True))
+
+    async def _run():
+        await bot.send_raw(b"x" * 100)
+        await bot.send_raw(b"x" * 100)
+        # 2 messages of 100 bytes cost 4, and only 2 is available.
+        assert plugin.queue_delay(bot) == 2
+
+        await bot._next_outbound()
+        assert bot.pending_bytes == 100
+        assert plugin.queue_delay(bot) == 0
+
+        bot.clear_outbound()
+        assert bot.pending_bytes == 0
+
+    asyncio.run(_run())
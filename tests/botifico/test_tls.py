@@ -0,0 +1,107 @@
+import pathlib
+import ssl
+
+import pytest
+
+from notifico.botifico.tls import SessionCachingContext, create_ssl_context
+
+#: A self-signed certificate (and its key) for "localhost".
+CERT = str(pathlib.Path(__file__).parent / "data" / "localhost.pem")
+
+
+@pytest.fixture(scope="module")
+def server_context():
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(CERT)
+    return context
+
+
+def _connect(
+    context: ssl.SSLContext, server_context: ssl.SSLContext
+) -> ssl.SSLObject:
+    """
+    Connect to a server over in-memory buffers, returning the client's side
+    of the connection once some data has made it across.
+    """
+    c_in, c_out, s_in, s_out = (ssl.MemoryBIO() for _ in range(4))
+    client = context.wrap_bio(c_in, c_out, server_hostname="localhost")
+    server = server_context.wrap_bio(s_in, s_out, server_side=True)
+
+    def _pump():
+        s_in.write(c_out.read())
+        c_in.write(s_out.read())
+
+    for _ in range(10):
+        for side in (client, server):
+            try:
+                side.do_handshake()
+            except ssl.SSLWantReadError:
+                pass
+        _pump()
+
+    # With TLS 1.3 the session ticket arrives after the handshake, along
+    # with the first data from the server.
+    server.write(b"hello")
+    _pump()
+    assert client.read() == b"hello"
+    return client
+
+
+def test_session_resumed(server_context):
+    """
+    Ensure the session of a finished connection is offered, and resumed,
+    by the next connection made with the same context.
+    """
+    context = create_ssl_context(cafile=CERT)
+    assert isinstance(context, SessionCachingContext)
+
+    first = _connect(context, server_context)
+    assert not first.session_reused
+    context.save_session(first)
+    assert context.session is not None
+
+    second = _connect(context, server_context)
+    assert second.session_reused
+
+    # Each network gets its own context, which starts without a session.
+    other = create_ssl_context(cafile=CERT)
+    assert not _connect(other, server_context).session_reused
+
+
+def test_session_not_saved(server_context):
+    """
+    Ensure nothing is saved for a connection that never finished its
+    handshake.
+    """
+    context = create_ssl_context()
+
+    # Our certificate isn't trusted by the system's CA certificates.
+    c_in, c_out = ssl.MemoryBIO(), ssl.MemoryBIO()
+    client = context.wrap_bio(c_in, c_out, server_hostname="localhost")
+    with pytest.raises(ssl.SSLError):
+        _connect(context, server_context)
+
+    context.save_session(client)
+    context.save_session(None)
+    assert context.session is None
+
+
+def test_create_ssl_context():
+    """
+    Ensure certificates are checked unless verification is turned off.
+    """
+    context = create_ssl_context()
+    assert context.check_hostname
+    assert context.verify_mode == ssl.CERT_REQUIRED
+
+    context = create_ssl_context(cafile=CERT)
+    assert context.check_hostname
+    assert context.verify_mode == ssl.CERT_REQUIRED
+    assert context.cert_store_stats()["x509_ca"] == 1
+
+    context = create_ssl_context(verify=False)
+    assert not context.check_hostname
+    assert context.verify_mode == ssl.CERT_NONE
+
+    # A client certificate (CertFP), with the key in the same file.
+    create_ssl_context(certfile=CERT)
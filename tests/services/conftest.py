@@ -0,0 +1,357 @@
+import itertools
+import time
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+from redis.exceptions import ResponseError
+from sqlalchemy.pool import StaticPool
+
+import notifico.models  # noqa: F401, registers every table
+from notifico.database import Base, db_session, engine
+from notifico.settings import Settings
+
+
+def _b(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
+
+
+def _seq(entry_id) -> int:
+    return int(_b(entry_id).split(b"-")[0])
+
+
+class FakeRedis:
+    """
+    An in-memory stand-in for the parts of a (synchronous) Redis client used
+    by the web app, which records every command and round trip.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        #: Consumer groups, by stream and group name.
+        self.groups = {}
+        self._stream_ids = itertools.count(1)
+        #: Every command run, as `(name, args)`.
+        self.commands = []
+        #: The number of round trips made, counting a pipeline as one.
+        self.round_trips = 0
+
+    def _run(self, name, *args, **kwargs):
+        self.commands.append((name, args))
+        return getattr(self, f"_{name}")(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if not hasattr(type(self), f"_{name}"):
+            raise AttributeError(name)
+
+        def _command(*args, **kwargs):
+            self.round_trips += 1
+            return self._run(name, *args, **kwargs)
+
+        return _command
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def _exists(self, *keys):
+        return sum(_b(k) in self.data for k in keys)
+
+    def _delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            deleted += self.data.pop(_b(key), None) is not None
+            self.ttls.pop(_b(key), None)
+        return deleted
+
+    def _rename(self, src, dst):
+        if _b(src) not in self.data:
+            raise ResponseError("ERR no such key")
+        self.data[_b(dst)] = self.data.pop(_b(src))
+
+    def _expire(self, key, seconds):
+        self.ttls[_b(key)] = seconds
+
+    def _ttl(self, key):
+        return self.ttls.get(_b(key), -1)
+
+    def _hset(self, key, mapping):
+        h = self.data.setdefault(_b(key), {})
+        h.update({_b(k): _b(v) for k, v in mapping.items()})
+
+    def _hincrby(self, key, field, amount=1):
+        h = self.data.setdefault(_b(key), {})
+        h[_b(field)] = _b(int(h.get(_b(field), 0)) + amount)
+        return int(h[_b(field)])
+
+    def _hgetall(self, key):
+        return dict(self.data.get(_b(key), {}))
+
+    def _hmget(self, key, fields):
+        h = self.data.get(_b(key), {})
+        return [h.get(_b(f)) for f in fields]
+
+    def _rpush(self, key, *values):
+        values_ = self.data.setdefault(_b(key), [])
+        values_.extend(_b(v) for v in values)
+        return len(values_)
+
+    def _lpush(self, key, *values):
+        values_ = self.data.setdefault(_b(key), [])
+        values_[:0] = [_b(v) for v in reversed(values)]
+        return len(values_)
+
+    def _lrange(self, key, start, stop):
+        values = self.data.get(_b(key), [])
+        return values[start : None if stop == -1 else stop + 1]
+
+    def _ltrim(self, key, start, stop):
+        key = _b(key)
+        self.data[key] = self._lrange(key, start, stop)
+
+    def _lmove(self, src, dst, wherefrom, whereto):
+        values = self.data.get(_b(src))
+        if not values:
+            return None
+
+        value = values.pop(0 if wherefrom == "LEFT" else -1)
+        if whereto == "LEFT":
+            self._lpush(dst, value)
+        else:
+            self._rpush(dst, value)
+        return value
+
+    def _blmove(self, src, dst, timeout, wherefrom, whereto):
+        # Never blocks, as if the timeout had passed.
+        return self._lmove(src, dst, wherefrom, whereto)
+
+    def _lrem(self, key, count, value):
+        values = self.data.get(_b(key), [])
+        removed = 0
+        while _b(value) in values and removed < count:
+            values.remove(_b(value))
+            removed += 1
+        return removed
+
+    def _get(self, key):
+        return self.data.get(_b(key))
+
+    def _set(self, key, value, nx=False, px=None):
+        if nx and _b(key) in self.data:
+            return None
+        self.data[_b(key)] = _b(value)
+        if px is not None:
+            self.ttls[_b(key)] = px / 1000
+        return True
+
+    def _pexpire(self, key, milliseconds):
+        if _b(key) not in self.data:
+            return 0
+        self.ttls[_b(key)] = int(milliseconds) / 1000
+        return 1
+
+    def _sadd(self, key, *members):
+        s = self.data.setdefault(_b(key), set())
+        s.update(_b(m) for m in members)
+
+    def _smembers(self, key):
+        return set(self.data.get(_b(key), ()))
+
+    def _zadd(self, key, mapping):
+        z = self.data.setdefault(_b(key), {})
+        z.update({_b(k): v for k, v in mapping.items()})
+
+    def _zrem(self, key, *members):
+        z = self.data.get(_b(key), {})
+        return sum(z.pop(_b(m), None) is not None for m in members)
+
+    def _zremrangebyscore(self, key, low, high):
+        z = self.data.get(_b(key), {})
+        for member, score in list(z.items()):
+            if float(low) <= score <= float(high):
+                del z[member]
+
+    def _zcard(self, key):
+        return len(self.data.get(_b(key), {}))
+
+    def _xadd(self, key, fields, maxlen=None, approximate=True):
+        entry_id = _b(f"{next(self._stream_ids)}-0")
+        entries = self.data.setdefault(_b(key), [])
+        entries.append((entry_id, {_b(k): _b(v) for k, v in fields.items()}))
+        return entry_id
+
+    def _xgroup_create(self, stream, group, id="$", mkstream=False):
+        if (_b(stream), group) in self.groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        self.data.setdefault(_b(stream), [])
+        # The last entry delivered, and who each pending entry was last
+        # delivered to (and when).
+        self.groups[(_b(stream), group)] = {"last": 0, "pending": {}}
+
+    def _xreadgroup(self, group, consumer, streams, count=None, block=None):
+        # Never blocks, as if the timeout had passed.
+        response = []
+        for stream, _ in streams.items():
+            g = self.groups[(_b(stream), group)]
+            entries = [
+                (entry_id, fields)
+                for entry_id, fields in self.data.get(_b(stream), [])
+                if _seq(entry_id) > g["last"]
+            ][:count]
+            for entry_id, _ in entries:
+                g["pending"][entry_id] = (consumer, time.monotonic())
+                g["last"] = _seq(entry_id)
+            if entries:
+                response.append([_b(stream), entries])
+        return response
+
+    def _xautoclaim(
+        self, stream, group, consumer, min_idle_time, start_id="0-0", count=None
+    ):
+        g = self.groups[(_b(stream), group)]
+        fields = dict(self.data.get(_b(stream), []))
+        now = time.monotonic()
+
+        claimed = []
+        for entry_id, (_, delivered) in sorted(
+            g["pending"].items(), key=lambda item: _seq(item[0])
+        ):
+            if _seq(entry_id) < _seq(start_id):
+                continue
+            if (now - delivered) * 1000 < min_idle_time:
+                continue
+            g["pending"][entry_id] = (consumer, now)
+            # Entries trimmed from the stream come back without any fields,
+            # as they do before Redis 7.
+            claimed.append((entry_id, fields.get(entry_id)))
+        return [b"0-0", claimed]
+
+    def _xack(self, stream, group, *ids):
+        pending = self.groups[(_b(stream), group)]["pending"]
+        return sum(pending.pop(_b(i), None) is not None for i in ids)
+
+
+class FakePipeline:
+    def __init__(self, r: FakeRedis):
+        self.r = r
+        self.queued = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.queued = []
+
+    def __getattr__(self, name):
+        if not hasattr(FakeRedis, f"_{name}"):
+            raise AttributeError(name)
+
+        def _queue(*args, **kwargs):
+            self.queued.append((name, args, kwargs))
+            return self
+
+        return _queue
+
+    def execute(self):
+        self.r.round_trips += 1
+        queued, self.queued = self.queued, []
+        return [self.r._run(name, *a, **kw) for name, a, kw in queued]
+
+
+class AsyncFakeRedis(FakeRedis):
+    """
+    The same, for the parts of an asyncio Redis client used by the IRC bot.
+    """
+
+    def __getattr__(self, name):
+        command = super().__getattr__(name)
+
+        async def _command(*args, **kwargs):
+            return command(*args, **kwargs)
+
+        return _command
+
+    def pipeline(self, transaction=True):
+        return AsyncFakePipeline(self)
+
+    def register_script(self, script):
+        # Only the lease scripts used by StreamConsumer, which touch a key
+        # if it's still held by the caller.
+        command = "pexpire" if "pexpire" in script else "delete"
+
+        async def _script(keys, args):
+            self.round_trips += 1
+            if self._get(keys[0]) != _b(args[0]):
+                return 0
+            return self._run(command, keys[0], *args[1:])
+
+        return _script
+
+
+class AsyncFakePipeline(FakePipeline):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.queued = []
+
+    async def execute(self):
+        return super().execute()
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def async_redis():
+    return AsyncFakeRedis()
+
+
+@pytest.fixture
+def app(redis):
+    """
+    A bare Flask app with the default settings and an in-memory Redis,
+    without any of the views.
+    """
+    app = Flask("notifico")
+    app.config.from_mapping(Settings().dict())
+    app.redis = redis
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def database():
+    """
+    Point the database session at an in-memory SQLite database, with the
+    tables needed for users (and their roles), projects, hooks and channels.
+    """
+    sqlite = sa.create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(
+        sqlite,
+        tables=[
+            Base.metadata.tables[name]
+            for name in (
+                "user",
+                "role",
+                "permission",
+                "role_association",
+                "permission_association",
+                "project",
+                "hook",
+                "message_count_flush",
+                "irc_network",
+                "channel",
+            )
+        ],
+    )
+
+    db_session.remove()
+    db_session.configure(bind=sqlite)
+    yield db_session
+    db_session.remove()
+    db_session.configure(bind=engine)
@@ -0,0 +1,100 @@
+import asyncio
+import datetime
+
+from notifico.botifico.bot import Network
+from notifico.botifico.manager import Channel, ChannelBot, Manager
+from notifico.botifico.parsing import Message
+from notifico.services import irc_bot
+from notifico.services.chat_log import ChatLogWriter, LoggedChannels
+
+
+class _RecordingWriter(ChatLogWriter):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.written = []
+
+    async def write_lines(self, lines):
+        self.written.append([values["message"] for _, values in lines])
+
+
+def test_chat_log_writer():
+    """
+    Ensure logged lines are written in batches once enough have been
+    buffered or enough time has passed, and that the buffer is bounded.
+    """
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+
+    async def _run():
+        writer = _RecordingWriter(
+            flush_lines=3, flush_interval=0.05, max_buffered=5
+        )
+
+        def _write(i):
+            return writer.write(1, message=i, sender="nick", timestamp=now)
+
+        for i in range(3):
+            assert _write(i)
+        await asyncio.sleep(0)
+        assert writer.written == [[0, 1, 2]]
+
+        # Not enough for a full batch, so it's written after the interval.
+        _write(3)
+        await asyncio.sleep(0.1)
+        assert writer.written[-1] == [3]
+
+        # Lines past the cap are dropped until the buffer is written.
+        writer.flush_lines = 100
+        assert all(_write(i) for i in range(4, 9))
+        assert not _write(9)
+        assert writer.dropped == 1
+
+        await writer.close()
+        assert writer.written[-1] == [4, 5, 6, 7, 8]
+        assert writer.dropped == 0
+
+    asyncio.run(_run())
+
+
+def test_logged_channels():
+    """
+    Ensure logged channels are found regardless of case.
+    """
+    network = Network("irc.libera.chat", 6697, True)
+
+    logged = LoggedChannels()
+    logged.logs = {(network, "#notifico{dev}"): 1}
+
+    assert logged.get(network, "#Notifico[DEV]") == 1
+    assert logged.get(network, "#other") is None
+    assert logged.get(Network("irc.libera.chat", 6667, False), "#a") is None
+
+
+def test_echoed_messages_not_logged(monkeypatch):
+    """
+    Ensure our own messages aren't logged as chat if the server echoes them
+    back to us.
+    """
+    network = Network("irc.libera.chat", 6697, True)
+    logged = LoggedChannels()
+    logged.logs = {(network, "#notifico"): 1}
+    writer = ChatLogWriter()
+    monkeypatch.setattr(irc_bot, "logged_channels", logged)
+    monkeypatch.setattr(irc_bot, "chat_log_writer", writer)
+
+    async def _run():
+        bot = ChannelBot(Manager("botifico"), network)
+        bot[Channel("#notifico")]
+        bot.nickname = "Not"
+
+        for line in (
+            ":Not!notifico@host PRIVMSG #notifico :a notification",
+            ":someone!user@host PRIVMSG #notifico :some chat",
+        ):
+            message = Message.parse(line)
+            await irc_bot.on_message(
+                bot, message.command, message.args, message, {}
+            )
+
+        return [values["message"] for _, values in writer.buffer]
+
+    assert asyncio.run(_run()) == [{"type": "message", "message": "some chat"}]
@@ -0,0 +1,122 @@
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from notifico.models import Hook, Project, User
+from notifico.services.counters import MessageCounters
+
+
+@pytest.fixture
+def hooks(database):
+    user = User.new("tyler", "tyler@example.com", "password")
+    hooks = []
+    for name in ("one", "two"):
+        project = Project.new(name)
+        project.owner = user
+        hooks.append(Hook(service_id=10, project=project, message_count=1))
+    database.add_all(hooks)
+    database.commit()
+    return hooks
+
+
+def _counts(database, hooks):
+    database.expire_all()
+    return [(h.message_count, h.project.message_count or 0) for h in hooks]
+
+
+def test_pending(redis):
+    """
+    Ensure counts are merged from both the live and flushing hashes.
+    """
+    counters = MessageCounters(redis)
+    counters.increment(1, 10)
+    counters.increment(1, 10, amount=2)
+    counters.increment(2, 10)
+    redis.rename(MessageCounters.key_hooks, "counters:hook:flushing")
+    counters.increment(1, 10)
+
+    assert counters.pending_hooks() == {1: 4, 2: 1}
+    assert counters.pending_hooks([2, 3]) == {2: 1}
+    assert counters.pending_hooks([]) == {}
+    assert counters.pending_projects() == {10: 5}
+
+
+def test_flush(redis, database, hooks):
+    """
+    Ensure pending counts are added to the database exactly once.
+    """
+    counters = MessageCounters(redis)
+    counters.increment(hooks[0].id, hooks[0].project.id, amount=3)
+    counters.increment(hooks[1].id, hooks[1].project.id)
+
+    counters.flush(database)
+    assert _counts(database, hooks) == [(4, 3), (2, 1)]
+    assert counters.pending_hooks() == {}
+    assert counters.pending_projects() == {}
+
+    # Nothing new has been counted.
+    counters.flush(database)
+    assert _counts(database, hooks) == [(4, 3), (2, 1)]
+
+
+def test_flush_resume(redis, database, hooks):
+    """
+    Ensure counts left behind by a flush that died after taking them aside
+    are written, along with anything counted since.
+    """
+    counters = MessageCounters(redis)
+    counters.increment(hooks[0].id, hooks[0].project.id, amount=2)
+    redis.rename(MessageCounters.key_hooks, "counters:hook:flushing")
+    redis.rename(MessageCounters.key_projects, "counters:project:flushing")
+    counters.increment(hooks[0].id, hooks[0].project.id, amount=5)
+
+    counters.flush(database)
+    assert _counts(database, hooks) == [(8, 7), (1, 0)]
+    assert counters.pending_hooks() == {}
+    assert counters.pending_projects() == {}
+
+
+def test_flush_failure(redis, database, hooks):
+    """
+    Ensure counts are kept, and still pending, if they can't be written to
+    the database.
+    """
+    counters = MessageCounters(redis)
+    counters.increment(hooks[0].id, hooks[0].project.id, amount=2)
+
+    # A database without any tables.
+    broken = Session(bind=sa.create_engine("sqlite://"))
+    with pytest.raises(sa.exc.OperationalError):
+        counters.flush(broken)
+
+    assert counters.pending_hooks() == {hooks[0].id: 2}
+    assert redis.exists("counters:hook:flushing")
+
+    counters.flush(database)
+    assert _counts(database, hooks) == [(3, 2), (1, 0)]
+    assert counters.pending_hooks() == {}
+
+
+def test_flush_interrupted(redis, database, hooks, monkeypatch):
+    """
+    Ensure counts that were committed by a flush that died before removing
+    them from Redis aren't written again.
+    """
+    counters = MessageCounters(redis)
+    counters.increment(hooks[0].id, hooks[0].project.id, amount=2)
+
+    def _delete(*keys):
+        raise ConnectionError()
+
+    with monkeypatch.context() as m:
+        m.setattr(redis, "delete", _delete)
+        with pytest.raises(ConnectionError):
+            counters.flush(database)
+
+    assert _counts(database, hooks) == [(3, 0), (1, 0)]
+    counters.increment(hooks[0].id, hooks[0].project.id)
+
+    counters.flush(database)
+    assert _counts(database, hooks) == [(4, 3), (1, 0)]
+    assert counters.pending_hooks() == {}
+    assert counters.pending_projects() == {}
@@ -0,0 +1,233 @@
+import asyncio
+import random
+
+from notifico.services.delivery import (
+    OrderedDispatcher,
+    QueueConsumer,
+    StreamConsumer,
+)
+from notifico.services.messages import MessageService
+
+
+def test_ordered_dispatcher():
+    """
+    Ensure messages with the same key are handled in order, and that no
+    more than `max_in_flight` are ever handled at once.
+    """
+    handled = {}
+    in_flight = 0
+    most_in_flight = 0
+
+    async def _sent():
+        nonlocal in_flight
+        await asyncio.sleep(random.random() / 100)
+        in_flight -= 1
+
+    async def _handler(item):
+        nonlocal in_flight, most_in_flight
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+
+        key, i = item
+        await asyncio.sleep(random.random() / 100)
+        handled.setdefault(key, []).append(i)
+        # The rest of the work shouldn't hold up the next message.
+        return _sent()
+
+    async def _run():
+        dispatcher = OrderedDispatcher(_handler, max_in_flight=10)
+        for i in range(50):
+            for key in ("#a", "#b", "#c"):
+                await dispatcher.submit(key, (key, i))
+
+        assert sum(dispatcher.depths.values()) <= 10
+
+        while dispatcher.tasks:
+            await asyncio.gather(*dispatcher.tasks)
+
+        assert dispatcher.depth("#a") == 0
+        assert dispatcher.queues == {}
+
+    asyncio.run(_run())
+
+    assert handled == {key: list(range(50)) for key in ("#a", "#b", "#c")}
+    assert in_flight == 0
+    assert most_in_flight <= 10
+
+
+def _consumer(r, name, **kwargs):
+    return StreamConsumer(r, name=name, **kwargs)
+
+
+def _lease(r, network_id):
+    return r._get(StreamConsumer.key_lease.format(network_id=network_id))
+
+
+def test_claim_networks(async_redis):
+    """
+    Ensure networks are shared fairly between consumers, with those over a
+    consumer's share given up for another to claim, and that the networks
+    of a consumer that stops renewing its leases are taken over.
+    """
+    r = async_redis
+
+    async def _run():
+        a, b = _consumer(r, "a"), _consumer(r, "b")
+        await a.add_networks([1, 2, 3, 4])
+
+        # On its own, every network is ours.
+        assert await a.claim_networks() == ({1, 2, 3, 4}, set())
+        assert await b.claim_networks() == (set(), set())
+
+        # Now there's two of us, half are given up...
+        claimed, lost = await a.claim_networks()
+        assert claimed == set() and len(lost) == 2
+        assert a.networks == {1, 2, 3, 4} - lost
+        assert all(_lease(r, n) is None for n in lost)
+
+        # ... and picked up by the other.
+        assert await b.claim_networks() == (lost, set())
+        assert all(_lease(r, n) == b"b" for n in b.networks)
+
+        # Nothing changes once we're balanced.
+        assert await a.claim_networks() == (set(), set())
+        assert await b.claim_networks() == (set(), set())
+
+        # `a` dies, and its leases and registration expire.
+        expired = set(a.networks)
+        for n in expired:
+            r._delete(StreamConsumer.key_lease.format(network_id=n))
+        r._zrem(StreamConsumer.key_consumers, "a")
+
+        assert await b.claim_networks() == (expired, set())
+        assert b.networks == {1, 2, 3, 4}
+
+        # Should it come back, it can't renew the leases it had.
+        assert await a.claim_networks() == (set(), expired)
+        assert a.networks == set()
+
+    asyncio.run(_run())
+
+
+def test_reclaim(async_redis):
+    """
+    Ensure messages left pending by a consumer are delivered again by the
+    one that takes over its network, without redelivering those it's still
+    handling itself or those trimmed from the stream.
+    """
+    r = async_redis
+    stream = StreamConsumer.stream(1)
+
+    async def _run():
+        a = _consumer(r, "a")
+        await a.add_networks([1])
+        await a.claim_networks()
+        for i in range(4):
+            await r.xadd(stream, {"message": f"{i}"})
+
+        deliveries = await a.receive()
+        assert [d.payload for d in deliveries] == [b"0", b"1", b"2", b"3"]
+        assert a.holds(deliveries[0])
+        await a.ack(deliveries[0])
+        assert a.in_flight == set(deliveries[1:])
+
+        # Handed over while 1 is being handled, so `a` leaves it for the
+        # next owner without acknowledging it.
+        a.forget(deliveries[1])
+        assert deliveries[1] not in a.in_flight
+
+        # Trimmed from the stream before anyone acknowledged it.
+        r.data[stream.encode()] = [
+            (entry_id, fields)
+            for entry_id, fields in r.data[stream.encode()]
+            if entry_id != deliveries[3].id
+        ]
+
+        # `a` dies, and `b` takes over.
+        r._delete(StreamConsumer.key_lease.format(network_id=1))
+        r._zrem(StreamConsumer.key_consumers, "a")
+        b = _consumer(r, "b", claim_idle=0)
+        assert await b.claim_networks() == ({1}, set())
+
+        reclaimed = await b.receive()
+        assert [d.payload for d in reclaimed] == [b"1", b"2"]
+        # The trimmed entry was acknowledged, since there's nothing left to
+        # deliver.
+        pending = r.groups[(stream.encode(), "notifico")]["pending"]
+        assert set(pending) == {d.id for d in reclaimed}
+
+        # Still being handled by `b` itself, so not delivered again.
+        await b.claim_networks()
+        assert b.reclaimed == []
+
+        await b.ack(*reclaimed)
+        assert pending == {} and b.in_flight == set()
+        assert await b.receive() == []
+
+    asyncio.run(_run())
+
+
+def test_queue_consumer(async_redis):
+    """
+    Ensure messages are received in batches, stay on the processing list
+    until acknowledged, and are put back in order when recovered.
+    """
+    r = async_redis
+    key = MessageService.key_queue_messages
+    processing = MessageService.key_processing_messages
+
+    async def _run():
+        consumer = QueueConsumer(r, batch_size=3)
+        await r.rpush(key, b"0", b"1", b"2", b"3")
+
+        first = await consumer.receive()
+        assert [d.payload for d in first] == [b"0", b"1", b"2"]
+        assert r._lrange(processing, 0, -1) == [b"0", b"1", b"2"]
+
+        # Acknowledged out of order.
+        await consumer.ack(first[1])
+        assert r._lrange(processing, 0, -1) == [b"0", b"2"]
+
+        # Messages we didn't get to send go to the front of the queue.
+        await consumer.requeue(1, b"a", b"b")
+        assert r._lrange(key, 0, -1) == [b"a", b"b", b"3"]
+
+        # We died, so whatever was in flight is put back before anything
+        # that was still waiting.
+        assert await consumer.recover() == 2
+        assert r._lrange(processing, 0, -1) == []
+        assert r._lrange(key, 0, -1) == [b"0", b"2", b"a", b"b", b"3"]
+
+        rest = await consumer.receive()
+        rest += await consumer.receive()
+        assert [d.payload for d in rest] == [b"0", b"2", b"a", b"b", b"3"]
+        await consumer.ack(*rest)
+        assert r._lrange(processing, 0, -1) == []
+        assert await consumer.receive() == []
+
+    asyncio.run(_run())
+
+
+def test_queue_consumer_duplicates(async_redis):
+    """
+    Ensure acknowledging one of several identical messages leaves a copy
+    for each of the others.
+    """
+    r = async_redis
+    processing = MessageService.key_processing_messages
+
+    async def _run():
+        consumer = QueueConsumer(r)
+        await r.rpush(MessageService.key_queue_messages, b"x", b"y", b"x")
+
+        deliveries = await consumer.receive()
+        await consumer.ack(deliveries[2])
+        assert r._lrange(processing, 0, -1) == [b"y", b"x"]
+
+        assert await consumer.recover() == 2
+        assert r._lrange(MessageService.key_queue_messages, 0, -1) == [
+            b"y",
+            b"x",
+        ]
+
+    asyncio.run(_run())
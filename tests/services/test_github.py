@@ -0,0 +1,23 @@
+from notifico.contrib.services.github import GithubHook, simplify_payload
+
+
+def test_simplify_payload():
+    """
+    Ensure file movement is counted over every commit in a push.
+    """
+    payload = GithubHook.loads(
+        b"""{
+            "ref": "refs/heads/main",
+            "pusher": {"name": "none"},
+            "commits": [
+                {"added": ["a", "b"], "removed": [], "modified": ["c"]},
+                {"added": ["d"], "removed": ["a"], "modified": ["c", "e"]}
+            ]
+        }"""
+    )
+
+    j = simplify_payload(payload)
+    assert j["branch"] == "main"
+    assert j["tag"] is None
+    assert j["pusher"] == "A deploy key"
+    assert j["files"] == {"added": 3, "removed": 1, "modified": 3}
@@ -0,0 +1,116 @@
+import datetime
+import pickle
+
+from notifico import hook_cache
+from notifico.cli import purge
+from notifico.models import Hook, Project, User
+from notifico.services.hook_cache import (
+    CachedChannel,
+    CachedHook,
+    CachedNetwork,
+    CachedProject,
+    invalidate_user,
+    key_hook,
+)
+from notifico.services.messages import MessageService
+
+
+def test_cached_hook():
+    """
+    Ensure a cached hook survives the cache, and can stand in for a real
+    hook when sending messages.
+    """
+    hook = CachedHook(
+        id=1,
+        key="abc",
+        service_id=10,
+        config={"branches": "main"},
+        project=CachedProject(
+            id=2,
+            public=True,
+            owner_id=3,
+            channels=(
+                CachedChannel(
+                    id=4,
+                    channel="#notifico",
+                    password=None,
+                    pack_messages=True,
+                    network_id=5,
+                    network=CachedNetwork(
+                        id=5, host="irc.libera.chat", port=6697, ssl=True
+                    ),
+                ),
+            ),
+        ),
+    )
+
+    assert pickle.loads(pickle.dumps(hook)) == hook
+    assert MessageService.target(hook.project.channels[0]) == {
+        "network": 5,
+        "host": "irc.libera.chat",
+        "port": 6697,
+        "ssl": True,
+        "channel": "#notifico",
+        "password": None,
+        "pack_messages": True,
+    }
+
+
+def test_invalidate_user(app, database):
+    """
+    Ensure every hook on a user's projects is forgotten, and nobody else's.
+    """
+    hook_cache.init_app(app, config={"CACHE_TYPE": "SimpleCache"})
+
+    users = [User.new(name, f"{name}@example.com", "pw") for name in "ab"]
+    hooks = []
+    for user in users:
+        for name in ("one", "two"):
+            project = Project.new(name)
+            project.owner = user
+            hooks.append(Hook(service_id=10, project=project))
+    database.add_all(hooks)
+    database.commit()
+
+    for hook in hooks:
+        hook_cache.set(key_hook.format(key=hook.key), hook.id)
+
+    invalidate_user(users[0])
+
+    assert [hook_cache.get(key_hook.format(key=h.key)) for h in hooks] == [
+        None,
+        None,
+        hooks[2].id,
+        hooks[3].id,
+    ]
+
+
+def test_purge(app, database):
+    """
+    Ensure the hooks of projects removed by `notifico tools purge` are
+    forgotten.
+    """
+    hook_cache.init_app(app, config={"CACHE_TYPE": "SimpleCache"})
+
+    user = User.new("tyler", "tyler@example.com", "pw")
+    long_ago = datetime.datetime.utcnow() - datetime.timedelta(days=2)
+    hooks = []
+    for name, message_count in (("quiet", 0), ("busy", 1)):
+        project = Project.new(name)
+        project.owner = user
+        project.created = long_ago
+        project.message_count = message_count
+        hooks.append(Hook(service_id=10, project=project))
+    database.add_all(hooks)
+    database.commit()
+
+    for hook in hooks:
+        hook_cache.set(key_hook.format(key=hook.key), hook.id)
+
+    result = app.test_cli_runner().invoke(purge, ["--make-changes"])
+    assert result.exit_code == 0, result.output
+
+    assert [hook_cache.get(key_hook.format(key=h.key)) for h in hooks] == [
+        None,
+        hooks[1].id,
+    ]
@@ -0,0 +1,52 @@
+import io
+
+import pytest
+
+from notifico import create_app
+from notifico.models import Hook, Project, User
+from notifico.views import projects
+
+
+@pytest.fixture
+def client(redis, database, monkeypatch):
+    monkeypatch.setenv("NOTIFICO_HOOK_CACHE_TYPE", "SimpleCache")
+    monkeypatch.setenv("NOTIFICO_HOOK_MAX_BODY_SIZE", "100")
+
+    app = create_app()
+    app.redis = redis
+    return app.test_client()
+
+
+def test_hook_body_size(client, database, monkeypatch):
+    """
+    Ensure webhook bodies over the size limit are refused, with or without a
+    Content-Length.
+    """
+    user = User.new("tyler", "tyler@example.com", "password")
+    project = Project.new("notifico")
+    project.owner = user
+    hook = Hook(service_id=10, project=project)
+    database.add_all([user, project, hook])
+    database.commit()
+
+    handled = []
+    monkeypatch.setattr(
+        projects, "handle_hook", lambda h, req: handled.append(req.get_data())
+    )
+
+    def _post(body: bytes, chunked: bool):
+        if chunked:
+            return client.post(
+                f"/h/{project.id}/{hook.key}",
+                data=io.BytesIO(body),
+                headers={"Transfer-Encoding": "chunked"},
+                environ_overrides={"wsgi.input_terminated": True},
+            )
+        return client.post(f"/h/{project.id}/{hook.key}", data=body)
+
+    for chunked in (False, True):
+        assert _post(b"x" * 100, chunked).status_code == 200
+        assert handled.pop() == b"x" * 100
+
+        assert _post(b"x" * 101, chunked).status_code == 413
+        assert handled == []
@@ -0,0 +1,82 @@
+from flask import request
+
+from notifico.models import Hook, Project, User
+from notifico.tasks import hooks
+
+
+def test_ingest_hook(app, redis, database, monkeypatch):
+    """
+    Ensure a webhook stored by ingest_hook is rebuilt for process_hook with
+    the same path, headers and body, exactly once, and that it expires.
+    """
+    user = User.new("tyler", "tyler@example.com", "password")
+    project = Project.new("notifico")
+    project.owner = user
+    hook = Hook(service_id=10, project=project)
+    database.add_all([user, project, hook])
+    database.commit()
+
+    queued = []
+    monkeypatch.setattr(
+        hooks.process_hook, "delay", lambda *args: queued.append(args)
+    )
+
+    handled = []
+
+    def _handle_hook(h, req):
+        handled.append(
+            (
+                h.id,
+                req.path,
+                req.method,
+                req.args.to_dict(),
+                req.headers.get("X-GitHub-Event"),
+                req.headers.get("Content-Type"),
+                req.get_data(),
+            )
+        )
+
+    monkeypatch.setattr(hooks, "handle_hook", _handle_hook)
+
+    def _ingest(body: bytes) -> str:
+        with app.test_request_context(
+            f"/h/{project.id}/{hook.key}?a=1",
+            method="POST",
+            headers={"X-GitHub-Event": "push"},
+            content_type="application/json",
+            data=body,
+        ):
+            hooks.ingest_hook(hook, request)
+
+        hook_id, ingest_id = queued.pop()
+        assert hook_id == hook.id
+        assert redis.ttl(hooks.key_ingest.format(id=ingest_id)) == (
+            app.config["HOOK_INGEST_TTL"]
+        )
+        return ingest_id
+
+    body = b'{"ref": "refs/heads/main", "binary": "\xff"}'
+    ingest_id = _ingest(body)
+    hooks.process_hook(hook.id, ingest_id)
+    assert handled == [
+        (
+            hook.id,
+            f"/h/{project.id}/{hook.key}",
+            "POST",
+            {"a": "1"},
+            "push",
+            "application/json",
+            body,
+        )
+    ]
+    assert not redis.exists(hooks.key_ingest.format(id=ingest_id))
+
+    # Already handled, such as when a task is delivered twice.
+    hooks.process_hook(hook.id, ingest_id)
+    assert len(handled) == 1
+
+    # Expired before a worker got to it.
+    ingest_id = _ingest(b"{}")
+    redis.delete(hooks.key_ingest.format(id=ingest_id))
+    hooks.process_hook(hook.id, ingest_id)
+    assert len(handled) == 1
@@ -0,0 +1,73 @@
+import json
+
+from notifico.services.hook_cache import CachedChannel, CachedNetwork
+from notifico.services.messages import MessageService
+
+CHANNELS = [
+    CachedChannel(
+        id=channel_id,
+        channel=name,
+        password=None,
+        pack_messages=False,
+        network_id=network.id,
+        network=network,
+    )
+    for channel_id, name, network in (
+        (1, "#a", CachedNetwork(1, "irc.libera.chat", 6697, True)),
+        (2, "#b", CachedNetwork(1, "irc.libera.chat", 6697, True)),
+        (3, "#c", CachedNetwork(2, "irc.oftc.net", 6697, True)),
+    )
+]
+
+
+def _sent(dumps):
+    return [(j["channel"], j["payload"]["msg"]) for j in map(json.loads, dumps)]
+
+
+def test_send_messages_list(redis):
+    """
+    Ensure every message to every channel is queued, in order, with a single
+    RPUSH.
+    """
+    ms = MessageService(redis)
+    ms.send_messages(["one", "two\r\n"], CHANNELS)
+
+    assert redis.round_trips == 1
+    assert [name for name, _ in redis.commands] == ["rpush"]
+    assert _sent(redis.lrange(MessageService.key_queue_messages, 0, -1)) == [
+        (1, "one"),
+        (2, "one"),
+        (3, "one"),
+        (1, "two"),
+        (2, "two"),
+        (3, "two"),
+    ]
+
+    # Nothing to send, so Redis isn't touched at all.
+    redis.commands.clear()
+    ms.send_messages([], CHANNELS)
+    ms.send_messages(["one"], [])
+    assert redis.commands == []
+
+
+def test_send_messages_stream(redis):
+    """
+    Ensure messages are added to the stream of each channel's network, in
+    order, with a single pipeline.
+    """
+    ms = MessageService(redis, delivery="stream")
+    ms.send_messages(["one", "two"], CHANNELS)
+
+    assert redis.round_trips == 1
+    assert [name for name, _ in redis.commands] == ["xadd"] * 6 + ["sadd"]
+
+    def _stream(network_id):
+        key = MessageService.key_stream_messages.format(network_id=network_id)
+        return _sent(e[b"message"] for _, e in redis.data[key.encode()])
+
+    assert _stream(1) == [(1, "one"), (2, "one"), (1, "two"), (2, "two")]
+    assert _stream(2) == [(3, "one"), (3, "two")]
+    assert redis.data[MessageService.key_stream_networks.encode()] == {
+        b"1",
+        b"2",
+    }
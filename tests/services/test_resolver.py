@@ -0,0 +1,43 @@
+import asyncio
+
+from notifico.botifico.bot import Network
+from notifico.botifico.manager import Channel
+from notifico.services.irc_bot import ChannelResolver
+
+
+def test_resolver_invalidation():
+    """
+    Ensure targets sent with queued messages are cached, and dropped when
+    their channel or network changes.
+    """
+    resolver = ChannelResolver()
+
+    def _resolve(j):
+        return asyncio.run(resolver.resolve(j))
+
+    def _target(network, channel):
+        return {
+            "network": network,
+            "host": "irc.libera.chat",
+            "port": 6697,
+            "ssl": True,
+            "channel": channel,
+            "password": None,
+            "pack_messages": False,
+        }
+
+    assert _resolve({"channel": 1, "target": _target(1, "#a")}) == (
+        Network("irc.libera.chat", 6697, True),
+        Channel("#a"),
+    )
+    _resolve({"channel": 2, "target": _target(1, "#b")})
+    _resolve({"channel": 3, "target": _target(2, "#c")})
+
+    # Messages without a target use the cache.
+    assert _resolve({"channel": 1})[1] == Channel("#a")
+
+    resolver.invalidate(channel_id=1)
+    assert set(resolver.targets) == {2, 3}
+
+    resolver.invalidate(network_id=1)
+    assert set(resolver.targets) == {3}